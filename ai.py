@@ -1,121 +1,49 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import asyncio
 import os
-import requests
 from dotenv import load_dotenv
-from rapidfuzz import process
+import numpy as np
 import re
-import math
+import time
+from catalogo import catalogo
+from catalogoCompartido import catalogo_compartido
+from cacheMatches import cache_matches
+from cacheRecetas import cache_recetas
+from metricas import medir, medir_llamada, observar
+from registro import obtener_registro
+from indice import SUPERMERCADOS, clave_super, limpiar_ingrediente, obtener_indice
+from unidades import cantidad_y_medida, clase_de, presentacion, unidades_a_comprar
 
 load_dotenv()
 
-API_URL_PRODUCTOS = os.getenv("API_URL_PRODUCTOS", "http://127.0.0.1:5003/productos")
 API_URL_PEDIDOS = os.getenv("API_URL_PEDIDOS", "http://127.0.0.1:5001/pedidos")
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client_async = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Campo del id del producto en los ítems de pedido (/make-order, pedidos guardados): las dos
+# cadenas de siempre conservan su nombre de campo; las que se agreguen usan "producto_id"
+CLAVES_ID_PEDIDO = {"disco": "producto_id_disco", "tienda_inglesa": "producto_id_ti"}
 
 productos_debug = []
+log = obtener_registro("ai")
 
 
 def obtener_productos():
+    """
+    Devuelve el catálogo desde la cache (ver catalogo.py); sólo va a la red si venció.
+    Con CATALOGO_COMPARTIDO devuelve directamente el índice mapeado que comparten los workers.
+    """
     global productos_debug
-    try:
-        resp = requests.get(API_URL_PRODUCTOS, timeout=5)
-        if resp.status_code == 200:
-            productos_debug = resp.json()
-            print(f"📦 Cargados {len(productos_debug)} productos")
-            return productos_debug
-    except Exception as e:
-        print(f"⚠️ Error obteniendo productos: {e}")
-    return []
-
-
-def limpiar_ingrediente(ingrediente: str) -> str:
-    """Limpia un ingrediente para mejor matching"""
-    original = ingrediente
-    ingrediente = re.sub(r'\([^)]*\)', '', ingrediente)
-    ingrediente = re.sub(r'\d+(?:[.,]\d+)?', '', ingrediente)
-    ingrediente = re.sub(r'\d+/\d+', '', ingrediente)
-
-    medidas = [
-        'taza', 'tazas', 'cucharadita', 'cucharaditas', 'cucharada', 'cucharadas',
-        'kg', 'gr', 'g', 'gramos', 'litro', 'litros', 'ml', 'cc', 'pizca',
-        'paquete', 'lata', 'sobre', 'unidad', 'unidades', 'docena', 'opcional'
-    ]
-    for m in medidas:
-        ingrediente = re.sub(rf'\b{m}s?\b', '', ingrediente, flags=re.IGNORECASE)
-
-    conectores = [
-        'de', 'del', 'la', 'el', 'en', 'con', 'sin', 'para', 'y', 'al',
-        'gusto', 'tibia', 'fría', 'frio', 'caliente', 'fresco', 'seco',
-        'líquido', 'polvo'
-    ]
-    for c in conectores:
-        ingrediente = re.sub(rf'\b{c}\b', '', ingrediente, flags=re.IGNORECASE)
-
-    ingrediente = re.sub(r'[/\\(),\s-]+', ' ', ingrediente).strip()
-    if len(ingrediente) < 3:
-        ingrediente = ""
-
-    print(f"🧹 Limpieza: '{original}' → '{ingrediente}'")
-    return ingrediente
-
-
-def buscar_por_categoria(ingrediente, productos):
-    ingrediente_lower = ingrediente.lower().strip()
-    mapeos_exactos = {
-        'mantequilla': 'manteca',
-        'manteca': 'manteca',
-        'azucar': 'azucar',
-        'azúcar': 'azucar',
-        'huevos': 'huevos colorados',
-        'huevo': 'huevos colorados',
-        'harina': 'harina de trigo',
-        'sal': 'sal',
-        'levadura': 'levadura',
-        'vainilla': 'vainilla',
-        'leche': 'leche',
-        'aceite oliva': 'aceite oliva',
-        'aceite': 'aceite',
-        'tomate': 'tomate',
-        'cebolla': 'cebolla',
-        'pimiento': 'pimiento',
-        'carne': 'carne',
-        'cacao': 'cocoa',
-    }
+    with medir("catalogo"):
+        productos_debug = (catalogo_compartido or catalogo).obtener()
+    return productos_debug
 
-    palabra_buscar = mapeos_exactos.get(ingrediente_lower)
-    if not palabra_buscar:
-        return None
 
-    candidatos = [p for p in productos if palabra_buscar in p["nombre_producto"].lower()]
-    if not candidatos:
+def buscar_por_categoria(ingrediente, indice):
+    fila = indice.fila_de_categoria(ingrediente)
+    if fila is None:
         return None
-
-    precios_disco = [p for p in candidatos if p.get("supermercado", "").lower() == "disco"]
-    precios_ti = [p for p in candidatos if p.get("supermercado", "").lower() == "tienda inglesa"]
-
-    return {
-        "nombre": candidatos[0]["nombre_producto"],
-        "disco": precios_disco[0]["precio"] if precios_disco else None,
-        "tienda_inglesa": precios_ti[0]["precio"] if precios_ti else None,
-        "producto_id_disco": precios_disco[0].get("id") if precios_disco else None,
-        "producto_id_ti": precios_ti[0].get("id") if precios_ti else None
-    }
-
-
-def es_no_comestible(nombre: str) -> bool:
-    """Detecta si un producto no es comestible por su nombre"""
-    nombre = nombre.lower()
-
-    # Lista de palabras clave a descartar (puede expandirse según lo que veas en la API)
-    blacklist = [
-        "jabon", "jabón", "detergente", "repelente", "hipoclorito", "lavandina",
-        "pañal", "pañales", "shampoo", "champu", "champú", "talco", "off",
-        "desodorante", "ambientador", "limpiador", "lavavajilla", "suavizante",
-        "perfume", "cera", "insecticida", "foco", "velas", "toallas", "servilleta",
-        "pañuelo", "pasta dental", "pasta de dientes", "colgate", "oral b", "cepillo"
-    ]
-
-    return any(kw in nombre for kw in blacklist)
+    return indice.resultado(fila)
 
 
 def buscar_precio_producto(ingrediente, productos):
@@ -124,13 +52,9 @@ def buscar_precio_producto(ingrediente, productos):
         if not productos:
             return None
 
-        # ✅ Filtrar no comestibles con la función
-        productos_validos = [
-            p for p in productos
-            if "nombre_producto" in p and not es_no_comestible(p["nombre_producto"])
-        ]
-
-        if not productos_validos:
+        # ✅ No comestibles, nombres y precios ya vienen resueltos en el índice
+        indice = obtener_indice(productos)
+        if not len(indice):
             return None
 
         ingrediente_limpio = limpiar_ingrediente(ingrediente)
@@ -138,112 +62,89 @@ def buscar_precio_producto(ingrediente, productos):
             return None
 
         # 1. Match por categoría fija
-        resultado = buscar_por_categoria(ingrediente_limpio, productos_validos)
+        resultado = buscar_por_categoria(ingrediente_limpio, indice)
         if resultado:
             return resultado
 
-        # 2. Fuzzy matching
-        nombres = [p["nombre_producto"] for p in productos_validos]
-        fuzzy = process.extractOne(ingrediente_limpio.lower(), [n.lower() for n in nombres])
-        if not fuzzy:
-            return None
-
-        mejor, score, idx = fuzzy
+        # 2. Fuzzy matching (sobre los candidatos del índice de trigramas si el catálogo es grande)
+        idx, score = indice.mejor(ingrediente_limpio.lower())
         if score < 80:
             return None
 
-        producto = productos_validos[idx]
-        precios_disco = [
-            p for p in productos_validos
-            if p["nombre_producto"] == producto["nombre_producto"]
-            and p["supermercado"].lower() == "disco"
-        ]
-        precios_ti = [
-            p for p in productos_validos
-            if p["nombre_producto"] == producto["nombre_producto"]
-            and p["supermercado"].lower() == "tienda inglesa"
-        ]
-
-        return {
-            "nombre": producto["nombre_producto"],
-            "disco": precios_disco[0]["precio"] if precios_disco else None,
-            "tienda_inglesa": precios_ti[0]["precio"] if precios_ti else None,
-            "producto_id_disco": precios_disco[0].get("id") if precios_disco else None,
-            "producto_id_ti": precios_ti[0].get("id") if precios_ti else None
-        }
+        return indice.resultado(idx)
 
     except Exception as e:
-        print(f"⚠️ Error en búsqueda: {e}")
+        log.warning("⚠️ Error en búsqueda", ingrediente=ingrediente, error=str(e))
         return None
 
 
-def calcular_unidades(cantidad: float, medida: str, producto_nombre: str):
-    # Captura presentaciones tipo: (400g), (400 g), (1 kg), (500 ml), (1/2 docena), (docena)
-    m = re.search(r"\(([^)]+)\)", producto_nombre.lower())
-    if not m:
-        # ⚠️ Antes devolvía ceil(cantidad) -> eso generaba 400 x precio.
-        return 1, 1
-
-    presentacion = m.group(1)
-
-    # DOCENA(S)
-    if "docena" in presentacion:
-        pack = 6 if "1/2" in presentacion else 12
-        # si solo pedís 1 unidad (p.ej. 1 huevo), igual comprás el pack mínimo
-        unidades = 1 if cantidad <= 1 else math.ceil(cantidad / pack)
-        return pack, unidades
-
-    # Extraer número de la presentación (400, 1, etc.)
-    num = re.search(r"(\d+(?:[.,]\d+)?)", presentacion)
-    valor = float(num.group(1).replace(",", ".")) if num else None
-    if valor is None:
-        return 1, 1  # si no pudimos leer el número, pedimos 1 unidad
-
-    # Normalizar pack a gramos o mililitros donde aplique
-    pack = None
-    if "kg" in presentacion:
-        pack = valor * 1000  # kg -> g
-        unidad_receta_en_g = (cantidad * 1000) if medida == "kg" else cantidad
-        unidades = 1 if pack >= unidad_receta_en_g else math.ceil(unidad_receta_en_g / pack)
-        return pack, unidades
-
-    if ("gr" in presentacion) or re.search(r"\b[g]\b", presentacion) or "gramo" in presentacion:
-        pack = valor  # g
-        # receta puede venir en kg o g
-        unidad_receta_en_g = (cantidad * 1000) if medida == "kg" else cantidad
-        unidades = 1 if pack >= unidad_receta_en_g else math.ceil(unidad_receta_en_g / pack)
-        return pack, unidades
-
-    if "l" in presentacion and "ml" not in presentacion:
-        pack = valor * 1000  # l -> ml
-        unidad_receta_en_ml = (cantidad * 1000) if medida in ["l", "lt"] else cantidad
-        unidades = 1 if pack >= unidad_receta_en_ml else math.ceil(unidad_receta_en_ml / pack)
-        return pack, unidades
-
-    if ("ml" in presentacion) or ("cc" in presentacion):
-        pack = valor  # ml
-        unidad_receta_en_ml = (cantidad * 1000) if medida in ["l", "lt"] else cantidad
-        unidades = 1 if pack >= unidad_receta_en_ml else math.ceil(unidad_receta_en_ml / pack)
-        return pack, unidades
-
-    # Por defecto (presentaciones como "(unidad)", "(frasco)", etc.)
-    return 1, 1
-
-def eliminar_duplicados(productos_pedido):
-    for supermercado in productos_pedido:
-        productos_unicos = {}
-        for p in productos_pedido[supermercado]:
-            if p["nombre"] in productos_unicos:
-                productos_unicos[p["nombre"]]["cantidad"] += p["cantidad"]
-                productos_unicos[p["nombre"]]["precio_total"] = (
-                    productos_unicos[p["nombre"]]["cantidad"] *
-                    productos_unicos[p["nombre"]]["precio_unitario"]
-                )
+def buscar_precios_receta(ingredientes, productos):
+    """
+    Versión por lote de buscar_precio_producto para todos los ingredientes de una receta.
+    Los que no caen en una categoría fija se puntúan juntos contra el catálogo en una sola
+    llamada nativa y paralela (process.cdist) en vez de un extractOne por ingrediente.
+    Devuelve una lista alineada con `ingredientes` (None si no hubo match).
+    Cada resultado incluye además el "score" del match (100 para categorías fijas).
+    """
+    resultados = [None] * len(ingredientes)
+    try:
+        if not productos or not ingredientes:
+            return resultados
+
+        indice = obtener_indice(productos)
+        if not len(indice):
+            return resultados
+
+        pendientes, consultas = [], []
+        for i, ing in enumerate(ingredientes):
+            ingrediente_limpio = limpiar_ingrediente(ing)
+            if len(ingrediente_limpio) < 3:
+                continue
+            resultado = buscar_por_categoria(ingrediente_limpio, indice)
+            if resultado:
+                resultados[i] = {**resultado, "score": 100.0}
             else:
-                productos_unicos[p["nombre"]] = p
-        productos_pedido[supermercado] = list(productos_unicos.values())
-    return productos_pedido
+                pendientes.append(i)
+                consultas.append(ingrediente_limpio.lower())
+
+        if not consultas:
+            return resultados
+
+        # Lo que ya se resolvió para esta versión del catálogo (también en corridas anteriores)
+        cache_matches.usar_version(indice.version)
+        en_cache = cache_matches.obtener_varios(consultas, indice.version)
+        if en_cache:
+            faltan = [(i, c) for i, c in zip(pendientes, consultas) if c not in en_cache]
+            for i, c in zip(pendientes, consultas):
+                if c in en_cache:
+                    resultados[i] = en_cache[c]
+            pendientes = [i for i, _ in faltan]
+            consultas = [c for _, c in faltan]
+            if not consultas:
+                return resultados
+
+        nuevos = {}
+        for fila, (i, (idx, score)) in enumerate(zip(pendientes, indice.puntuar(consultas))):
+            if score >= 80:
+                resultados[i] = {**indice.resultado(idx), "score": score}
+            nuevos[consultas[fila]] = resultados[i]
+        cache_matches.guardar_varios(nuevos, indice.version)
 
+    except Exception as e:
+        log.warning("⚠️ Error en búsqueda por lote", error=str(e))
+    return resultados
+
+
+def calcular_unidades(cantidad: float, medida: str, producto_nombre: str, presentaciones=None, clase=None):
+    """
+    (pack, unidades) a comprar. La presentación del producto ("(400g)", "(1 kg)", "(docena)"...)
+    se parsea una sola vez por producto (IndiceProductos.presentaciones); acá sólo queda aritmética.
+    """
+    if presentaciones is not None and producto_nombre in presentaciones:
+        pres = presentaciones[producto_nombre]
+    else:
+        pres = presentacion(producto_nombre)
+    return unidades_a_comprar(cantidad, medida, pres, clase)
 
 def extraer_utiles_de_instrucciones(instrucciones_lines):
     texto = " ".join(instrucciones_lines).lower()
@@ -264,42 +165,26 @@ def extraer_utiles_de_instrucciones(instrucciones_lines):
     return utiles
 
 
-def generar_receta(nombre: str, user_msg: str, usuario_numero=None, return_productos=False):
-    print(f"\n🍳 GENERANDO RECETA PARA: {nombre}")
-    print(f"📝 Solicitud: {user_msg}")
+def mensajes_receta(nombre: str, user_msg: str):
+    return [
+        {"role": "system", "content": f"Eres un chef que responde con recetas claras y fáciles. Saluda siempre a {nombre}."},
+        {"role": "user", "content": user_msg}
+    ]
 
-    try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": f"Eres un chef que responde con recetas claras y fáciles. Saluda siempre a {nombre}."},
-                {"role": "user", "content": user_msg}
-            ]
-        )
-        receta_base = completion.choices[0].message.content.strip()
-        print("✅ Receta generada con IA")
-    except Exception as e:
-        receta_base = f"⚠️ Error generando receta con IA: {str(e)}"
-        result = {
-            "ingredientes": receta_base,
-            "instrucciones": "",
-            "precios": ""
-        }
-        if return_productos:
-            return result, {"disco": [], "tienda_inglesa": []}
-        return result
-
-    productos = obtener_productos()
-    if not productos:
-        result = {
-            "ingredientes": receta_base,
-            "instrucciones": "",
-            "precios": ""
-        }
-        if return_productos:
-            return result, {"disco": [], "tienda_inglesa": []}
-        return result
 
+def _resultado_sin_precios(texto, return_productos):
+    result = {
+        "ingredientes": texto,
+        "instrucciones": "",
+        "precios": ""
+    }
+    if return_productos:
+        return result, {clave_super(s): [] for s in SUPERMERCADOS}
+    return result
+
+
+def parsear_receta(receta_base: str):
+    """Separa el texto de la IA en (ingredientes, líneas de instrucciones)."""
     ingredientes = []
     en_ing = False
     instrucciones_lines = []
@@ -314,43 +199,63 @@ def generar_receta(nombre: str, user_msg: str, usuario_numero=None, return_produ
             ingredientes.append(linea.strip().lstrip("- •").strip())
         elif not en_ing and linea.strip():
             instrucciones_lines.append(linea)
+    return ingredientes, instrucciones_lines
+
 
-    productos_pedido = {"disco": [], "tienda_inglesa": []}
-    precios_texto, total_disco, total_ti = [], 0, 0
+def armar_desde_partes(nombre: str, ingredientes, instrucciones_lines, productos, return_productos=False):
+    """Precios y textos a partir de una receta ya parseada (también la usa la cache de recetas)."""
+    with medir("matching"):
+        indice = obtener_indice(productos)
+        matches = buscar_precios_receta(ingredientes, productos)
 
-    for ing in ingredientes:
-        res = buscar_precio_producto(ing, productos)
+    inicio = time.perf_counter()
+    con_match, filas, unidades_ing = [], [], []
+    for ing, res in zip(ingredientes, matches):
         if res:
-            cant_match = re.search(r'(\d+(?:[.,]\d+)?)', ing)
-            cantidad = float(cant_match.group(1).replace(",", ".")) if cant_match else 1
-            med_match = re.search(r'(kg|gr|g|litro|lt|l|ml|cc|unidad|unidades|docena|pizca|taza|cucharada|cucharadita)', ing.lower())
-            medida = med_match.group(1) if med_match else "unidad"
-            pack, unidades = calcular_unidades(cantidad, medida, res["nombre"])
-
-            if res["disco"]:
-                productos_pedido["disco"].append({
-                    "nombre": res["nombre"],
-                    "precio_unitario": res["disco"],
-                    "cantidad": unidades,
-                    "precio_total": res["disco"] * unidades,
-                    "producto_id_disco": res.get("producto_id_disco")
-                })
-                total_disco += res["disco"] * unidades
-            if res["tienda_inglesa"]:
-                productos_pedido["tienda_inglesa"].append({
-                    "nombre": res["nombre"],
-                    "precio_unitario": res["tienda_inglesa"],
-                    "cantidad": unidades,
-                    "precio_total": res["tienda_inglesa"] * unidades,
-                    "producto_id_ti": res.get("producto_id_ti")
-                })
-                total_ti += res["tienda_inglesa"] * unidades
-
-            disco_str = f"{unidades} x ${res['disco']} = ${res['disco']*unidades:.2f}" if res["disco"] else "sin precio"
-            ti_str = f"{unidades} x ${res['tienda_inglesa']} = ${res['tienda_inglesa']*unidades:.2f}" if res["tienda_inglesa"] else "sin precio"
-            precios_texto.append(f"- {ing}: {disco_str} (Disco) / {ti_str} (Tienda Inglesa)")
-
-    productos_pedido = eliminar_duplicados(productos_pedido)
+            cantidad, medida = cantidad_y_medida(ing)
+            pack, unidades = calcular_unidades(cantidad, medida, res["nombre"], indice.presentaciones, clase_de(ing))
+            con_match.append(ing)
+            filas.append(res["fila"])
+            unidades_ing.append(unidades)
+
+    # Canasta sin repetidos: el mismo producto pedido por varios ingredientes suma unidades
+    posicion, canasta_filas, canasta_unidades = {}, [], []
+    for fila, unidades in zip(filas, unidades_ing):
+        j = posicion.setdefault(indice.nombres_filas[fila], len(canasta_filas))
+        if j == len(canasta_filas):
+            canasta_filas.append(fila)
+            canasta_unidades.append(0)
+        canasta_unidades[j] += unidades
+
+    # Precios por ingrediente, totales, disponibilidad y cadena más barata: una operación
+    # sobre la submatriz (filas elegidas x cadenas), sin importar cuántas cadenas haya
+    por_ingrediente = indice.canasta(filas, unidades_ing, SUPERMERCADOS)
+    canasta = indice.canasta(canasta_filas, canasta_unidades, SUPERMERCADOS)
+    supermercados = canasta["supermercados"]
+    titulos = [s.title() for s in supermercados]
+
+    precios_texto = []
+    for ing, unidades, precios in zip(con_match, unidades_ing, por_ingrediente["precios"]):
+        partes = [
+            f"{unidades} x ${precio} = ${precio * unidades:.2f} ({titulo})" if not np.isnan(precio)
+            else f"sin precio ({titulo})"
+            for precio, titulo in zip(precios.tolist(), titulos)
+        ]
+        precios_texto.append(f"- {ing}: " + " / ".join(partes))
+
+    productos_pedido = {clave_super(s): [] for s in SUPERMERCADOS}
+    for fila, unidades, precios in zip(canasta_filas, canasta_unidades, canasta["precios"]):
+        for k, (supermercado, precio) in enumerate(zip(supermercados, precios.tolist())):
+            if np.isnan(precio):
+                continue
+            clave = clave_super(supermercado)
+            productos_pedido[clave].append({
+                "nombre": indice.nombres_filas[fila],
+                "precio_unitario": precio,
+                "cantidad": unidades,
+                "precio_total": precio * unidades,
+                CLAVES_ID_PEDIDO.get(clave, "producto_id"): indice.ids[fila, indice.columna[supermercado]],
+            })
 
     ingredientes_text = f"👨‍🍳 Receta para {nombre}\n\n### Ingredientes:\n"
     ingredientes_text += "\n".join([f"• {ing}" for ing in ingredientes]) if ingredientes else "No se detectaron ingredientes."
@@ -364,16 +269,148 @@ def generar_receta(nombre: str, user_msg: str, usuario_numero=None, return_produ
 
     precios_final = ""
     if precios_texto:
-        precios_final = "\n💲 Precios disponibles:\n" + "\n".join(precios_texto)
-        precios_final += f"\n\n👉 Total Disco: ${total_disco:.2f}\n👉 Total Tienda Inglesa: ${total_ti:.2f}"
-        precios_final += "\n\n¿Querés hacer el pedido? Escribí 'tienda inglesa' o 'disco'."
+        precios_final = "\n💲 Precios disponibles:\n" + "\n".join(precios_texto) + "\n"
+        for titulo, total, disponibles in zip(titulos, canasta["totales"], canasta["disponibles"]):
+            faltan = len(canasta_filas) - int(disponibles)
+            precios_final += f"\n👉 Total {titulo}: ${total:.2f}" + (f" (faltan {faltan})" if faltan else "")
+        if len(supermercados) > 1 and canasta["mejor"]:
+            precios_final += f"\n🏆 Más conveniente: {canasta['mejor'].title()}"
+        opciones = " o ".join(f"'{s}'" for s in supermercados)
+        precios_final += f"\n\n¿Querés hacer el pedido? Escribí {opciones}."
 
     result = {
         "ingredientes": ingredientes_text,
         "instrucciones": instrucciones_text,
         "precios": precios_final
     }
+    observar("precios", time.perf_counter() - inicio)
 
     if return_productos:
         return result, productos_pedido
     return result
+
+
+def _texto_receta(ingredientes, instrucciones_lines):
+    """Reconstruye un texto legible a partir de una receta cacheada (para respuestas sin precios / stream)."""
+    lineas = ["### Ingredientes:"] + [f"- {ing}" for ing in ingredientes] + [""] + list(instrucciones_lines)
+    return "\n".join(lineas)
+
+
+def _armar_desde_cache(nombre, partes, productos, return_productos):
+    ingredientes, instrucciones_lines = partes
+    if not productos:
+        return _resultado_sin_precios(_texto_receta(ingredientes, instrucciones_lines), return_productos)
+    return armar_desde_partes(nombre, ingredientes, instrucciones_lines, productos, return_productos)
+
+
+def _armar_y_cachear(nombre, user_msg, receta_base, latencia_llm, productos, return_productos):
+    with medir("parseo"):
+        ingredientes, instrucciones_lines = parsear_receta(receta_base)
+    cache_recetas.guardar(user_msg, nombre, ingredientes, instrucciones_lines, latencia_llm)
+    if not productos:
+        return _resultado_sin_precios(receta_base, return_productos)
+    return armar_desde_partes(nombre, ingredientes, instrucciones_lines, productos, return_productos)
+
+
+def generar_receta(nombre: str, user_msg: str, usuario_numero=None, return_productos=False):
+    log.info("🍳 Generando receta", nombre=nombre, solicitud=user_msg)
+
+    with medir("cache_recetas"):
+        cacheada = cache_recetas.obtener(user_msg, nombre)
+    if cacheada:
+        log.info("♻️ Receta servida desde cache", nombre=nombre)
+        return _armar_desde_cache(nombre, cacheada, obtener_productos(), return_productos)
+
+    try:
+        inicio = time.perf_counter()
+        with medir_llamada("openai"):
+            completion = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=mensajes_receta(nombre, user_msg)
+            )
+        receta_base = completion.choices[0].message.content.strip()
+        latencia_llm = time.perf_counter() - inicio
+        log.info("✅ Receta generada con IA", segundos=round(latencia_llm, 3))
+    except Exception as e:
+        return _resultado_sin_precios(f"⚠️ Error generando receta con IA: {str(e)}", return_productos)
+
+    return _armar_y_cachear(nombre, user_msg, receta_base, latencia_llm, obtener_productos(), return_productos)
+
+
+async def generar_receta_async(nombre: str, user_msg: str, usuario_numero=None, return_productos=False):
+    """
+    Igual que generar_receta pero sin bloquear el event loop de FastAPI:
+    la llamada a OpenAI es async y el catálogo/matching corren en un thread.
+    """
+    log.info("🍳 Generando receta", nombre=nombre, solicitud=user_msg)
+
+    with medir("cache_recetas"):
+        cacheada = cache_recetas.obtener(user_msg, nombre)
+    if cacheada:
+        log.info("♻️ Receta servida desde cache", nombre=nombre)
+        productos = await asyncio.to_thread(obtener_productos)
+        return await asyncio.to_thread(_armar_desde_cache, nombre, cacheada, productos, return_productos)
+
+    try:
+        inicio = time.perf_counter()
+        with medir_llamada("openai"):
+            completion = await client_async.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=mensajes_receta(nombre, user_msg)
+            )
+        receta_base = completion.choices[0].message.content.strip()
+        latencia_llm = time.perf_counter() - inicio
+        log.info("✅ Receta generada con IA", segundos=round(latencia_llm, 3))
+    except Exception as e:
+        return _resultado_sin_precios(f"⚠️ Error generando receta con IA: {str(e)}", return_productos)
+
+    productos = await asyncio.to_thread(obtener_productos)
+    return await asyncio.to_thread(_armar_y_cachear, nombre, user_msg, receta_base, latencia_llm,
+                                   productos, return_productos)
+
+
+async def generar_receta_stream(nombre: str, user_msg: str):
+    """
+    Variante en streaming para la web: va devolviendo ("token", texto) a medida que
+    llegan del modelo y al final ("receta", (result, productos_pedido)) ya con precios.
+    Si falla la IA devuelve ("error", mensaje).
+    """
+    log.info("🍳 Generando receta (stream)", nombre=nombre, solicitud=user_msg)
+
+    with medir("cache_recetas"):
+        cacheada = cache_recetas.obtener(user_msg, nombre)
+    if cacheada:
+        log.info("♻️ Receta servida desde cache", nombre=nombre)
+        yield "token", _texto_receta(*cacheada)
+        productos = await asyncio.to_thread(obtener_productos)
+        yield "receta", await asyncio.to_thread(_armar_desde_cache, nombre, cacheada, productos, True)
+        return
+
+    partes = []
+    try:
+        inicio = time.perf_counter()
+        with medir_llamada("openai"):
+            stream = await client_async.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=mensajes_receta(nombre, user_msg),
+                stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                texto = chunk.choices[0].delta.content
+                if texto:
+                    if not partes:
+                        observar("llm_primer_token", time.perf_counter() - inicio)
+                    partes.append(texto)
+                    yield "token", texto
+        latencia_llm = time.perf_counter() - inicio
+        log.info("✅ Receta generada con IA", segundos=round(latencia_llm, 3))
+    except Exception as e:
+        yield "error", f"⚠️ Error generando receta con IA: {str(e)}"
+        return
+
+    receta_base = "".join(partes).strip()
+    productos = await asyncio.to_thread(obtener_productos)
+    yield "receta", await asyncio.to_thread(_armar_y_cachear, nombre, user_msg, receta_base, latencia_llm,
+                                            productos, True)
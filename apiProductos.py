@@ -1,46 +1,318 @@
-from flask import Flask, jsonify, request
-import pandas as pd
+from flask import Flask, Response, jsonify, request
+from snapshotProductos import cargar_productos
+from indice import IndiceProductos, limpiar_ingrediente
 from flask_cors import CORS
-import os
+import gzip
+import hashlib
+import io
+import json
+import uuid
+import pandas as pd
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["ETag", "X-Total-Count", "X-Catalogo-Version", "X-Catalogo-Epoca"])
+
+# Catálogo en formato largo: se parsea el Excel sólo si cambió, si no se carga el snapshot binario
+productos = cargar_productos()
+
+# Versión del catálogo: sube con cada cambio y descarta las respuestas pre-armadas.
+# La "época" identifica este proceso: si apiProductos se reinicia la versión vuelve a 1,
+# y los clientes que sincronizan por deltas tienen que bajar todo de nuevo.
+catalogo_version = 1
+CATALOGO_EPOCA = uuid.uuid4().hex[:12]
+CAMPOS = {"grupo", "nombre_producto", "supermercado", "precio", "id"}
+MAX_RESPUESTAS = 64
+_respuestas = {}   # (fields, offset, limit) -> (json, json gzip, etag, total) de la versión actual
+
+
+MAX_INGREDIENTES_MATCH = 100
+_indices = {"version": None}
+
+
+def _clave(p):
+    return (p["nombre_producto"], str(p["supermercado"]).lower())
+
+
+# Estado para upserts y sincronización incremental
+_posiciones = {_clave(p): i for i, p in enumerate(productos)}      # clave -> posición en `productos`
+_version_fila = {clave: catalogo_version for clave in _posiciones}  # clave -> versión en que cambió por última vez
+_eliminadas = {}                                                    # clave -> versión en que se eliminó
 
-# Definir ruta relativa a la carpeta actual
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-file_path = os.path.join(BASE_DIR, "productos.xlsx")
 
-# Leer Excel
-df = pd.read_excel(file_path, sheet_name="Precios medianos por cadena")
+def catalogo_cambio():
+    """Llamar después de modificar `productos`."""
+    global catalogo_version
+    catalogo_version += 1
+    _respuestas.clear()
 
-# Convertir a formato largo
-df_long = df.melt(
-    id_vars=["grupo", "nombre_producto"],
-    var_name="supermercado",
-    value_name="precio"
-).dropna()
 
-productos = df_long.to_dict(orient="records")
+def aplicar_upserts(filas):
+    """
+    Inserta, actualiza o elimina (fila con "eliminar": true) por (nombre_producto, supermercado)
+    y sube la versión una sola vez para todo el lote. Devuelve los contadores.
+    """
+    global productos, _posiciones
+    conteo = {"insertados": 0, "actualizados": 0, "eliminados": 0, "sin_cambios": 0}
+    cambiadas, borrar = [], set()
+    for fila in filas:
+        clave = _clave(fila)
+        pos = _posiciones.get(clave)
+        if fila.get("eliminar"):
+            if pos is not None and clave not in borrar:
+                borrar.add(clave)
+                conteo["eliminados"] += 1
+            continue
+        fila = {k: v for k, v in fila.items() if k != "eliminar"}
+        if pos is None:
+            _posiciones[clave] = len(productos)
+            productos.append(fila)
+            conteo["insertados"] += 1
+        elif productos[pos] != {**productos[pos], **fila}:
+            productos[pos] = {**productos[pos], **fila}
+            conteo["actualizados"] += 1
+        else:
+            conteo["sin_cambios"] += 1
+            continue
+        borrar.discard(clave)
+        cambiadas.append(clave)
+
+    if not cambiadas and not borrar:
+        return conteo
+
+    catalogo_cambio()
+    for clave in cambiadas:
+        _version_fila[clave] = catalogo_version
+        _eliminadas.pop(clave, None)
+    if borrar:
+        productos = [p for p in productos if _clave(p) not in borrar]
+        _posiciones = {_clave(p): i for i, p in enumerate(productos)}
+        for clave in borrar:
+            _version_fila.pop(clave, None)
+            _eliminadas[clave] = catalogo_version
+    return conteo
+
+
+def indices():
+    """
+    Índices residentes, armados una vez por versión del catálogo:
+    por supermercado, por grupo y el índice de matching (nombres, precios por cadena, categorías).
+    """
+    if _indices["version"] != catalogo_version:
+        por_super, por_grupo = {}, {}
+        for p in productos:
+            por_super.setdefault(str(p.get("supermercado", "")).lower(), []).append(p)
+            por_grupo.setdefault(str(p.get("grupo", "")).lower(), []).append(p)
+        _indices.update({
+            "version": catalogo_version,
+            "por_super": por_super,
+            "por_grupo": por_grupo,
+            "matching": IndiceProductos(productos),
+        })
+    return _indices
+
+
+def _armar_respuesta(campos, offset, limit):
+    """JSON (y su versión gzip) de una vista del catálogo, codificado una sola vez por versión."""
+    clave = (campos, offset, limit)
+    armada = _respuestas.get(clave)
+    if armada is None:
+        filas = productos[offset:offset + limit] if limit is not None else productos[offset:]
+        if campos:
+            filas = [{c: p[c] for c in campos if c in p} for p in filas]
+        cuerpo = json.dumps(filas, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = f"{catalogo_version}-{hashlib.sha1(cuerpo).hexdigest()[:16]}"
+        armada = (cuerpo, gzip.compress(cuerpo, compresslevel=6), etag, len(productos))
+        if len(_respuestas) >= MAX_RESPUESTAS:
+            _respuestas.clear()
+        _respuestas[clave] = armada
+    return armada
+
 
 # ======================
 # Rutas API
 # ======================
 @app.route("/productos", methods=["GET"])
 def get_all():
-    return jsonify(productos), 200
+    """
+    Catálogo completo como antes, con extras opcionales:
+    ?fields=nombre_producto,precio,supermercado  ->  sólo esos campos
+    ?offset=0&limit=500                          ->  paginado (total en X-Total-Count)
+    Respuestas con ETag (If-None-Match -> 304) y gzip si el cliente lo acepta.
+    """
+    campos = None
+    if request.args.get("fields"):
+        pedidos = [c.strip() for c in request.args["fields"].split(",") if c.strip()]
+        invalidos = [c for c in pedidos if c not in CAMPOS]
+        if invalidos:
+            return jsonify({"error": f"Campos inválidos: {', '.join(invalidos)}"}), 400
+        campos = tuple(pedidos)
+    try:
+        offset = max(int(request.args.get("offset", 0)), 0)
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+    except ValueError:
+        return jsonify({"error": "offset y limit tienen que ser enteros"}), 400
+    if limit is not None and limit < 0:
+        return jsonify({"error": "limit no puede ser negativo"}), 400
+
+    cuerpo, cuerpo_gzip, etag, total = _armar_respuesta(campos, offset, limit)
+    con_gzip = "gzip" in request.accept_encodings
+    headers = {
+        # ETag fuerte distinto por representación: el cuerpo gzip lleva el sufijo -gzip
+        "ETag": f'"{etag}-gzip"' if con_gzip else f'"{etag}"',
+        "Cache-Control": "no-cache",     # se puede cachear pero siempre revalidando con el ETag
+        "Vary": "Accept-Encoding",
+        "X-Total-Count": str(total),
+        "X-Catalogo-Version": str(catalogo_version),
+        "X-Catalogo-Epoca": CATALOGO_EPOCA,
+    }
+
+    # Cualquiera de los dos ETags valida: describen el mismo contenido
+    if request.if_none_match.contains(etag) or request.if_none_match.contains(f"{etag}-gzip"):
+        return Response(status=304, headers=headers)
+
+    if con_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(cuerpo_gzip, status=200, mimetype="application/json", headers=headers)
+    return Response(cuerpo, status=200, mimetype="application/json", headers=headers)
 
 @app.route("/productos/<super>", methods=["GET"])
 def get_by_super(super):
-    filtrados = [p for p in productos if str(p["supermercado"]).lower() == super.lower()]
-    return jsonify(filtrados), 200
+    return jsonify(indices()["por_super"].get(super.lower(), [])), 200
+
+@app.route("/productos/grupo/<grupo>", methods=["GET"])
+def get_by_grupo(grupo):
+    return jsonify(indices()["por_grupo"].get(grupo.lower(), [])), 200
+
+@app.route("/productos/match", methods=["POST"])
+def match_ingredientes():
+    """
+    Precio de una receta sin bajar el catálogo: recibe {"ingredientes": ["2 tazas de harina", ...]}
+    y devuelve, por ingrediente, el mejor producto con su precio en cada supermercado.
+    Mismas reglas que ai.py (limpieza, categorías fijas, fuzzy con umbral 80).
+    """
+    data = request.get_json(silent=True)
+    ingredientes = data.get("ingredientes") if isinstance(data, dict) else data
+    if not isinstance(ingredientes, list) or not all(isinstance(i, str) for i in ingredientes):
+        return jsonify({"error": "Se espera {\"ingredientes\": [\"...\", ...]}"}), 400
+    if len(ingredientes) > MAX_INGREDIENTES_MATCH:
+        return jsonify({"error": f"Máximo {MAX_INGREDIENTES_MATCH} ingredientes por pedido"}), 400
+
+    indice = indices()["matching"]
+    resultados = [{"ingrediente": ing, "producto": None} for ing in ingredientes]
+    pendientes, consultas = [], []
+    for i, ing in enumerate(ingredientes):
+        limpio = limpiar_ingrediente(ing)
+        if len(limpio) < 3:
+            continue
+        categoria = indice.por_categoria(limpio)
+        if categoria:
+            resultados[i].update(producto=categoria["nombre"], score=100.0, precios=categoria["precios"])
+        else:
+            pendientes.append(i)
+            consultas.append(limpio.lower())
+
+    for i, (idx, score) in zip(pendientes, indice.puntuar(consultas)):
+        if score >= 80:
+            nombre = indice.nombres[idx]
+            resultados[i].update(producto=nombre, score=score, precios=indice.precios[nombre])
+
+    for r in resultados:
+        if r["producto"]:
+            precios = r.pop("precios")
+            r["precios"] = {s: precio for s, (precio, _) in precios.items()}
+            r["ids"] = {s: id_ for s, (_, id_) in precios.items() if id_ is not None}
+
+    return jsonify({"catalogo_version": catalogo_version, "resultados": resultados}), 200
 
 @app.route("/productos", methods=["POST"])
 def add_producto():
     data = request.get_json()
     if not data or "nombre_producto" not in data or "precio" not in data or "supermercado" not in data:
         return jsonify({"error": "Faltan campos"}), 400
-    productos.append(data)
+    aplicar_upserts([data])
     return jsonify({"mensaje": "Producto agregado", "producto": data}), 201
 
+
+def _filas_de_tabla(df):
+    """Acepta formato largo (supermercado, precio) o el ancho de la planilla (una columna por cadena)."""
+    if not {"supermercado", "precio"} <= set(df.columns):
+        id_vars = [c for c in ("grupo", "nombre_producto") if c in df.columns]
+        df = df.melt(id_vars=id_vars, var_name="supermercado", value_name="precio")
+    df = df.dropna(subset=["precio"])
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def _leer_lote():
+    """Filas del pedido: archivo xlsx/csv subido, JSON (lista o {"productos": [...]}) o JSON lines."""
+    archivo = request.files.get("archivo")
+    if archivo:
+        nombre = (archivo.filename or "").lower()
+        contenido = io.BytesIO(archivo.read())
+        if nombre.endswith(".xlsx"):
+            return _filas_de_tabla(pd.read_excel(contenido, sheet_name=0))
+        if nombre.endswith(".csv"):
+            return _filas_de_tabla(pd.read_csv(contenido))
+        raise ValueError("El archivo tiene que ser .xlsx o .csv")
+
+    if request.is_json:
+        data = request.get_json()
+        return data.get("productos", []) if isinstance(data, dict) else data
+
+    lineas = request.get_data(as_text=True).splitlines()
+    return [json.loads(linea) for linea in lineas if linea.strip()]
+
+
+@app.route("/productos/bulk", methods=["POST"])
+def bulk_productos():
+    """
+    Carga masiva con upsert por (nombre_producto, supermercado): JSON lines, JSON o un
+    archivo xlsx/csv en el campo "archivo". Todo el lote sube la versión del catálogo una vez.
+    Una fila con "eliminar": true borra ese producto de esa cadena.
+    """
+    try:
+        filas = _leer_lote()
+    except Exception as e:
+        return jsonify({"error": f"No se pudo leer el lote: {e}"}), 400
+    if not isinstance(filas, list):
+        return jsonify({"error": "Se espera una lista de productos"}), 400
+
+    invalidas = [
+        i for i, f in enumerate(filas)
+        if not isinstance(f, dict) or "nombre_producto" not in f or "supermercado" not in f
+        or ("precio" not in f and not f.get("eliminar"))
+    ]
+    if invalidas:
+        return jsonify({"error": "Faltan campos", "filas": invalidas[:50]}), 400
+
+    conteo = aplicar_upserts(filas)
+    return jsonify({**conteo, "version": catalogo_version, "epoca": CATALOGO_EPOCA}), 200
+
+
+@app.route("/productos/changes", methods=["GET"])
+def cambios_productos():
+    """
+    Filas que cambiaron después de ?since=<versión> (y las eliminadas), para que los clientes
+    actualicen su copia sin bajar todo. Si ?epoca= no coincide (apiProductos se reinició)
+    responde 410 y el cliente tiene que hacer un GET /productos completo.
+    """
+    try:
+        desde = int(request.args.get("since", 0))
+    except ValueError:
+        return jsonify({"error": "since tiene que ser un entero"}), 400
+    epoca = request.args.get("epoca")
+    if (epoca and epoca != CATALOGO_EPOCA) or desde > catalogo_version:
+        return jsonify({"error": "Versión desconocida, hay que resincronizar",
+                        "version": catalogo_version, "epoca": CATALOGO_EPOCA}), 410
+
+    cambiadas = [productos[_posiciones[c]] for c, v in _version_fila.items() if v > desde]
+    eliminadas = [{"nombre_producto": c[0], "supermercado": c[1]} for c, v in _eliminadas.items() if v > desde]
+    return jsonify({
+        "desde": desde,
+        "version": catalogo_version,
+        "epoca": CATALOGO_EPOCA,
+        "cambios": cambiadas,
+        "eliminados": eliminadas,
+    }), 200
+
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=5003, debug=True)
@@ -1,12 +1,13 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from storePedidos import StorePedidos, a_timestamp, PEDIDOS_LIMITE
 
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Siguiente"])
 
-# Lista en memoria para guardar los pedidos
-pedidos = []
+# Pedidos persistidos en SQLite (ver storePedidos.py): sobreviven a un reinicio
+pedidos = StorePedidos()
 
 
 @app.route("/pedidos", methods=["POST"])
@@ -16,22 +17,69 @@ def crear_pedido():
     if not data:
         return jsonify({"error": "No se recibió un pedido válido"}), 400
 
-    pedidos.append(data)
+    pedido = pedidos.crear(data)
     return jsonify({
         "mensaje": "Pedido creado con éxito",
-        "pedido": data
+        "pedido": pedido
     }), 201
 
 
 @app.route("/pedidos", methods=["GET"])
 def listar_pedidos():
-    return jsonify(pedidos), 200
+    """
+    Filtros opcionales: ?usuario=&numero=&supermercado=&since= (epoch o ISO).
+    Paginado: ?limit= (máx. 1000) y ?after=<id>; el cursor de la página siguiente va en X-Siguiente.
+    """
+    try:
+        desde = a_timestamp(request.args.get("since"))
+        despues_de = request.args.get("after", type=int)
+        limite = int(request.args.get("limit", PEDIDOS_LIMITE))
+    except ValueError:
+        return jsonify({"error": "Parámetros inválidos"}), 400
+
+    resultado, siguiente = pedidos.listar(
+        usuario=request.args.get("usuario"),
+        numero=request.args.get("numero"),
+        supermercado=request.args.get("supermercado"),
+        desde=desde,
+        despues_de=despues_de,
+        limite=limite,
+    )
+    headers = {"X-Siguiente": str(siguiente)} if siguiente is not None else {}
+    return jsonify(resultado), 200, headers
+
+
+@app.route("/pedidos/<int:id_pedido>", methods=["GET"])
+def obtener_pedido(id_pedido):
+    pedido = pedidos.obtener(id_pedido)
+    if pedido is None:
+        return jsonify({"error": "Pedido no encontrado"}), 404
+    return jsonify(pedido), 200
+
+
+@app.route("/pedidos/<int:id_pedido>", methods=["DELETE"])
+def borrar_pedido(id_pedido):
+    if not pedidos.borrar(id_pedido):
+        return jsonify({"error": "Pedido no encontrado"}), 404
+    return jsonify({"mensaje": "Pedido eliminado"}), 200
 
 
 @app.route("/pedidos", methods=["DELETE"])
 def borrar_pedidos():
-    pedidos.clear()
-    return jsonify({"mensaje": "Todos los pedidos fueron eliminados"}), 200
+    """
+    Con ?numero= borra sólo los pedidos de ese número de WhatsApp (lo que usa "cancelar"),
+    con ?usuario= los de ese nombre; sin filtro, todos.
+    """
+    numero = request.args.get("numero")
+    if numero:
+        borrados = pedidos.borrar_de_numero(numero)
+        return jsonify({"mensaje": f"Pedidos de {numero} eliminados", "eliminados": borrados}), 200
+    usuario = request.args.get("usuario")
+    if usuario:
+        borrados = pedidos.borrar_de_usuario(usuario)
+        return jsonify({"mensaje": f"Pedidos de {usuario} eliminados", "eliminados": borrados}), 200
+    borrados = pedidos.borrar_todos()
+    return jsonify({"mensaje": "Todos los pedidos fueron eliminados", "eliminados": borrados}), 200
 
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=5001, debug=True)
@@ -1,13 +1,26 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from ai import generar_receta
+from ai import generar_receta_async, generar_receta_stream
+from catalogo import catalogo
+from catalogoCompartido import catalogo_compartido
+from cacheMatches import cache_matches
+from cacheRecetas import cache_recetas
+from colaMensajes import ColaMensajes
+from indice import SUPERMERCADOS, clave_super
+from metricas import DEBUG_TIEMPOS, desglose, exportar, medir, medir_llamada
+from registro import LOG_MUESTREO_ESTADOS, obtener_registro
+from registro import metricas as metricas_registro
+from sesiones import SESIONES_BACKEND, crear_store
 from usuarios import get_nombre
-from whatsapp import reply_whatsapp, enviar_botones
-import requests
+from whatsapp import reply_whatsapp_async, enviar_receta_async, http_async as http_whatsapp
+import asyncio
+import httpx
 import os, json
 
+log = obtener_registro("app")
+
 
 app = FastAPI(title="Chef Virtual API", version="3.1.0")
 
@@ -34,12 +47,37 @@ class OrderRequest(BaseModel):
     supermercado: str
     usuario: str
     productos: dict 
+    numero: str = None      # número de WhatsApp: "cancelar" borra los pedidos por número
 
 VERIFY_TOKEN = os.getenv("VERIFY_TOKEN", "mitokenverificacion")
 API_URL_PEDIDOS = os.getenv("API_URL_PEDIDOS", "http://127.0.0.1:5001/pedidos")
 
-# 🔹 memoria temporal para guardar productos por usuario
-user_sessions = {}
+# 🔹 cadenas en las que se puede pedir: clave ("tienda_inglesa") -> nombre ("tienda inglesa")
+CADENAS = {clave_super(s): s for s in SUPERMERCADOS}
+OPCIONES_PEDIDO = [(clave, f"🛒 {nombre.title()}") for clave, nombre in CADENAS.items()]
+OPCIONES_PEDIDO.append(("listar", "📋 Listar productos"))
+
+# 🔹 sesión por usuario (productos de la última receta / pedido confirmado); ver sesiones.py
+user_sessions = crear_store("sesion")
+
+
+async def en_store(funcion, *args):
+    """
+    Llama a una función del store de sesiones (o get_nombre) desde un handler async. Con Redis
+    cada llamada es I/O bloqueante, así que va a un thread para no frenar el event loop;
+    en memoria es un dict y se llama directo.
+    """
+    if SESIONES_BACKEND == "redis":
+        return await asyncio.to_thread(funcion, *args)
+    return funcion(*args)
+
+# 🔹 cliente HTTP async compartido (pool de conexiones) para la API de pedidos
+http_client = httpx.AsyncClient(timeout=10)
+
+@app.on_event("shutdown")
+async def cerrar_clientes():
+    await http_client.aclose()
+    await http_whatsapp.aclose()
 
 # ==========================
 # RUTAS WEB
@@ -49,60 +87,102 @@ async def read_index():
     return FileResponse("index.html")
 
 @app.post("/generate-recipe")
-async def generate_recipe(request: RecipeRequest):
+async def generate_recipe(request: RecipeRequest, debug: bool = False):
+    """Con ?debug=true (o DEBUG_TIEMPOS=1) la respuesta trae "tiempos": ms de cada etapa y llamada."""
     try:
-        nombre = get_nombre(request.numero, request.nombre)
-        receta, productos = generar_receta(nombre, request.mensaje, return_productos=True)
+        nombre = await en_store(get_nombre, request.numero, request.nombre)
+        with desglose() as tiempos, medir("receta"):
+            receta, productos = await generar_receta_async(nombre, request.mensaje, return_productos=True)
 
         # guardar productos en sesión
-        user_sessions[request.numero] = {
+        await en_store(user_sessions.guardar, request.numero, {
             "nombre": nombre,
             "productos": productos
-        }
+        })
 
-        return {
+        respuesta = {
             "success": True,
             "receta": receta,
             "productos": productos,
             "usuario": nombre
         }
+        if debug or DEBUG_TIEMPOS:
+            respuesta["tiempos"] = [{"etapa": etapa, "ms": ms} for etapa, ms in tiempos]
+        return respuesta
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando receta: {str(e)}")
 
+def evento_sse(evento: str, data) -> str:
+    return f"event: {evento}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/generate-recipe/stream")
+async def generate_recipe_stream(request: RecipeRequest):
+    """
+    Igual que /generate-recipe pero en Server-Sent Events: primero los tokens del modelo
+    ("token") y al final la receta con precios ("receta"), con el mismo formato de respuesta.
+    """
+    nombre = await en_store(get_nombre, request.numero, request.nombre)
+
+    async def eventos():
+        async for tipo, valor in generar_receta_stream(nombre, request.mensaje):
+            if tipo == "token":
+                yield evento_sse("token", {"texto": valor})
+            elif tipo == "error":
+                yield evento_sse("error", {"detail": valor})
+            else:
+                receta, productos = valor
+                await en_store(user_sessions.guardar, request.numero, {
+                    "nombre": nombre,
+                    "productos": productos
+                })
+                yield evento_sse("receta", {
+                    "success": True,
+                    "receta": receta,
+                    "productos": productos,
+                    "usuario": nombre
+                })
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/make-order")
 async def make_order(request: OrderRequest):
     try:
-        supermercado = request.supermercado.lower()
-
-        if supermercado == "disco":
-            productos_final = request.productos.get("disco", [])
-        elif supermercado == "tienda inglesa":
-            productos_final = request.productos.get("tienda_inglesa", [])
-        else:
+        clave = clave_super(request.supermercado)
+        if clave not in CADENAS:
             raise HTTPException(status_code=400, detail="Supermercado no válido")
+        supermercado = CADENAS[clave]
+        productos_final = request.productos.get(clave, [])
 
         if not productos_final:
             raise HTTPException(status_code=400, detail="No hay productos en el pedido para este supermercado")
 
         pedido_data = {
             "usuario": request.usuario,
+            "numero": request.numero,
             "supermercado": supermercado,
             "productos": productos_final,
         }
 
-        print("📤 Enviando pedido:", pedido_data)
+        log.info("📤 Enviando pedido", usuario=request.usuario, supermercado=supermercado, productos=len(productos_final))
+        log.debug("📤 Pedido", pedido=pedido_data)
 
-        response = requests.post(API_URL_PEDIDOS, json=pedido_data)
+        with medir_llamada("pedidos") as llamada:
+            response = await http_client.post(API_URL_PEDIDOS, json=pedido_data)
+            llamada.codigo(response.status_code)
 
         if response.status_code in [200, 201]:
             total = sum(p["precio_total"] for p in productos_final)
 
             # ✅ Guardar confirmados en la sesión
-            user_sessions[request.usuario] = {
+            await en_store(user_sessions.guardar, request.usuario, {
                 "nombre": request.usuario,
                 "productos": {supermercado: productos_final},
                 "confirmados": {supermercado: productos_final}
-            }
+            })
 
             return {
                 "success": True,
@@ -114,7 +194,7 @@ async def make_order(request: OrderRequest):
         else:
             raise HTTPException(status_code=500, detail="Error enviando pedido a la API")
 
-    except requests.RequestException:
+    except httpx.HTTPError:
         raise HTTPException(status_code=503, detail="Error de conexión con la API de pedidos")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error procesando pedido: {str(e)}")
@@ -135,109 +215,148 @@ async def verify_webhook(request: Request):
             raise HTTPException(status_code=403, detail="Token inválido")
     raise HTTPException(status_code=400, detail="Error en verificación")
 
+async def procesar_mensaje(entry: dict):
+    """Procesa un mensaje entrante (texto o botón). Corre en los workers de la cola, no en el webhook."""
+    message = entry["messages"][0]
+    from_number = message.get("from")
+    profile_name = entry.get("contacts", [{}])[0].get("profile", {}).get("name", "Usuario")
+
+    # 📝 Texto
+    if message.get("type") == "text":
+        text = message["text"].get("body", "").strip().lower()
+        log.info("👤 Mensaje de texto", usuario=profile_name, numero=from_number, texto=text)
+
+        saludos = ["hola", "buenas", "qué tal", "buen día", "buenas tardes", "buenas noches"]
+        if text in saludos:
+            await reply_whatsapp_async(from_number, f"👋 Hola {profile_name}! Soy tu Chef Virtual 🤖🍳. Pedime una receta y te ayudo.")
+            return
+
+        if text == "cancelar":
+            # 🔹 Borrar sesión
+            await en_store(user_sessions.borrar, from_number)
+
+            # 🔹 DELETE sólo de los pedidos de este número (el nombre no es único entre usuarios)
+            try:
+                with medir_llamada("pedidos") as llamada:
+                    resp = await http_client.delete(API_URL_PEDIDOS, params={"numero": from_number}, timeout=5)
+                    llamada.codigo(resp.status_code)
+                if resp.status_code == 200:
+                    await reply_whatsapp_async(from_number, "❌ Pedido cancelado y eliminado del sistema.")
+                else:
+                    await reply_whatsapp_async(from_number, "⚠️ No se pudo eliminar el pedido en la API.")
+            except Exception as e:
+                await reply_whatsapp_async(from_number, f"💥 Error al cancelar en API: {e}")
+
+            return
+
+        # 🔹 Generar receta normal
+        with medir("receta"):
+            receta_dict, productos = await generar_receta_async(profile_name, text, return_productos=True)
+        await en_store(user_sessions.guardar, from_number, {"nombre": profile_name, "productos": productos})
+
+        # Ingredientes, instrucciones y precios en la menor cantidad de mensajes, y después los botones
+        await enviar_receta_async(
+            from_number,
+            [receta_dict["ingredientes"], receta_dict["instrucciones"], receta_dict["precios"]],
+            "¿Querés hacer el pedido ahora?",
+            OPCIONES_PEDIDO
+        )
+
+
+    elif message.get("type") == "interactive":
+        interactivo = message["interactive"]
+        button_id = (interactivo.get("button_reply") or interactivo.get("list_reply") or {}).get("id")
+        session = await en_store(user_sessions.obtener, from_number)
+
+        if not session:
+            await reply_whatsapp_async(from_number, "⚠️ No tengo productos guardados para tu sesión. Pedime una receta primero.")
+            return
+
+        productos = session["productos"]
+        usuario = session["nombre"]
+
+        if button_id == "listar":
+            if "confirmados" not in session:
+                await reply_whatsapp_async(from_number, "⚠️ Aún no hiciste un pedido, no hay nada para listar.")
+                return
+
+            listado = []
+            for super, items in session["confirmados"].items():
+                listado.append(f"🏪 {super.upper()}:")
+                for p in items:
+                    listado.append(f" - {p['nombre']} ({p['cantidad']}) (${p['precio_total']})")
+            await reply_whatsapp_async(from_number, "\n".join(listado))
+            return
+
+        elif button_id in CADENAS:
+            productos_final = productos.get(button_id, [])
+            if productos_final:
+                pedido_data = {
+                    "supermercado": button_id,
+                    "usuario": usuario,
+                    "numero": from_number,
+                    "productos": productos_final
+                }
+                log.info("📤 Enviando pedido (botón)", usuario=usuario, supermercado=button_id, productos=len(productos_final))
+                log.debug("📤 Pedido", pedido=pedido_data)
+                with medir_llamada("pedidos") as llamada:
+                    response = await http_client.post(API_URL_PEDIDOS, json=pedido_data)
+                    llamada.codigo(response.status_code)
+
+                if response.status_code in [200, 201]:
+                    # ✅ Guardamos confirmados
+                    session["confirmados"] = {button_id: productos_final}
+                    await en_store(user_sessions.guardar, from_number, session)
+                    await reply_whatsapp_async(from_number, f"✅ Pedido enviado a {button_id}, {usuario}!")
+                else:
+                    await reply_whatsapp_async(from_number, "❌ Error al enviar el pedido")
+            else:
+                await reply_whatsapp_async(from_number, "⚠️ No encontré productos para este supermercado")
+
+
+cola_mensajes = ColaMensajes(procesar_mensaje)
+
+@app.on_event("startup")
+async def iniciar_cola():
+    await cola_mensajes.iniciar()
+
+@app.on_event("startup")
+async def iniciar_catalogo_compartido():
+    # La única espera a la primera publicación; después cada request usa lo que haya
+    if catalogo_compartido:
+        await asyncio.to_thread(catalogo_compartido.iniciar)
+
+@app.on_event("shutdown")
+async def detener_cola():
+    await cola_mensajes.detener()
+
 @app.post("/webhook")
 async def webhook(request: Request):
     data = await request.json()
-    print("📩 Payload recibido:", json.dumps(data, indent=2, ensure_ascii=False))
+    log.debug("📩 Payload recibido", payload=data)       # se serializa sólo si DEBUG está activo
 
     try:
         entry = data.get("entry", [])[0].get("changes", [])[0].get("value", {})
 
         if "messages" in entry:
-            message = entry["messages"][0]
-            from_number = message.get("from")
-            profile_name = entry.get("contacts", [{}])[0].get("profile", {}).get("name", "Usuario")
-
-            # 📝 Texto
-            if message.get("type") == "text":
-                text = message["text"].get("body", "").strip().lower()
-                print(f"👤 {profile_name} ({from_number}) dijo: {text}")
-
-                saludos = ["hola", "buenas", "qué tal", "buen día", "buenas tardes", "buenas noches"]
-                if text in saludos:
-                    reply_whatsapp(from_number, f"👋 Hola {profile_name}! Soy tu Chef Virtual 🤖🍳. Pedime una receta y te ayudo.")
-                    return {"status": "ok"}
-
-                if text == "cancelar":
-                    # 🔹 Borrar sesión en memoria
-                    user_sessions.pop(from_number, None)
-
-                    # 🔹 DELETE en el endpoint de pedidos (borra todo por simplicidad)
-                    try:
-                        resp = requests.delete(API_URL_PEDIDOS, timeout=5)
-                        if resp.status_code == 200:
-                            reply_whatsapp(from_number, "❌ Pedido cancelado y eliminado del sistema.")
-                        else:
-                            reply_whatsapp(from_number, "⚠️ No se pudo eliminar el pedido en la API.")
-                    except Exception as e:
-                        reply_whatsapp(from_number, f"💥 Error al cancelar en API: {e}")
-
-                    return {"status": "ok"}
-
-                # 🔹 Generar receta normal
-                receta_dict, productos = generar_receta(profile_name, text, return_productos=True)
-                user_sessions[from_number] = {"nombre": profile_name, "productos": productos}
-
-
-                for bloque in [receta_dict["ingredientes"], receta_dict["instrucciones"], receta_dict["precios"]]:
-                    if bloque.strip():
-                        reply_whatsapp(from_number, bloque)
-
-                enviar_botones(from_number, "¿Querés hacer el pedido ahora?")
-
-
-            elif message.get("type") == "interactive":
-                button_id = message["interactive"]["button_reply"]["id"]
-                session = user_sessions.get(from_number)
-
-                if not session:
-                    reply_whatsapp(from_number, "⚠️ No tengo productos guardados para tu sesión. Pedime una receta primero.")
-                    return {"status": "ok"}
-
-                productos = session["productos"]
-                usuario = session["nombre"]
-
-                if button_id == "listar":
-                    if "confirmados" not in session:
-                        reply_whatsapp(from_number, "⚠️ Aún no hiciste un pedido, no hay nada para listar.")
-                        return {"status": "ok"}
-
-                    listado = []
-                    for super, items in session["confirmados"].items():
-                        listado.append(f"🏪 {super.upper()}:")
-                        for p in items:
-                            listado.append(f" - {p['nombre']} ({p['cantidad']}) (${p['precio_total']})")
-                    reply_whatsapp(from_number, "\n".join(listado))
-                    return {"status": "ok"}
-
-                elif button_id in ["disco", "tienda_inglesa"]:
-                    productos_final = productos.get(button_id, [])
-                    if productos_final:
-                        pedido_data = {
-                            "supermercado": button_id,
-                            "usuario": usuario,
-                            "productos": productos_final
-                        }
-                        print("📤 Enviando pedido (botón):", pedido_data)
-                        response = requests.post(API_URL_PEDIDOS, json=pedido_data)
-
-                        if response.status_code in [200, 201]:
-                            # ✅ Guardamos confirmados
-                            session["confirmados"] = {button_id: productos_final}
-                            reply_whatsapp(from_number, f"✅ Pedido enviado a {button_id}, {usuario}!")
-                        else:
-                            reply_whatsapp(from_number, "❌ Error al enviar el pedido")
-                    else:
-                        reply_whatsapp(from_number, "⚠️ No encontré productos para este supermercado")
+            # ✅ Respondemos 200 enseguida; la receta se genera en la cola
+            # Por número: los mensajes de un usuario se procesan en orden, los de distintos usuarios en paralelo
+            message_id = entry["messages"][0].get("id")
+            if cola_mensajes.encolar(message_id, entry, clave=entry["messages"][0].get("from")) == "lleno":
+                log.warning("⚠️ Cola de mensajes llena, se responde 503", message_id=message_id)
+                raise HTTPException(status_code=503, detail="Cola de mensajes llena")
 
         elif "statuses" in entry:
-            print("ℹ️ Evento de estado:", json.dumps(entry["statuses"], indent=2, ensure_ascii=False))
+            # Llega uno por cada mensaje enviado / entregado / leído: se registra sólo una muestra
+            log.muestreado(LOG_MUESTREO_ESTADOS, "ℹ️ Evento de estado", estados=entry["statuses"])
 
         else:
-            print("⚠️ Evento no reconocido:", json.dumps(entry, indent=2, ensure_ascii=False))
+            log.warning("⚠️ Evento no reconocido", evento=entry)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print("⚠️ Error procesando webhook:", e)
+        log.error("⚠️ Error procesando webhook", error=str(e))
 
     return {"status": "ok"}
 
@@ -246,9 +365,30 @@ async def webhook(request: Request):
 # ==========================
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "Chef Virtual API"}
+    return {
+        "status": "healthy",
+        "service": "Chef Virtual API",
+        "catalogo": catalogo.metricas(),
+        "matches": cache_matches.metricas(),
+        "recetas": cache_recetas.metricas(),
+        "cola": cola_mensajes.metricas(),
+        "logs": metricas_registro(),
+        "compartido": catalogo_compartido.metricas() if catalogo_compartido else {}
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Histogramas por etapa / llamada saliente y los contadores de /health, en formato Prometheus."""
+    return exportar({
+        "catalogo": catalogo.metricas(),
+        "matches": cache_matches.metricas(),
+        "recetas": cache_recetas.metricas(),
+        "cola": cola_mensajes.metricas(),
+        "logs": metricas_registro(),
+        "compartido": catalogo_compartido.metricas() if catalogo_compartido else {}
+    })
 
 if __name__ == "__main__":
     import uvicorn
-    print("🚀 Iniciando Chef Virtual API...")
+    log.info("🚀 Iniciando Chef Virtual API...")
     uvicorn.run(app, host="127.0.0.1", port=8000)
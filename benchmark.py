@@ -0,0 +1,602 @@
+"""
+Benchmarks locales (no llaman a OpenAI ni a las APIs).
+
+Uso:
+    python benchmark.py limpieza
+    python benchmark.py concurrencia
+    python benchmark.py arranque
+    python benchmark.py pedidos [cantidad]
+    python benchmark.py pipeline [tamaños de catálogo sintético...]
+    python benchmark.py bloqueo [cantidades de nombres...]
+    python benchmark.py compartido [cantidad de productos]
+"""
+import io
+import os
+import re
+import sys
+import time
+from contextlib import redirect_stdout
+
+INGREDIENTES_EJEMPLO = [
+    "2 tazas de harina",
+    "1 pizca de sal",
+    "3 huevos",
+    "200 g de manteca (a temperatura ambiente)",
+    "1 taza de azúcar",
+    "1/2 litro de leche tibia",
+    "1 cucharadita de esencia de vainilla",
+    "2 cucharadas de cacao en polvo",
+    "10 gr de levadura seca",
+    "Aceite de oliva a gusto",
+]
+
+
+def _limpiar_ingrediente_original(ingrediente: str) -> str:
+    """Copia de la versión anterior de ai.limpiar_ingrediente, sólo para comparar."""
+    ingrediente = re.sub(r'\([^)]*\)', '', ingrediente)
+    ingrediente = re.sub(r'\d+(?:[.,]\d+)?', '', ingrediente)
+    ingrediente = re.sub(r'\d+/\d+', '', ingrediente)
+    medidas = [
+        'taza', 'tazas', 'cucharadita', 'cucharaditas', 'cucharada', 'cucharadas',
+        'kg', 'gr', 'g', 'gramos', 'litro', 'litros', 'ml', 'cc', 'pizca',
+        'paquete', 'lata', 'sobre', 'unidad', 'unidades', 'docena', 'opcional'
+    ]
+    for m in medidas:
+        ingrediente = re.sub(rf'\b{m}s?\b', '', ingrediente, flags=re.IGNORECASE)
+    conectores = [
+        'de', 'del', 'la', 'el', 'en', 'con', 'sin', 'para', 'y', 'al',
+        'gusto', 'tibia', 'fría', 'frio', 'caliente', 'fresco', 'seco',
+        'líquido', 'polvo'
+    ]
+    for c in conectores:
+        ingrediente = re.sub(rf'\b{c}\b', '', ingrediente, flags=re.IGNORECASE)
+    ingrediente = re.sub(r'[/\\(),\s-]+', ' ', ingrediente).strip()
+    if len(ingrediente) < 3:
+        ingrediente = ""
+    print(f"🧹 Limpieza: '{ingrediente}'")
+    return ingrediente
+
+
+def medir(funcion, entradas, repeticiones):
+    """Devuelve microsegundos promedio por llamada (la salida a stdout se descarta)."""
+    with redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            for e in entradas:
+                funcion(e)
+        total = time.perf_counter() - inicio
+    return total / (repeticiones * len(entradas)) * 1e6
+
+
+def bench_limpieza(repeticiones=2000):
+    from indice import limpiar_ingrediente
+
+    with redirect_stdout(io.StringIO()):
+        for ing in INGREDIENTES_EJEMPLO:
+            assert limpiar_ingrediente(ing) == _limpiar_ingrediente_original(ing), ing
+
+    antes = medir(_limpiar_ingrediente_original, INGREDIENTES_EJEMPLO, repeticiones)
+
+    limpiar_ingrediente.cache_clear()
+    sin_memo = medir(limpiar_ingrediente.__wrapped__, INGREDIENTES_EJEMPLO, repeticiones)
+    con_memo = medir(limpiar_ingrediente, INGREDIENTES_EJEMPLO, repeticiones)
+
+    print("🧹 limpiar_ingrediente (µs por ingrediente)")
+    print(f"  original (45 re.sub):      {antes:8.2f}")
+    print(f"  compilado, sin memo:       {sin_memo:8.2f}  ({antes / sin_memo:.1f}x)")
+    print(f"  compilado + lru_cache:     {con_memo:8.2f}  ({antes / con_memo:.1f}x)")
+
+
+RECETA_EJEMPLO = """¡Hola! Acá tenés una receta de bizcochuelo.
+
+### Ingredientes:
+- 4 huevos
+- 1 taza de azúcar
+- 2 tazas de harina
+- 1 cucharadita de esencia de vainilla
+
+### Preparación:
+1. Precalentar el horno a 180°.
+2. Batir los huevos con el azúcar en un bol.
+3. Agregar la harina y la vainilla, volcar en un molde y hornear 35 minutos.
+"""
+
+
+class _CompletionsLentas:
+    """Imita client_async.chat.completions con una latencia fija de LLM."""
+
+    def __init__(self, latencia):
+        self.latencia = latencia
+
+    async def create(self, **kwargs):
+        import asyncio
+        from types import SimpleNamespace
+        await asyncio.sleep(self.latencia)
+        mensaje = SimpleNamespace(content=RECETA_EJEMPLO)
+        return SimpleNamespace(choices=[SimpleNamespace(message=mensaje)])
+
+
+def bench_concurrencia(usuarios=20, latencia_llm=0.5):
+    """
+    Dispara `usuarios` pedidos a /generate-recipe a la vez con un LLM falso de latencia fija.
+    Si el pipeline no bloquea el event loop, el tiempo total queda cerca de una sola latencia
+    en vez de usuarios x latencia.
+    """
+    import asyncio
+    from types import SimpleNamespace
+    import httpx
+    import ai
+    from app import app
+
+    ai.client_async = SimpleNamespace(chat=SimpleNamespace(completions=_CompletionsLentas(latencia_llm)))
+    ai.catalogo.productos = []          # sin catálogo: se mide sólo el camino LLM + handler
+    ai.catalogo.obtener = lambda: []
+
+    async def un_pedido(cliente, i):
+        inicio = time.perf_counter()
+        r = await cliente.post("/generate-recipe", json={"nombre": f"U{i}", "mensaje": "bizcochuelo", "numero": str(i)})
+        r.raise_for_status()
+        return time.perf_counter() - inicio
+
+    async def correr():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+            inicio = time.perf_counter()
+            latencias = await asyncio.gather(*(un_pedido(cliente, i) for i in range(usuarios)))
+            return time.perf_counter() - inicio, latencias
+
+    with redirect_stdout(io.StringIO()):
+        total, latencias = asyncio.run(correr())
+
+    print(f"⚡ /generate-recipe con {usuarios} pedidos concurrentes (LLM falso de {latencia_llm}s)")
+    print(f"  tiempo total:            {total:6.2f} s")
+    print(f"  si se serializaran:      {usuarios * latencia_llm:6.2f} s")
+    print(f"  latencia máx.:           {max(latencias):6.2f} s")
+
+
+def bench_arranque(repeticiones=20):
+    """Carga del catálogo de apiProductos: parseo del Excel vs snapshot binario."""
+    import tempfile
+    import snapshotProductos as sp
+
+    def excel():
+        return sp.leer_excel().to_dict(orient="records")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, "productos.snapshot.pkl")
+        with redirect_stdout(io.StringIO()):
+            sp.cargar_productos(snapshot=snapshot)     # genera el snapshot
+
+        def desde_snapshot():
+            return sp.cargar_productos(snapshot=snapshot)
+
+        assert excel() == desde_snapshot()
+        tiempos = {}
+        for nombre, funcion in [("Excel (read_excel + melt)", excel), ("snapshot", desde_snapshot)]:
+            funcion()    # calentamiento (imports perezosos de pandas/openpyxl)
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                funcion()
+            tiempos[nombre] = (time.perf_counter() - inicio) / repeticiones * 1000
+        tamano = os.path.getsize(snapshot) / 1024
+
+    print("🚀 Carga del catálogo de apiProductos (ms)")
+    for nombre, ms in tiempos.items():
+        print(f"  {nombre:26s} {ms:8.1f}")
+    print(f"  snapshot en disco:         {tamano:8.1f} KB")
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def bench_pedidos(cantidad=1_000_000, hilos=32, usuarios=10_000, consultas=500):
+    """
+    Store de pedidos de apiRecetas: inserts/s con `hilos` escritores concurrentes (con y sin
+    group commit) y latencia de los listados filtrados con `cantidad` pedidos en la base.
+    """
+    import random
+    import tempfile
+    import threading
+    from storePedidos import StorePedidos
+
+    supers = ["disco", "tienda inglesa", "devoto", "ta - ta"]
+
+    def pedido(i):
+        return {
+            "usuario": f"usuario{i % usuarios}",
+            "supermercado": supers[i % len(supers)],
+            "productos": [{"nombre": "Harina 0000", "cantidad": 2, "precio_total": 96.0}],
+        }
+
+    def insertar(store, total):
+        def escritor(inicio):
+            for i in range(inicio, total, hilos):
+                store.crear(pedido(i))
+
+        trabajadores = [threading.Thread(target=escritor, args=(h,)) for h in range(hilos)]
+        inicio = time.perf_counter()
+        for t in trabajadores:
+            t.start()
+        for t in trabajadores:
+            t.join()
+        return total / (time.perf_counter() - inicio)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        muestra = min(cantidad, 20_000)
+        sin_grupo = StorePedidos(os.path.join(tmp, "sin_grupo.db"), grupo_max=1)
+        por_segundo_sin_grupo = insertar(sin_grupo, muestra)
+        sin_grupo.cerrar()
+
+        store = StorePedidos(os.path.join(tmp, "pedidos.db"))
+        por_segundo = insertar(store, cantidad)
+        commits = store.stats["commits"]
+
+        ahora = time.time()
+        filtros = {
+            "?usuario=": lambda: {"usuario": f"usuario{random.randrange(usuarios)}"},
+            "?usuario=&since=": lambda: {"usuario": f"usuario{random.randrange(usuarios)}", "desde": ahora - 5},
+            "?supermercado=&limit=50": lambda: {"supermercado": random.choice(supers), "limite": 50},
+            "?since=&limit=100": lambda: {"desde": ahora - random.random() * 60},
+        }
+        latencias = {}
+        for nombre, argumentos in filtros.items():
+            tiempos = []
+            for _ in range(consultas):
+                inicio = time.perf_counter()
+                store.listar(**argumentos())
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            latencias[nombre] = tiempos
+        store.cerrar()
+
+    print(f"🧾 Store de pedidos ({hilos} escritores concurrentes)")
+    print(f"  sin group commit:     {por_segundo_sin_grupo:10,.0f} inserts/s  ({muestra:,} pedidos)")
+    print(f"  con group commit:     {por_segundo:10,.0f} inserts/s  ({cantidad:,} pedidos, {commits:,} commits)")
+    print(f"  listado con {cantidad:,} pedidos (ms)      p50      p95")
+    for nombre, tiempos in latencias.items():
+        print(f"  {nombre:30s} {_percentil(tiempos, 0.5):8.3f} {_percentil(tiempos, 0.95):8.3f}")
+
+
+CORPUS_RECETAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recetas_benchmark.json")
+
+
+class _SinCacheMatches:
+    """Reemplaza a cacheMatches para medir el matching de verdad en cada corrida."""
+
+    def usar_version(self, version):
+        pass
+
+    def obtener_varios(self, ingredientes, version):
+        return {}
+
+    def guardar_varios(self, resultados, version):
+        pass
+
+
+def nombres_sinteticos(cantidad, base):
+    """`cantidad` nombres distintos: cada nombre real de `base` repetido con otra marca."""
+    nombres = sorted({p["nombre_producto"] for p in base})
+    for i in range(cantidad):
+        prefijo, _, presentacion = nombres[i % len(nombres)].partition("(")
+        yield f"{prefijo.strip()} Marca{i // len(nombres)}" + (f" ({presentacion}" if presentacion else "")
+
+
+def catalogo_sintetico(cantidad, base, semilla=0):
+    """
+    `cantidad` productos distintos (en formato largo, como apiProductos) a partir de los nombres
+    reales: cada uno es un nombre real con otra marca, con precio en 2 a 6 cadenas al azar.
+    """
+    import random
+
+    azar = random.Random(semilla)
+    supers = sorted({p["supermercado"] for p in base})
+    productos = []
+    for nombre in nombres_sinteticos(cantidad, base):
+        for supermercado in azar.sample(supers, azar.randint(2, 6)):
+            productos.append({
+                "grupo": "sintetico",
+                "nombre_producto": nombre,
+                "supermercado": supermercado,
+                "precio": round(azar.uniform(20, 800), 1),
+            })
+    return productos
+
+
+def bench_pipeline(*tamanos, repeticiones=5):
+    """
+    Mitad "sin red" de generar_receta sobre un corpus de recetas grabadas del LLM
+    (recetas_benchmark.json) y el snapshot de productos.xlsx, más catálogos sintéticos
+    de 1k/10k/100k productos: p50/p95 por etapa, recetas/s y memoria pico.
+    La memoria se informa como pico de objetos Python (tracemalloc) y RSS máximo del proceso,
+    porque lo que reserva rapidfuzz en C++ no lo ve tracemalloc.
+    """
+    import json
+    import resource
+    import tempfile
+    import tracemalloc
+    os.environ.setdefault("OPENAI_API_KEY", "sin-uso")     # el cliente se crea al importar; no se llama
+    import ai
+    import snapshotProductos as sp
+    from indice import IndiceProductos, SUPERMERCADOS, limpiar_ingrediente, obtener_indice
+    from unidades import cantidad_y_medida, clase_de
+
+    tamanos = tamanos or (1_000, 10_000, 100_000)
+    with open(CORPUS_RECETAS, encoding="utf-8") as f:
+        corpus = json.load(f)
+    with tempfile.TemporaryDirectory() as tmp, redirect_stdout(io.StringIO()):
+        real = sp.cargar_productos(snapshot=os.path.join(tmp, "productos.snapshot.pkl"))
+    ai.cache_matches = _SinCacheMatches()
+
+    def etapas(texto, productos, indice):
+        """Tiempos (ms) de cada etapa para una receta."""
+        t = {}
+        inicio = time.perf_counter()
+        ingredientes, instrucciones = ai.parsear_receta(texto)
+        t["parseo"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for ing in ingredientes:
+            limpiar_ingrediente.__wrapped__(ing)      # sin memo: el costo real la primera vez
+        t["limpiar_ingrediente"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for ing in ingredientes:
+            ai.buscar_precio_producto(ing, productos)
+        t["buscar_precio_producto"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        resultados = ai.buscar_precios_receta(ingredientes, productos)
+        t["buscar_precios_receta"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        filas, unidades = [], []
+        for ing, res in zip(ingredientes, resultados):
+            if res:
+                cantidad, medida = cantidad_y_medida.__wrapped__(ing)
+                unidades.append(ai.calcular_unidades(cantidad, medida, res["nombre"],
+                                                     indice.presentaciones, clase_de(ing))[1])
+                filas.append(res["fila"])
+        t["calcular_unidades"] = time.perf_counter() - inicio
+
+        # eliminar_duplicados ya no existe: los repetidos se juntan en la canasta vectorizada
+        inicio = time.perf_counter()
+        indice.canasta(filas, unidades, SUPERMERCADOS)
+        t["canasta"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        ai.extraer_utiles_de_instrucciones(instrucciones)
+        t["extraer_utiles"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        ai.armar_desde_partes("Bench", ingredientes, instrucciones, productos, True)
+        t["armar_desde_partes"] = time.perf_counter() - inicio
+        return {k: v * 1000 for k, v in t.items()}
+
+    catalogos = [("real", real)] + [(f"{n:,}", catalogo_sintetico(n, real)) for n in tamanos]
+    for nombre, productos in catalogos:
+        with redirect_stdout(io.StringIO()):
+            tracemalloc.start()
+            inicio = time.perf_counter()
+            indice = obtener_indice(productos)
+            armado = time.perf_counter() - inicio
+            _, pico_indice = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            etapas(corpus[0], productos, indice)       # calentamiento (pool de cdist, caches de regex)
+            vueltas = repeticiones if len(productos) < 100_000 else 1
+            muestras = {}
+            for _ in range(vueltas):
+                for texto in corpus:
+                    for etapa, ms in etapas(texto, productos, indice).items():
+                        muestras.setdefault(etapa, []).append(ms)
+
+            inicio = time.perf_counter()
+            for _ in range(vueltas):
+                for texto in corpus:
+                    ingredientes, instrucciones = ai.parsear_receta(texto)
+                    ai.armar_desde_partes("Bench", ingredientes, instrucciones, productos, True)
+            por_segundo = vueltas * len(corpus) / (time.perf_counter() - inicio)
+
+            tracemalloc.start()
+            for texto in corpus:
+                ingredientes, instrucciones = ai.parsear_receta(texto)
+                ai.armar_desde_partes("Bench", ingredientes, instrucciones, productos, True)
+            _, pico_receta = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        filas = len({p["nombre_producto"] for p in productos})
+        print(f"🧪 Pipeline receta -> canasta, catálogo {nombre} ({filas:,} productos, {len(productos):,} filas)")
+        print(f"  índice: {armado * 1000:9.1f} ms, pico {pico_indice / 2**20:7.1f} MB")
+        print(f"  {'etapa (ms por receta)':26s} {'p50':>9s} {'p95':>9s}")
+        for etapa, tiempos in muestras.items():
+            print(f"  {etapa:26s} {_percentil(tiempos, 0.5):9.3f} {_percentil(tiempos, 0.95):9.3f}")
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"  throughput: {por_segundo:9.1f} recetas/s, pico Python por receta {pico_receta / 2**20:6.2f} MB, "
+              f"RSS máx. del proceso {rss:7.1f} MB")
+        indice = productos = None
+
+
+RECALL_BLOQUEO_MIN = 0.99      # top-1 igual de bueno que la fuerza bruta, entre las consultas que ésta acepta
+
+
+def bench_bloqueo(*tamanos):
+    """
+    Índice de trigramas (candidatos.py) contra puntuar todo el catálogo, con los ingredientes
+    del corpus de recetas sobre 10k/100k/1M nombres sintéticos: armado, ms por consulta y
+    recall respecto de la fuerza bruta (extractOne sobre todos los nombres, mismo scorer).
+    "mismo score": el candidato elegido tiene el mismo score que el mejor global (con empates,
+    el nombre puede ser otro igual de bueno); "misma decisión": ambos pasan o no el umbral de 80;
+    "recall ≥80": mismo score entre las consultas que la fuerza bruta acepta. Falla (AssertionError)
+    si cambia alguna decisión o el recall baja de RECALL_BLOQUEO_MIN.
+    """
+    import json
+    import tempfile
+    import snapshotProductos as sp
+    from candidatos import IndiceCandidatos, MATCH_CANDIDATOS
+    from indice import limpiar_ingrediente
+    from rapidfuzz import fuzz, process
+
+    tamanos = tamanos or (10_000, 100_000, 1_000_000)
+    with open(CORPUS_RECETAS, encoding="utf-8") as f:
+        corpus = json.load(f)
+    with tempfile.TemporaryDirectory() as tmp, redirect_stdout(io.StringIO()):
+        real = sp.cargar_productos(snapshot=os.path.join(tmp, "productos.snapshot.pkl"))
+        import ai
+        consultas = set()
+        for texto in corpus:
+            for ing in ai.parsear_receta(texto)[0] + INGREDIENTES_EJEMPLO:
+                limpio = limpiar_ingrediente(ing)
+                if len(limpio) >= 3:
+                    consultas.add(limpio.lower())
+    consultas = sorted(consultas)
+
+    print(f"🔎 Bloqueo por trigramas: {len(consultas)} consultas, {MATCH_CANDIDATOS} candidatos por consulta")
+    print(f"  {'nombres':>10s} {'armado':>9s} {'postings':>9s} {'bruta ms/c':>11s} {'bloqueo ms/c':>13s} "
+          f"{'mismo score':>12s} {'mismo nombre':>13s} {'misma decisión':>15s} {'recall ≥80':>11s}")
+    for n in tamanos:
+        nombres = [x.lower() for x in nombres_sinteticos(n, real)]
+        inicio = time.perf_counter()
+        indice = IndiceCandidatos(nombres)
+        armado = time.perf_counter() - inicio
+        memoria = (indice._nombres_de.nbytes + indice._inicio.nbytes) / 2**20
+
+        inicio = time.perf_counter()
+        bruta = [process.extractOne(c, nombres, scorer=fuzz.WRatio) for c in consultas]
+        t_bruta = (time.perf_counter() - inicio) / len(consultas)
+
+        inicio = time.perf_counter()
+        bloqueo = []
+        for c in consultas:
+            posiciones = indice.buscar(c)
+            if len(posiciones):
+                _, score, j = process.extractOne(c, [nombres[i] for i in posiciones], scorer=fuzz.WRatio)
+                bloqueo.append((nombres[posiciones[j]], score))
+            else:
+                bloqueo.append((None, 0.0))
+        t_bloqueo = (time.perf_counter() - inicio) / len(consultas)
+
+        mismo_score = sum(abs(b[1] - f[1]) < 1e-6 for b, f in zip(bloqueo, bruta)) / len(consultas)
+        mismo_nombre = sum(b[0] == f[0] for b, f in zip(bloqueo, bruta)) / len(consultas)
+        decision = sum((b[1] >= 80) == (f[1] >= 80) for b, f in zip(bloqueo, bruta)) / len(consultas)
+        # Recall donde importa: de las consultas que la fuerza bruta acepta, cuántas encuentran un top-1 igual de bueno
+        aceptadas = [(b, f) for b, f in zip(bloqueo, bruta) if f[1] >= 80]
+        recall = sum(abs(b[1] - f[1]) < 1e-6 for b, f in aceptadas) / max(len(aceptadas), 1)
+        print(f"  {n:>10,} {armado:8.1f}s {memoria:7.1f}MB {t_bruta * 1000:11.2f} {t_bloqueo * 1000:13.2f} "
+              f"{mismo_score:12.1%} {mismo_nombre:13.1%} {decision:15.1%} {recall:11.1%}")
+        for c, b, f in zip(consultas, bloqueo, bruta):
+            if abs(b[1] - f[1]) >= 1e-6:
+                print(f"    ✗ {c!r}: bloqueo {b[0]!r} ({b[1]:.1f}) vs bruta {f[0]!r} ({f[1]:.1f})")
+        # Un cambio en MATCH_CANDIDATOS / MATCH_POR_PUNTAJE que pierda matches no puede pasar callado
+        assert decision == 1.0, f"{n:,} nombres: el bloqueo cambia aceptar/rechazar en {1 - decision:.1%} de las consultas"
+        assert recall >= RECALL_BLOQUEO_MIN, f"{n:,} nombres: recall {recall:.1%} < {RECALL_BLOQUEO_MIN:.0%}"
+        nombres = indice = None
+
+
+def _memoria_proceso():
+    """(RSS, USS, PSS) del proceso en MB, de /proc/self/smaps_rollup (Linux)."""
+    campos = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for linea in f:
+            partes = linea.split()
+            if len(partes) == 3 and partes[2] == "kB":
+                campos[partes[0].rstrip(":")] = int(partes[1]) / 1024
+    uss = campos.get("Private_Clean", 0) + campos.get("Private_Dirty", 0)
+    return campos.get("Rss", 0), uss, campos.get("Pss", 0)
+
+
+def _worker_compartido(modo, origen, consultas, resultados, salir):
+    """Un worker como los de uvicorn: arma su propio índice o mapea el publicado, y atiende consultas."""
+    import pickle
+    from indice import IndiceProductos
+
+    inicio = time.perf_counter()
+    if modo == "propio":
+        with open(origen, "rb") as f:
+            indice = IndiceProductos(pickle.load(f))
+    else:
+        from catalogoCompartido import CatalogoCompartido
+        indice = CatalogoCompartido(origen, publicar=False).obtener()
+    listo = time.perf_counter() - inicio
+    for c in consultas:
+        fila = indice.mejor(c)[0]
+        indice.resultado(fila)
+    resultados.put((listo, *_memoria_proceso()))
+    salir.wait()
+
+
+def bench_compartido(cantidad=100_000, workers=(1, 2, 4), consultas=200):
+    """
+    Memoria de N workers con su propio IndiceProductos contra N workers que mapean el catálogo
+    compartido (catalogoCompartido.py). Los workers arrancan con spawn (sin páginas heredadas por
+    fork) y quedan vivos a la vez mientras se mide: PSS reparte las páginas compartidas entre
+    quienes las mapean, así que la suma de PSS es la memoria real del conjunto.
+    """
+    import multiprocessing
+    import pickle
+    import tempfile
+    import snapshotProductos as sp
+    from catalogoCompartido import escribir
+    from indice import IndiceProductos
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with redirect_stdout(io.StringIO()):
+            real = sp.cargar_productos(snapshot=os.path.join(tmp, "productos.snapshot.pkl"))
+        productos = catalogo_sintetico(cantidad, real)
+        nombres = sorted({p["nombre_producto"] for p in real})
+        consultas = [n.lower() for n in nombres[:consultas]]
+
+        lista = os.path.join(tmp, "productos.pkl")
+        with open(lista, "wb") as f:
+            pickle.dump(productos, f)
+        directorio = os.path.join(tmp, "compartido")
+        os.makedirs(directorio)
+        inicio = time.perf_counter()
+        indice = IndiceProductos(productos)
+        nombre = f"catalogo-{indice.version}.bin"
+        escribir(indice, os.path.join(directorio, nombre))
+        with open(os.path.join(directorio, "ACTUAL"), "w") as f:
+            f.write(nombre)
+        publicado = time.perf_counter() - inicio
+        tamano = os.path.getsize(os.path.join(directorio, nombre)) / 2**20
+        indice = productos = None
+
+        print(f"🧠 Catálogo compartido: {cantidad:,} productos sintéticos, archivo de {tamano:.1f} MB "
+              f"(armado + escritura {publicado:.1f}s)")
+        print(f"  {'modo':>10s} {'workers':>8s} {'listo s':>8s} {'RSS/worker':>11s} {'USS/worker':>11s} "
+              f"{'PSS total':>10s}")
+        contexto = multiprocessing.get_context("spawn")
+        for modo, origen in (("propio", lista), ("compartido", directorio)):
+            for n in workers:
+                resultados, salir = contexto.Queue(), contexto.Event()
+                procesos = [contexto.Process(target=_worker_compartido,
+                                             args=(modo, origen, consultas, resultados, salir))
+                            for _ in range(n)]
+                for p in procesos:
+                    p.start()
+                medidas = [resultados.get() for _ in procesos]
+                salir.set()
+                for p in procesos:
+                    p.join()
+                listo = max(m[0] for m in medidas)
+                rss, uss = (sum(m[i] for m in medidas) / n for i in (1, 2))
+                pss = sum(m[3] for m in medidas)
+                print(f"  {modo:>10s} {n:8d} {listo:8.2f} {rss:9.1f}MB {uss:9.1f}MB {pss:8.1f}MB")
+
+
+BENCHMARKS = {
+    "limpieza": bench_limpieza,
+    "concurrencia": bench_concurrencia,
+    "arranque": bench_arranque,
+    "pedidos": bench_pedidos,
+    "pipeline": bench_pipeline,
+    "bloqueo": bench_bloqueo,
+    "compartido": bench_compartido,
+}
+
+
+if __name__ == "__main__":
+    nombres = [a for a in sys.argv[1:] if not a.isdigit()] or list(BENCHMARKS)
+    numeros = [int(a) for a in sys.argv[1:] if a.isdigit()]
+    for nombre in nombres:
+        BENCHMARKS[nombre](*numeros)
@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from registro import obtener_registro
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MATCH_CACHE_PATH = os.getenv("MATCH_CACHE_PATH", os.path.join(BASE_DIR, "matches.db"))
+MATCH_CACHE_MAX = int(os.getenv("MATCH_CACHE_MAX", "5000"))
+# Versiones de catálogo que ningún worker usó en este tiempo (segundos) se borran enteras
+MATCH_CACHE_GRACIA = float(os.getenv("MATCH_CACHE_GRACIA", "3600"))
+
+log = obtener_registro("matches")
+
+
+class CacheMatches:
+    """
+    Cache persistente ingrediente limpio -> producto elegido (nombre, score, precios e ids por cadena).
+
+    Vive en un SQLite local para que un worker recién levantado arranque ya "caliente".
+    Las entradas se guardan por (ingrediente, versión del catálogo): todos los workers comparten
+    el archivo y durante un cambio de catálogo conviven workers con la versión vieja y la nueva,
+    así que cada uno lee sólo la suya sin borrar la del otro. Una versión que nadie usó en
+    MATCH_CACHE_GRACIA segundos se descarta entera. El tamaño está acotado y se desaloja lo
+    menos usado (LRU).
+    Los "sin match" también se guardan, así no se vuelve a puntuar algo que no existe.
+    """
+
+    def __init__(self, ruta=MATCH_CACHE_PATH, max_entradas=MATCH_CACHE_MAX, gracia=MATCH_CACHE_GRACIA):
+        self.max_entradas = max_entradas
+        self.gracia = gracia
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Formato anterior (clave sólo por ingrediente): es una cache, se descarta
+        claves = [c[1] for c in self._conn.execute("PRAGMA table_info(matches)") if c[5]]
+        if claves == ["ingrediente"]:
+            self._conn.execute("DROP TABLE matches")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS matches (
+                ingrediente TEXT NOT NULL,
+                version TEXT NOT NULL,
+                resultado TEXT,
+                usado REAL NOT NULL,
+                PRIMARY KEY (ingrediente, version)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_usado ON matches(usado)")
+        self._conn.commit()
+        self._purgada = None        # última versión para la que se purgaron las abandonadas
+        self.stats = {"hits": 0, "misses": 0, "invalidaciones": 0, "desalojos": 0}
+
+    def usar_version(self, version):
+        """
+        Al ver una versión de catálogo nueva borra las abandonadas (sin uso en `gracia` segundos);
+        las de otros workers en rollout se conservan. No guarda estado de lectura: cada llamada
+        de obtener_varios / guardar_varios lleva la versión del índice con el que se trabaja
+        (el objeto lo comparten threads que pueden estar con catálogos distintos).
+        """
+        if version == self._purgada:
+            return
+        with self._lock:
+            if version == self._purgada:
+                return
+            borrados = self._conn.execute(
+                "DELETE FROM matches WHERE version != ? AND version IN "
+                "(SELECT version FROM matches GROUP BY version HAVING MAX(usado) < ?)",
+                (version, time.time() - self.gracia),
+            ).rowcount
+            self._conn.commit()
+            self._purgada = version
+            if borrados:
+                self.stats["invalidaciones"] += borrados
+                log.info("🗑️ Cache de matches: entradas de catálogos abandonados descartadas", borrados=borrados)
+
+    def obtener_varios(self, ingredientes, version):
+        """Devuelve {ingrediente: resultado o None} sólo para los que están en cache con esa versión."""
+        if not ingredientes:
+            return {}
+        claves = list(set(ingredientes))
+        marcas = ",".join("?" * len(claves))
+        with self._lock:
+            filas = self._conn.execute(
+                f"SELECT ingrediente, resultado FROM matches WHERE version = ? AND ingrediente IN ({marcas})",
+                (version, *claves),
+            ).fetchall()
+            if filas:
+                ahora = time.time()
+                self._conn.executemany(
+                    "UPDATE matches SET usado = ? WHERE ingrediente = ? AND version = ?",
+                    [(ahora, ing, version) for ing, _ in filas],
+                )
+                self._conn.commit()
+        self.stats["hits"] += len(filas)
+        self.stats["misses"] += len(claves) - len(filas)
+        return {ing: json.loads(res) if res else None for ing, res in filas}
+
+    def guardar_varios(self, resultados, version):
+        """resultados: {ingrediente: dict del match o None}, calculados con el índice de esa versión."""
+        if not resultados:
+            return
+        ahora = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO matches (ingrediente, version, resultado, usado) VALUES (?, ?, ?, ?)",
+                [(ing, version, json.dumps(res) if res else None, ahora) for ing, res in resultados.items()],
+            )
+            total = self._conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+            if total > self.max_entradas:
+                sobrantes = total - self.max_entradas
+                self._conn.execute(
+                    "DELETE FROM matches WHERE rowid IN "
+                    "(SELECT rowid FROM matches ORDER BY usado LIMIT ?)",
+                    (sobrantes,),
+                )
+                self.stats["desalojos"] += sobrantes
+            self._conn.commit()
+
+    def metricas(self):
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+        return {**self.stats, "entradas": total, "max_entradas": self.max_entradas, "version": self._purgada}
+
+
+cache_matches = CacheMatches()
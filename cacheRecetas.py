@@ -0,0 +1,109 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from rapidfuzz import process, fuzz
+
+RECETA_CACHE_TTL = float(os.getenv("RECETA_CACHE_TTL", "86400"))     # 1 día
+RECETA_CACHE_MAX = int(os.getenv("RECETA_CACHE_MAX", "500"))
+RECETA_CACHE_FUZZY = float(os.getenv("RECETA_CACHE_FUZZY", "95"))    # 0 desactiva el match aproximado de claves
+
+# Palabras que no cambian qué plato se pide ("quiero una receta de ...", "pasame como hacer ...")
+STOPWORDS = {
+    "quiero", "queria", "quisiera", "receta", "recetas", "de", "del", "una", "un", "la", "el", "los", "las",
+    "para", "me", "por", "favor", "hacer", "preparar", "cocinar", "como", "dame", "pasame", "decime",
+    "necesito", "podes", "podrias", "pasas", "mandame", "y", "con", "a", "hola", "buenas", "porfa", "rica", "rico",
+}
+
+_NOMBRE = "\x00nombre\x00"   # marcador donde iba el nombre del usuario en el texto cacheado
+
+
+def normalizar_pedido(texto: str) -> str:
+    """'¿Me pasás una receta de Torta de Chocolate?' -> 'chocolate torta'"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    palabras = re.findall(r"[a-z0-9]+", texto)
+    return " ".join(sorted(p for p in palabras if p not in STOPWORDS))
+
+
+class CacheRecetas:
+    """
+    Cache en memoria de recetas ya generadas por la IA, por pedido normalizado.
+
+    Guarda la receta parseada (ingredientes + instrucciones) con el nombre del usuario
+    reemplazado por un marcador; el saludo y los precios se arman de nuevo en cada pedido.
+    LRU acotada + TTL, y opcionalmente match aproximado de la clave ("torta chocolate" ~ "tortas chocolate").
+    """
+
+    def __init__(self, ttl=RECETA_CACHE_TTL, max_entradas=RECETA_CACHE_MAX, umbral_fuzzy=RECETA_CACHE_FUZZY):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.umbral_fuzzy = umbral_fuzzy
+        self._entradas = OrderedDict()   # clave -> (guardado_en, ingredientes, instrucciones, latencia_llm)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "hits_fuzzy": 0, "misses": 0, "expirados": 0, "desalojos": 0,
+                      "segundos_llm_ahorrados": 0.0}
+
+    def _buscar_clave(self, clave):
+        if clave in self._entradas:
+            return clave, False
+        if self.umbral_fuzzy and self._entradas:
+            mejor = process.extractOne(clave, list(self._entradas), scorer=fuzz.token_sort_ratio,
+                                       score_cutoff=self.umbral_fuzzy)
+            if mejor:
+                return mejor[0], True
+        return None, False
+
+    def obtener(self, pedido: str, nombre: str):
+        """Devuelve (ingredientes, instrucciones_lines) con el nombre de este usuario, o None."""
+        clave = normalizar_pedido(pedido)
+        if not clave:
+            return None
+        with self._lock:
+            encontrada, aproximada = self._buscar_clave(clave)
+            if encontrada is None:
+                self.stats["misses"] += 1
+                return None
+            guardado_en, ingredientes, instrucciones, latencia = self._entradas[encontrada]
+            if time.monotonic() - guardado_en > self.ttl:
+                del self._entradas[encontrada]
+                self.stats["expirados"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entradas.move_to_end(encontrada)
+            self.stats["hits"] += 1
+            if aproximada:
+                self.stats["hits_fuzzy"] += 1
+            self.stats["segundos_llm_ahorrados"] += latencia
+        return list(ingredientes), [l.replace(_NOMBRE, nombre) for l in instrucciones]
+
+    def guardar(self, pedido: str, nombre: str, ingredientes, instrucciones_lines, latencia_llm=0.0):
+        clave = normalizar_pedido(pedido)
+        if not clave or not ingredientes:
+            return   # sólo cacheamos respuestas que realmente son recetas
+        if len(nombre) >= 3:
+            patron = re.compile(rf"\b{re.escape(nombre)}\b")
+            instrucciones = tuple(patron.sub(_NOMBRE, l) for l in instrucciones_lines)
+        else:
+            instrucciones = tuple(instrucciones_lines)
+        with self._lock:
+            self._entradas[clave] = (time.monotonic(), tuple(ingredientes), instrucciones, latencia_llm)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.stats["desalojos"] += 1
+
+    def metricas(self):
+        consultas = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "segundos_llm_ahorrados": round(self.stats["segundos_llm_ahorrados"], 2),
+            "hit_rate": round(self.stats["hits"] / consultas, 3) if consultas else None,
+            "entradas": len(self._entradas),
+            "max_entradas": self.max_entradas,
+        }
+
+
+cache_recetas = CacheRecetas()
@@ -0,0 +1,142 @@
+"""
+Índice invertido de trigramas para preseleccionar candidatos antes del fuzzy matching.
+
+Puntuar cada ingrediente contra todo el catálogo (extractOne / cdist) es O(ingredientes x productos):
+con la planilla actual no importa, con el feed completo de un supermercado sí. Al cargar el
+catálogo se arma, por cada trigrama de caracteres, la lista de nombres que lo contienen (postings)
+y su IDF. Para una consulta se suman los IDF de sus trigramas en cada nombre que los comparte
+(un bincount sobre las postings) y sólo los MATCH_CANDIDATOS mejores pasan a rapidfuzz.
+
+Los trigramas demasiado comunes (en más de MATCH_MAX_DF de los nombres) no se indexan:
+aportan casi nada de IDF y son la mayor parte de las postings.
+
+Recall contra puntuar todo el catálogo: `python benchmark.py bloqueo`.
+"""
+import os
+import numpy as np
+
+MATCH_CANDIDATOS = int(os.getenv("MATCH_CANDIDATOS", "300"))        # nombres que pasan a rapidfuzz por consulta
+MATCH_BLOQUEO_MIN = int(os.getenv("MATCH_BLOQUEO_MIN", "5000"))     # por debajo de esto se puntúa todo el catálogo
+MATCH_MAX_DF = float(os.getenv("MATCH_MAX_DF", "0.2"))
+# Tope de candidatos con exactamente el mismo puntaje (la misma marca en mil presentaciones no
+# debe llenar la preselección); entre ellos quedan los más cortos
+MATCH_POR_PUNTAJE = int(os.getenv("MATCH_POR_PUNTAJE", "5"))
+
+
+def trigramas(texto):
+    """
+    Trigramas de cada palabra con un espacio de relleno, más la palabra entera (con "#" adelante,
+    pesa por su propio IDF): "pan rallado" -> {" pa", "pan", "an ", " ra", ..., "#pan", "#rallado"}.
+    """
+    grams = set()
+    for palabra in texto.split():
+        grams.add("#" + palabra)
+        palabra = f" {palabra} "
+        grams.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return grams
+
+
+class IndiceCandidatos:
+    """
+    Postings de trigramas sobre `nombres` (ya normalizados, p. ej. en minúscula) en formato CSR:
+    las filas de `_nombres_de[_inicio[g]:_inicio[g + 1]]` son los nombres que contienen el trigrama g.
+    """
+
+    def __init__(self, nombres, max_df=MATCH_MAX_DF):
+        self.n = len(nombres)
+        ids = {}
+        filas_gram, filas_nombre, largos = [], [], np.zeros(self.n, dtype=np.float64)
+        for i, nombre in enumerate(nombres):
+            grams = trigramas(nombre)
+            largos[i] = len(grams)
+            for g in grams:
+                filas_gram.append(ids.setdefault(g, len(ids)))
+            filas_nombre.extend([i] * len(grams))
+
+        filas_gram = np.asarray(filas_gram, dtype=np.int64)
+        filas_nombre = np.asarray(filas_nombre, dtype=np.int32)
+        df = np.bincount(filas_gram, minlength=len(ids))
+        indexables = df <= max(1, max_df * self.n)
+        conservar = indexables[filas_gram]
+        filas_gram, filas_nombre = filas_gram[conservar], filas_nombre[conservar]
+
+        orden = np.argsort(filas_gram, kind="stable")      # estable: postings en orden de catálogo
+        self._nombres_de = filas_nombre[orden]
+        self._inicio = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(filas_gram, minlength=len(ids)), out=self._inicio[1:])
+        self._ids = {g: i for g, i in ids.items() if indexables[i]}
+        self._idf = np.log(self.n / np.maximum(df, 1)) + 1.0
+        self._largos = largos
+
+    def __len__(self):
+        return self.n
+
+    def a_arrays(self):
+        """El índice como arrays planos, para guardarlo en un archivo mapeable (ver catalogoCompartido.py)."""
+        gramas = sorted((g.encode("utf-8"), i) for g, i in self._ids.items())
+        return {
+            "nombres_de": self._nombres_de,
+            "inicio": self._inicio,
+            "idf": self._idf,
+            "largos": self._largos,
+            "gramas": np.array([g for g, _ in gramas] or [b""], dtype=bytes),
+            "gramas_id": np.array([i for _, i in gramas] or [-1], dtype=np.int64),
+        }
+
+    @classmethod
+    def desde_arrays(cls, arrays):
+        """Inverso de a_arrays; los arrays pueden ser vistas de sólo lectura sobre un mmap."""
+        indice = cls.__new__(cls)
+        indice.n = len(arrays["largos"])
+        indice._nombres_de = arrays["nombres_de"]
+        indice._inicio = arrays["inicio"]
+        indice._idf = arrays["idf"]
+        indice._largos = arrays["largos"]
+        indice._ids = GramasOrdenados(arrays["gramas"], arrays["gramas_id"])
+        return indice
+
+    def buscar(self, consulta, k=MATCH_CANDIDATOS, por_puntaje=MATCH_POR_PUNTAJE):
+        """Hasta `k` posiciones de nombres que comparten trigramas con la consulta, en orden de catálogo."""
+        grams = [i for i in map(self._ids.get, trigramas(consulta)) if i is not None]
+        if not grams:
+            return np.empty(0, dtype=np.intp)
+        tramos = [self._nombres_de[self._inicio[g]:self._inicio[g + 1]] for g in grams]
+        pesos = np.repeat(self._idf[grams], [len(t) for t in tramos])
+        puntaje = np.bincount(np.concatenate(tramos), weights=pesos, minlength=self.n)
+        candidatos = np.flatnonzero(puntaje)
+        if len(candidatos) > k:
+            # Primero un pozo amplio con los mejores puntajes; se ordena por puntaje, largo y posición
+            pozo = min(len(candidatos), k * por_puntaje * 4)
+            if len(candidatos) > pozo:
+                candidatos = candidatos[np.argpartition(-puntaje[candidatos], pozo - 1)[:pozo]]
+            valores = puntaje[candidatos]
+            orden = np.lexsort((candidatos, self._largos[candidatos], -valores))
+            candidatos, valores = candidatos[orden], valores[orden]
+            # ...y de cada grupo con el mismo puntaje pasan sólo los primeros `por_puntaje`
+            inicio_grupo = np.flatnonzero(np.r_[True, valores[1:] != valores[:-1]])
+            rango = np.arange(len(valores)) - np.repeat(inicio_grupo, np.diff(np.r_[inicio_grupo, len(valores)]))
+            candidatos = candidatos[rango < por_puntaje][:k]
+        # En orden de catálogo, así extractOne desempata igual que sobre la lista completa
+        return np.sort(candidatos)
+
+
+class GramasOrdenados:
+    """Trigrama -> id con búsqueda binaria sobre un array ordenado (sin dict propio por proceso)."""
+
+    def __init__(self, gramas, ids):
+        self.gramas = gramas
+        self.ids = ids
+
+    def get(self, grama):
+        clave = grama.encode("utf-8")
+        i = int(np.searchsorted(self.gramas, clave))
+        if i < len(self.gramas) and self.gramas[i] == clave:
+            return int(self.ids[i])
+        return None
+
+
+def armar_si_conviene(nombres, minimo=MATCH_BLOQUEO_MIN):
+    """El índice de candidatos si el catálogo es lo bastante grande para que valga la pena, si no None."""
+    if len(nombres) < minimo:
+        return None
+    return IndiceCandidatos(nombres)
@@ -0,0 +1,174 @@
+"""
+Generador de carga para app.py: reproduce payloads grabados de WhatsApp (payloads_webhook.json)
+contra POST /webhook, o pedidos a /generate-recipe, a un ritmo objetivo (RPS, lazo abierto).
+
+Cada "viaje" usa un número de WhatsApp nuevo y ids de mensaje únicos, y espera la respuesta
+que la app manda al WhatsApp falso (serviciosFalsos.py) para medir la latencia de punta a punta.
+
+Uso:
+    python cargaWebhook.py --escenario receta,pedido --rps 5 --duracion 30
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import time
+import httpx
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PAYLOADS = os.path.join(BASE_DIR, "payloads_webhook.json")
+
+# escenario -> pasos (payload, tipo de mensaje que cierra el paso en el WhatsApp falso)
+ESCENARIOS = {
+    "saludo": [("hola", "text")],
+    "receta": [("receta_bizcochuelo", "interactive")],
+    "pedido": [("receta_milanesas", "interactive"), ("boton_disco", "text")],
+    "listar": [("receta_pizza", "interactive"), ("boton_listar", "text")],
+    "cancelar": [("receta_bizcochuelo", "interactive"), ("cancelar", "text")],
+}
+# "mixto": un escenario al azar por viaje con estos pesos
+MIXTO = {"saludo": 2, "receta": 5, "pedido": 2, "listar": 1}
+
+
+def percentil(valores, p):
+    if not valores:
+        return float("nan")
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def preparar_payload(original, numero, secuencia):
+    """Copia del payload grabado con otro remitente, un id de mensaje único y la hora actual."""
+    payload = copy.deepcopy(original)
+    value = payload["entry"][0]["changes"][0]["value"]
+    value["contacts"][0]["wa_id"] = numero
+    mensaje = value["messages"][0]
+    mensaje["from"] = numero
+    mensaje["id"] = f"wamid.carga.{numero}.{secuencia}"
+    mensaje["timestamp"] = str(int(time.time()))
+    return payload
+
+
+class Carga:
+    def __init__(self, app_url, falsos_url, timeout):
+        self.app_url = app_url.rstrip("/")
+        self.falsos_url = falsos_url.rstrip("/")
+        self.timeout = timeout
+        with open(PAYLOADS, encoding="utf-8") as f:
+            self.payloads = json.load(f)
+        self.cliente = httpx.AsyncClient(
+            timeout=timeout + 5,
+            limits=httpx.Limits(max_connections=2000, max_keepalive_connections=200),
+        )
+        self.corrida = random.randrange(10**5, 10**6)
+        self.viajes = 0         # numeración global: la app descarta ids de mensaje repetidos
+
+    async def viaje_webhook(self, pasos, i):
+        """Manda los pasos en orden y espera la respuesta de cada uno. Devuelve las mediciones."""
+        numero = f"598{self.corrida}{i:06d}"
+        medicion = {"ack": [], "e2e": None, "error": None}
+        for secuencia, (nombre, tipo) in enumerate(pasos):
+            payload = preparar_payload(self.payloads[nombre], numero, secuencia)
+            enviado = time.time()
+            try:
+                r = await self.cliente.post(f"{self.app_url}/webhook", json=payload)
+            except httpx.HTTPError as e:
+                medicion["error"] = type(e).__name__
+                return medicion
+            medicion["ack"].append(time.time() - enviado)
+            if r.status_code != 200:
+                medicion["error"] = f"HTTP {r.status_code}"
+                return medicion
+
+            r = await self.cliente.get(
+                f"{self.falsos_url}/whatsapp/esperar",
+                params={"numero": numero, "desde": enviado, "tipo": tipo, "timeout": self.timeout},
+            )
+            if r.status_code != 200:
+                medicion["error"] = "sin respuesta"
+                return medicion
+            medicion["e2e"] = r.json()["timestamp"] - enviado
+        return medicion
+
+    async def viaje_generate_recipe(self, i):
+        medicion = {"ack": [], "e2e": None, "error": None}
+        cuerpo = {"nombre": "Carga", "mensaje": random.choice(["bizcochuelo", "milanesas con puré", "pizza casera"]),
+                  "numero": f"598{self.corrida}{i:06d}"}
+        inicio = time.time()
+        try:
+            r = await self.cliente.post(f"{self.app_url}/generate-recipe", json=cuerpo)
+        except httpx.HTTPError as e:
+            medicion["error"] = type(e).__name__
+            return medicion
+        medicion["e2e"] = time.time() - inicio
+        if r.status_code != 200:
+            medicion["error"] = f"HTTP {r.status_code}"
+        return medicion
+
+    def viaje(self, escenario, i):
+        if escenario == "generate_recipe":
+            return self.viaje_generate_recipe(i)
+        if escenario == "mixto":
+            escenario = random.choices(list(MIXTO), weights=list(MIXTO.values()))[0]
+        return self.viaje_webhook(ESCENARIOS[escenario], i)
+
+    async def correr(self, escenario, rps, duracion):
+        await self.cliente.post(f"{self.falsos_url}/contadores/reset")
+        tareas = []
+        inicio = time.monotonic()
+        while time.monotonic() - inicio < duracion:
+            # Lazo abierto: se lanza según el reloj, sin esperar a que terminen los anteriores
+            espera = inicio + len(tareas) / rps - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            tareas.append(asyncio.create_task(self.viaje(escenario, self.viajes)))
+            self.viajes += 1
+        mediciones = await asyncio.gather(*tareas)
+        total = time.monotonic() - inicio
+        contadores = (await self.cliente.get(f"{self.falsos_url}/contadores")).json()
+        return mediciones, total, contadores
+
+
+def reportar(escenario, rps, mediciones, total, contadores):
+    errores = [m["error"] for m in mediciones if m["error"]]
+    completos = len(mediciones) - len(errores)
+    acks = [a * 1000 for m in mediciones for a in m["ack"]]
+    e2e = [m["e2e"] * 1000 for m in mediciones if m["e2e"] is not None and not m["error"]]
+
+    print(f"📈 Escenario {escenario}: {len(mediciones)} viajes, objetivo {rps:.1f}/s, "
+          f"logrado {completos / total:.1f}/s en {total:.1f} s")
+    print(f"  errores: {len(errores)} ({len(errores) / max(1, len(mediciones)):.1%})"
+          + (f"  {dict((e, errores.count(e)) for e in set(errores))}" if errores else ""))
+    print(f"  {'latencia (ms)':22s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'máx':>8s}")
+    for nombre, valores in [("ack del webhook", acks), ("punta a punta", e2e)]:
+        if valores:
+            print(f"  {nombre:22s} {percentil(valores, 0.5):8.1f} {percentil(valores, 0.95):8.1f} "
+                  f"{percentil(valores, 0.99):8.1f} {max(valores):8.1f}")
+    llamadas = ", ".join(f"{k}={v}" for k, v in sorted(contadores.items()))
+    print(f"  llamadas a servicios: {llamadas or 'ninguna'}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Carga sobre /webhook y /generate-recipe")
+    parser.add_argument("--escenario", default="mixto",
+                        help=f"uno o varios separados por coma: {', '.join([*ESCENARIOS, 'mixto', 'generate_recipe'])}")
+    parser.add_argument("--rps", type=float, default=5)
+    parser.add_argument("--duracion", type=float, default=30, help="segundos lanzando viajes")
+    parser.add_argument("--app", default=os.getenv("CARGA_APP_URL", "http://127.0.0.1:8000"))
+    parser.add_argument("--falsos", default=os.getenv("CARGA_FALSOS_URL", "http://127.0.0.1:9000"))
+    parser.add_argument("--timeout", type=float, default=60, help="espera máxima de cada respuesta")
+    args = parser.parse_args()
+
+    carga = Carga(args.app, args.falsos, args.timeout)
+    try:
+        for escenario in args.escenario.split(","):
+            mediciones, total, contadores = await carga.correr(escenario.strip(), args.rps, args.duracion)
+            reportar(escenario.strip(), args.rps, mediciones, total, contadores)
+    finally:
+        await carga.cliente.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+import requests
+from dotenv import load_dotenv
+from indice import indice_registrado, registrar_indice
+from metricas import medir_llamada
+from registro import obtener_registro
+
+load_dotenv()
+
+API_URL_PRODUCTOS = os.getenv("API_URL_PRODUCTOS", "http://127.0.0.1:5003/productos")
+CATALOGO_TTL = float(os.getenv("CATALOGO_TTL", "300"))           # segundos que el catálogo se considera fresco
+CATALOGO_TIMEOUT = float(os.getenv("CATALOGO_TIMEOUT", "5"))
+# Sólo los campos que usa el matching (apiProductos proyecta la respuesta con ?fields=)
+CATALOGO_CAMPOS = "nombre_producto,supermercado,precio,id"
+
+log = obtener_registro("catalogo")
+
+
+class CatalogoCache:
+    """
+    Cache del catálogo de productos de apiProductos.
+
+    - Mientras el catálogo está fresco (TTL) se devuelve sin tocar la red.
+    - Cuando vence se sigue devolviendo la copia vieja y se refresca en segundo
+      plano (stale-while-revalidate), así una API lenta o caída no bloquea la receta.
+    - El refresco es condicional (ETag / Last-Modified): si no cambió, la API
+      responde 304 y no se vuelve a bajar ni decodificar el catálogo.
+    - Si ya se conoce la versión/época del servidor, primero se piden sólo los cambios
+      (/productos/changes) y se aplican sobre la copia local y sobre el índice de matching;
+      ante 410 (apiProductos se reinició) o cualquier error se baja el catálogo completo.
+    """
+
+    def __init__(self, url=API_URL_PRODUCTOS, ttl=CATALOGO_TTL, timeout=CATALOGO_TIMEOUT):
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.productos = []
+        self.version = 0            # se incrementa cada vez que llega un catálogo distinto
+        self.etag = None
+        self.last_modified = None
+        self.version_servidor = None    # X-Catalogo-Version / X-Catalogo-Epoca del último estado sincronizado
+        self.epoca = None
+        self._posiciones = {}
+        self.cargado_en = 0.0
+        self._lock = threading.Lock()
+        self._refrescando = False
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "refrescos": 0, "no_modificados": 0, "deltas": 0, "errores": 0}
+
+    def _fresco(self):
+        return bool(self.productos) and (time.monotonic() - self.cargado_en) < self.ttl
+
+    @staticmethod
+    def _clave(p):
+        return (p["nombre_producto"], str(p.get("supermercado", "")).lower())
+
+    def _sincronizar_delta(self):
+        """
+        Aplica /productos/changes sobre la copia local. Devuelve True si quedó sincronizado,
+        False si hay que bajar el catálogo completo.
+        """
+        try:
+            with medir_llamada("productos") as llamada:
+                resp = requests.get(
+                    f"{self.url}/changes",
+                    params={"since": self.version_servidor, "epoca": self.epoca},
+                    timeout=self.timeout,
+                )
+                llamada.codigo(resp.status_code)
+        except Exception as e:
+            log.warning("⚠️ Error pidiendo cambios del catálogo", error=str(e))
+            return False
+        if resp.status_code != 200:
+            return False
+
+        data = resp.json()
+        campos = CATALOGO_CAMPOS.split(",")
+        cambios = [{c: p[c] for c in campos if c in p} for p in data.get("cambios", [])]
+        eliminados = data.get("eliminados", [])
+        if not cambios and not eliminados:
+            with self._lock:
+                self.version_servidor = data.get("version", self.version_servidor)
+                self.cargado_en = time.monotonic()
+                self.stats["no_modificados"] += 1
+            return True
+
+        viejos = self.productos
+        productos = list(viejos)
+        posiciones = dict(self._posiciones)
+        for p in cambios:
+            clave = self._clave(p)
+            if clave in posiciones:
+                productos[posiciones[clave]] = p
+            else:
+                posiciones[clave] = len(productos)
+                productos.append(p)
+        borrar = {self._clave(e) for e in eliminados} & posiciones.keys()
+        if borrar:
+            productos = [p for p in productos if self._clave(p) not in borrar]
+            posiciones = {self._clave(p): i for i, p in enumerate(productos)}
+
+        # Si el índice de matching ya estaba armado se actualiza en lugar de rearmarlo
+        indice = indice_registrado(viejos)
+        if indice is not None:
+            registrar_indice(productos, indice.actualizar(cambios, eliminados))
+
+        with self._lock:
+            self.productos = productos
+            self._posiciones = posiciones
+            self.version += 1
+            self.version_servidor = data["version"]
+            self.etag = None            # el ETag del GET completo ya no describe esta copia
+            self.cargado_en = time.monotonic()
+            self.stats["deltas"] += 1
+        log.info("📦 Catálogo actualizado por delta", cambios=len(cambios), eliminados=len(borrar), version=self.version)
+        return True
+
+    def _leer_version(self, resp):
+        """Toma versión/época del servidor de un GET completo (200 o 304). Llamar con el lock tomado."""
+        version_servidor = resp.headers.get("X-Catalogo-Version")
+        self.version_servidor = int(version_servidor) if version_servidor else None
+        self.epoca = resp.headers.get("X-Catalogo-Epoca")
+
+    def _descargar(self):
+        """Hace el GET condicional y actualiza el estado. Devuelve True si hay catálogo usable."""
+        if self.productos and self.version_servidor is not None and self._sincronizar_delta():
+            return True
+
+        headers = {}
+        if self.productos:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+        try:
+            with medir_llamada("productos") as llamada:
+                resp = requests.get(self.url, params={"fields": CATALOGO_CAMPOS}, headers=headers, timeout=self.timeout)
+                llamada.codigo(resp.status_code)
+        except Exception as e:
+            self.stats["errores"] += 1
+            log.warning("⚠️ Error obteniendo productos", error=str(e))
+            return bool(self.productos)
+
+        if resp.status_code == 304:
+            with self._lock:
+                # Mismo contenido, pero puede ser otra época (apiProductos se reinició): sin esto
+                # cada refresco volvería a pedir /changes con la época vieja y recibir 410
+                self._leer_version(resp)
+                self.cargado_en = time.monotonic()
+                self.stats["no_modificados"] += 1
+            return True
+
+        if resp.status_code == 200:
+            productos = resp.json()
+            with self._lock:
+                self.productos = productos
+                self._posiciones = {self._clave(p): i for i, p in enumerate(productos)}
+                self.version += 1
+                self.etag = resp.headers.get("ETag")
+                self.last_modified = resp.headers.get("Last-Modified")
+                self._leer_version(resp)
+                self.cargado_en = time.monotonic()
+                self.stats["refrescos"] += 1
+            log.info("📦 Catálogo cargado", productos=len(productos), version=self.version)
+            return True
+
+        self.stats["errores"] += 1
+        log.warning("⚠️ apiProductos respondió con error", status=resp.status_code)
+        return bool(self.productos)
+
+    def _refrescar_en_segundo_plano(self):
+        with self._lock:
+            if self._refrescando:
+                return
+            self._refrescando = True
+
+        def tarea():
+            try:
+                self._descargar()
+            finally:
+                with self._lock:
+                    self._refrescando = False
+
+        threading.Thread(target=tarea, name="refresco-catalogo", daemon=True).start()
+
+    def obtener(self):
+        """Devuelve la lista de productos, descargándola sólo si hace falta."""
+        if self._fresco():
+            self.stats["hits"] += 1
+            return self.productos
+
+        if self.productos:
+            # Vencido: servimos la copia vieja y revalidamos sin bloquear
+            self.stats["stale"] += 1
+            self._refrescar_en_segundo_plano()
+            return self.productos
+
+        # Primera carga (o nunca se pudo cargar): no queda otra que esperar
+        self.stats["misses"] += 1
+        self._descargar()
+        return self.productos
+
+    def invalidar(self):
+        """Fuerza que la próxima llamada revalide contra la API."""
+        with self._lock:
+            self.cargado_en = 0.0
+
+    def metricas(self):
+        return {
+            **self.stats,
+            "productos": len(self.productos),
+            "version": self.version,
+            "version_servidor": self.version_servidor,
+            "edad_segundos": round(time.monotonic() - self.cargado_en, 1) if self.cargado_en else None,
+            "ttl": self.ttl,
+        }
+
+
+catalogo = CatalogoCache()
@@ -0,0 +1,311 @@
+"""
+Catálogo compartido entre workers (varios procesos de uvicorn/gunicorn en la misma máquina).
+
+Sin esto cada worker baja su propia lista de productos y arma su propio IndiceProductos:
+la memoria crece linealmente con la cantidad de workers. Con CATALOGO_COMPARTIDO=<directorio>
+(mejor en /dev/shm) el índice se serializa una vez por versión en un archivo plano y todos
+los workers lo mapean de sólo lectura (mmap): las páginas las comparte el kernel.
+
+- Un solo proceso publica: el que toma el lock del directorio (flock). Ese worker usa la
+  CatalogoCache de siempre (TTL, ETag, deltas) y, cuando cambia la versión, escribe
+  catalogo-<version>.bin y reemplaza el puntero ACTUAL con os.replace (swap atómico).
+  Si muere, el lock se libera y lo toma otro. También se puede correr aparte:
+      CATALOGO_COMPARTIDO=/dev/shm/chef python catalogoCompartido.py
+- Los demás sólo miran el puntero (un stat cada CATALOGO_COMPARTIDO_CHEQUEO segundos) y
+  mapean la versión nueva. Los requests en curso siguen con el mapeo viejo hasta terminar.
+  Al arrancar (`iniciar`) se espera una vez a que haya algo publicado; después `obtener`
+  nunca espera: si todavía no hay catálogo devuelve [] como la cache sin catálogo.
+- El archivo trae matriz de precios, ids, nombres (texto UTF-8 + offsets, se decodifican al
+  usarlos) y el índice de trigramas: IndiceCompartido tiene las consultas de IndiceLectura
+  (las mismas que usa ai.py sobre IndiceProductos), sin la parte que arma o actualiza.
+"""
+import fcntl
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import numpy as np
+from candidatos import IndiceCandidatos
+from catalogo import catalogo
+from indice import IndiceLectura, obtener_indice
+from registro import obtener_registro
+
+CATALOGO_COMPARTIDO = os.getenv("CATALOGO_COMPARTIDO")                          # directorio; vacío = desactivado
+CATALOGO_COMPARTIDO_CHEQUEO = float(os.getenv("CATALOGO_COMPARTIDO_CHEQUEO", "1"))     # segundos entre stats del puntero
+CATALOGO_COMPARTIDO_PUBLICAR = os.getenv("CATALOGO_COMPARTIDO_PUBLICAR", "1") == "1"   # 0: este proceso nunca publica
+CATALOGO_COMPARTIDO_ESPERA = float(os.getenv("CATALOGO_COMPARTIDO_ESPERA", "5"))       # espera a la primera publicación (al arrancar)
+
+MAGIA = b"CHEFCAT1"
+ALINEACION = 64
+log = obtener_registro("compartido")
+
+
+def _alinear(n):
+    return (n + ALINEACION - 1) // ALINEACION * ALINEACION
+
+
+def _tabla_textos(textos):
+    """Lista de textos -> (bytes UTF-8 concatenados, offsets int64 con len + 1 entradas)."""
+    codificados = [t.encode("utf-8") for t in textos]
+    offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in codificados], out=offsets[1:])
+    return np.frombuffer(b"".join(codificados), dtype=np.uint8), offsets
+
+
+def escribir(indice, ruta):
+    """Serializa un IndiceProductos en `ruta`: encabezado JSON + arrays alineados a 64 bytes."""
+    filas, cadenas = indice.matriz.shape
+    arrays = {"matriz": np.ascontiguousarray(indice.matriz, dtype=np.float64)}
+    for nombre, textos in [
+        ("nombres_filas", indice.nombres_filas),
+        ("nombres_norm", indice.nombres_norm),
+        # ids de cualquier tipo (int / str) como JSON; "" = sin id
+        ("ids", ["" if id_ is None else json.dumps(id_) for id_ in indice.ids.ravel().tolist()]),
+    ]:
+        arrays[f"{nombre}_datos"], arrays[f"{nombre}_offsets"] = _tabla_textos(textos)
+    if indice.candidatos is not None:
+        arrays.update({f"candidatos_{k}": v for k, v in indice.candidatos.a_arrays().items()})
+
+    descripcion, desplazamiento = {}, 0
+    for nombre, array in arrays.items():
+        descripcion[nombre] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": desplazamiento}
+        desplazamiento = _alinear(desplazamiento + array.nbytes)
+    encabezado = json.dumps({
+        "version": indice.version,
+        "supermercados": indice.supermercados,
+        "fila_categoria": indice.fila_categoria,
+        "nombres": len(indice.nombres),
+        "forma": [filas, cadenas],
+        "arrays": descripcion,
+    }).encode("utf-8")
+
+    inicio_datos = _alinear(len(MAGIA) + 8 + len(encabezado))
+    with open(ruta, "wb") as f:
+        f.write(MAGIA + struct.pack("<Q", len(encabezado)) + encabezado)
+        for nombre, array in arrays.items():
+            f.seek(inicio_datos + descripcion[nombre]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(inicio_datos + desplazamiento)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class _Textos:
+    """Secuencia de textos sobre una tabla (datos, offsets) mapeada: decodifica sólo lo que se lee."""
+
+    def __init__(self, mapa, inicio, offsets, largo=None):
+        self._mapa = mapa
+        self._inicio = inicio
+        self._offsets = offsets
+        self._largo = len(offsets) - 1 if largo is None else largo
+
+    def __len__(self):
+        return self._largo
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._largo
+        if not 0 <= i < self._largo:
+            raise IndexError(i)
+        a, b = self._offsets[i], self._offsets[i + 1]
+        return self._mapa[self._inicio + a:self._inicio + b].decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(self._largo))
+
+
+class _Ids:
+    """ids[fila, columna] como en IndiceProductos.ids, leídos del mapeo (None si no hay)."""
+
+    def __init__(self, textos, cadenas):
+        self._textos = textos
+        self._cadenas = cadenas
+
+    def __getitem__(self, posicion):
+        fila, columna = posicion
+        texto = self._textos[int(fila) * self._cadenas + int(columna)]
+        return json.loads(texto) if texto else None
+
+
+class IndiceCompartido(IndiceLectura):
+    """
+    Índice de sólo lectura sobre un archivo publicado con `escribir`: mejor / puntuar /
+    resultado / canasta de IndiceLectura. Para actualizarlo se publica otra versión.
+    """
+
+    def __init__(self, ruta):
+        with open(ruta, "rb") as f:
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.ruta = ruta
+        if self._mapa[:len(MAGIA)] != MAGIA:
+            raise ValueError(f"{ruta} no es un catálogo compartido")
+        (largo,) = struct.unpack("<Q", self._mapa[len(MAGIA):len(MAGIA) + 8])
+        encabezado = json.loads(self._mapa[len(MAGIA) + 8:len(MAGIA) + 8 + largo])
+        inicio_datos = _alinear(len(MAGIA) + 8 + largo)
+
+        arrays = {}
+        for nombre, d in encabezado["arrays"].items():
+            dtype = np.dtype(d["dtype"])
+            cantidad = int(np.prod(d["shape"]))
+            arrays[nombre] = np.frombuffer(self._mapa, dtype=dtype, count=cantidad,
+                                           offset=inicio_datos + d["offset"]).reshape(d["shape"])
+        filas, cadenas = encabezado["forma"]
+
+        def textos(nombre, largo=None):
+            return _Textos(self._mapa, inicio_datos + encabezado["arrays"][f"{nombre}_datos"]["offset"],
+                           arrays[f"{nombre}_offsets"], largo)
+
+        self.version = encabezado["version"]
+        self.supermercados = encabezado["supermercados"]
+        self.columna = {s: j for j, s in enumerate(self.supermercados)}
+        self.fila_categoria = encabezado["fila_categoria"]
+        self.matriz = arrays["matriz"]
+        self.ids = _Ids(textos("ids"), cadenas)
+        self.nombres_filas = textos("nombres_filas")
+        self.nombres = textos("nombres_filas", encabezado["nombres"])
+        # La presentación se parsea del nombre al usarla (unidades.presentacion tiene memo)
+        self.presentaciones = {}
+        if "candidatos_largos" in arrays:
+            self.candidatos = IndiceCandidatos.desde_arrays(
+                {k[len("candidatos_"):]: v for k, v in arrays.items() if k.startswith("candidatos_")}
+            )
+            self.nombres_norm = textos("nombres_norm")
+        else:
+            # Catálogo chico: se puntúa entero con cdist, que necesita una lista
+            self.candidatos = None
+            self.nombres_norm = list(textos("nombres_norm"))
+
+
+class CatalogoCompartido:
+    """
+    Reemplazo de CatalogoCache.obtener para varios workers: devuelve el IndiceCompartido vigente
+    (ai.obtener_indice lo usa tal cual). Ver el docstring del módulo.
+    """
+
+    def __init__(self, directorio, fuente=catalogo, chequeo=CATALOGO_COMPARTIDO_CHEQUEO,
+                 publicar=CATALOGO_COMPARTIDO_PUBLICAR):
+        self.directorio = directorio
+        self.fuente = fuente
+        self.chequeo = chequeo
+        self.publicar = publicar
+        self.puntero = os.path.join(directorio, "ACTUAL")
+        self.actual = None
+        self._firma_puntero = None
+        self._chequeado = 0.0
+        self._lock_archivo = None       # abierto y con flock mientras este proceso sea el publicador
+        self._publicado_de = None
+        self._lock = threading.Lock()
+        self.stats = {"mapeos": 0, "publicaciones": 0, "errores": 0}
+        os.makedirs(directorio, exist_ok=True)
+
+    # --- publicador ---
+    def _ser_publicador(self):
+        if self._lock_archivo is not None:
+            return True
+        if not self.publicar:
+            return False
+        f = open(os.path.join(self.directorio, "publicador.lock"), "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        self._lock_archivo = f
+        log.info("📡 Este proceso publica el catálogo compartido", pid=os.getpid(), directorio=self.directorio)
+        return True
+
+    def _publicar_si_cambio(self):
+        productos = self.fuente.obtener()
+        if not productos or productos is self._publicado_de:
+            return
+        indice = obtener_indice(productos)
+        nombre = f"catalogo-{indice.version}.bin"
+        ruta = os.path.join(self.directorio, nombre)
+        if not os.path.exists(ruta):
+            escribir(indice, f"{ruta}.tmp")
+            os.replace(f"{ruta}.tmp", ruta)
+        with open(f"{self.puntero}.tmp", "w") as f:
+            f.write(nombre)
+        os.replace(f"{self.puntero}.tmp", self.puntero)     # swap atómico: nadie lee un puntero a medias
+        self._publicado_de = productos
+        self.stats["publicaciones"] += 1
+        log.info("📡 Catálogo compartido publicado", version=indice.version, productos=len(indice),
+                 bytes=os.path.getsize(ruta))
+        self._limpiar(conservar={nombre, os.path.basename(self.actual.ruta) if self.actual else None})
+
+    def _limpiar(self, conservar):
+        """Borra versiones viejas; quien todavía las tenga mapeadas las sigue leyendo (el inodo vive)."""
+        for ruta in glob.glob(os.path.join(self.directorio, "catalogo-*.bin")):
+            if os.path.basename(ruta) not in conservar:
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+
+    # --- lectores ---
+    def _releer_puntero(self):
+        try:
+            st = os.stat(self.puntero)
+        except FileNotFoundError:
+            return
+        firma = (st.st_ino, st.st_mtime_ns)
+        if firma == self._firma_puntero:
+            return
+        with open(self.puntero) as f:
+            nombre = f.read().strip()
+        ruta = os.path.join(self.directorio, nombre)
+        if self.actual is None or self.actual.ruta != ruta:
+            self.actual = IndiceCompartido(ruta)
+            self.stats["mapeos"] += 1
+            log.info("🗺️ Catálogo compartido mapeado", version=self.actual.version, productos=len(self.actual))
+        self._firma_puntero = firma
+
+    def _sincronizar(self):
+        with self._lock:
+            try:
+                if self._ser_publicador():
+                    self._publicar_si_cambio()
+                self._releer_puntero()
+            except Exception as e:
+                self.stats["errores"] += 1
+                log.warning("⚠️ Error sincronizando el catálogo compartido", error=str(e))
+            self._chequeado = time.monotonic()
+
+    def iniciar(self, espera=CATALOGO_COMPARTIDO_ESPERA):
+        """Al arrancar el worker: sincroniza y espera hasta `espera` segundos a la primera publicación."""
+        limite = time.monotonic() + espera
+        self._sincronizar()
+        while self.actual is None and time.monotonic() < limite:
+            time.sleep(0.1)
+            self._sincronizar()
+        if self.actual is None:
+            log.warning("⚠️ Todavía no hay catálogo compartido publicado", directorio=self.directorio)
+
+    def obtener(self):
+        """El IndiceCompartido vigente, o [] si todavía nadie publicó (no espera)."""
+        if time.monotonic() - self._chequeado >= self.chequeo:
+            self._sincronizar()
+        return self.actual if self.actual is not None else []
+
+    def metricas(self):
+        return {
+            **self.stats,
+            "publicador": self._lock_archivo is not None,
+            "version": self.actual.version if self.actual else None,
+            "bytes_mapeados": len(self.actual._mapa) if self.actual else 0,
+        }
+
+
+catalogo_compartido = CatalogoCompartido(CATALOGO_COMPARTIDO) if CATALOGO_COMPARTIDO else None
+
+
+if __name__ == "__main__":
+    # Publicador dedicado: ningún worker necesita bajar el catálogo ni armar el índice
+    if not catalogo_compartido:
+        raise SystemExit("Definí CATALOGO_COMPARTIDO con el directorio a publicar (p. ej. /dev/shm/chef)")
+    while True:
+        catalogo_compartido._sincronizar()
+        time.sleep(CATALOGO_COMPARTIDO_CHEQUEO)
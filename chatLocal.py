@@ -11,6 +11,7 @@ def enviar_pedido(supermercado, productos_pedido, usuario_numero):
     """
     pedido = {
         "usuario": usuario_numero,
+        "numero": usuario_numero,
         "supermercado": supermercado,
         "productos": productos_pedido,
         "timestamp": "2025-01-01T00:00:00Z"
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from metricas import observar
+from registro import obtener_registro
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_COLA_MAX = int(os.getenv("WEBHOOK_COLA_MAX", "1000"))
+WEBHOOK_DEDUP_MAX = int(os.getenv("WEBHOOK_DEDUP_MAX", "10000"))   # ids de mensajes recordados para descartar reenvíos
+WEBHOOK_COLA_USUARIO_MAX = int(os.getenv("WEBHOOK_COLA_USUARIO_MAX", "50"))   # mensajes pendientes de un mismo número
+
+log = obtener_registro("cola")
+
+
+class _Tiempos:
+    """Acumulador simple: cantidad, promedio y máximo en segundos."""
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.maximo = 0.0
+
+    def agregar(self, segundos):
+        self.n += 1
+        self.total += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def resumen(self):
+        return {
+            "n": self.n,
+            "promedio_ms": round(self.total / self.n * 1000, 1) if self.n else None,
+            "max_ms": round(self.maximo * 1000, 1),
+        }
+
+
+class ColaMensajes:
+    """
+    Cola en proceso para los mensajes del webhook de WhatsApp, con orden por usuario.
+
+    El webhook encola y responde 200 enseguida (Meta reintenta si tardamos); un pool
+    de workers asyncio procesa los mensajes. Los reenvíos de Meta llegan con el mismo
+    id de mensaje y se descartan. La cola está acotada: si se llena, el webhook
+    responde 503 para que Meta reintente más tarde en vez de perder el mensaje.
+
+    Cada mensaje se encola con una clave (el número que lo envía). Los mensajes de una
+    misma clave se procesan de a uno y en orden de llegada: el botón "disco" ve la sesión
+    que guardó la receta anterior. Claves distintas se reparten entre los workers en paralelo.
+    - _pendientes: clave -> deque de mensajes de ese usuario todavía sin procesar.
+    - _listas: claves con mensajes esperando y sin ningún worker atendiéndolas. Un worker
+      toma una clave, procesa su primer mensaje y, si le quedan, la vuelve a poner al
+      final (así un usuario con muchos mensajes no acapara a los workers); si no, borra
+      su deque: no quedan colas de usuarios inactivos.
+    Con WEBHOOK_COLA_USUARIO_MAX un solo número tampoco puede llenar la cola de todos.
+    """
+
+    def __init__(self, procesar, workers=WEBHOOK_WORKERS, max_cola=WEBHOOK_COLA_MAX, max_ids=WEBHOOK_DEDUP_MAX,
+                 max_por_usuario=WEBHOOK_COLA_USUARIO_MAX):
+        self.procesar = procesar
+        self.workers = workers
+        self.max_cola = max_cola
+        self.max_ids = max_ids
+        self.max_por_usuario = max_por_usuario
+        self._pendientes = {}
+        self._listas = None
+        self._encolados = 0
+        self._tareas = []
+        self._vistos = OrderedDict()
+        self.espera = _Tiempos()
+        self.procesamiento = _Tiempos()
+        self.stats = {"encolados": 0, "duplicados": 0, "rechazados": 0, "procesados": 0, "errores": 0}
+
+    async def iniciar(self):
+        self._listas = asyncio.Queue()
+        self._tareas = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        log.info("🧵 Cola de mensajes iniciada", workers=self.workers)
+
+    async def detener(self):
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+
+    def _recordar(self, message_id):
+        if not message_id:
+            return
+        self._vistos[message_id] = None
+        while len(self._vistos) > self.max_ids:
+            self._vistos.popitem(last=False)
+
+    def encolar(self, message_id, trabajo, clave=None):
+        """
+        Devuelve "encolado", "duplicado" o "lleno". Los trabajos con la misma `clave` se
+        procesan en orden y nunca a la vez; sin clave, cada trabajo va por su cuenta.
+        """
+        if message_id and message_id in self._vistos:
+            self.stats["duplicados"] += 1
+            return "duplicado"
+        if clave is None:
+            clave = object()
+        pendientes = self._pendientes.get(clave)
+        if self._encolados >= self.max_cola or (pendientes is not None and len(pendientes) >= self.max_por_usuario):
+            self.stats["rechazados"] += 1
+            return "lleno"
+        if pendientes is None:
+            # Clave sin mensajes pendientes ni en proceso: queda lista para el próximo worker libre
+            pendientes = self._pendientes[clave] = deque()
+            self._listas.put_nowait(clave)
+        pendientes.append((time.perf_counter(), trabajo))
+        self._encolados += 1
+        self._recordar(message_id)
+        self.stats["encolados"] += 1
+        return "encolado"
+
+    async def _worker(self, n):
+        while True:
+            clave = await self._listas.get()
+            pendientes = self._pendientes[clave]
+            encolado_en, trabajo = pendientes[0]
+            inicio = time.perf_counter()
+            self.espera.agregar(inicio - encolado_en)
+            observar("cola_espera", inicio - encolado_en)
+            try:
+                await self.procesar(trabajo)
+                self.stats["procesados"] += 1
+            except Exception as e:
+                self.stats["errores"] += 1
+                log.error("⚠️ Error procesando mensaje", worker=n, error=str(e), exc_info=True)
+            finally:
+                duracion = time.perf_counter() - inicio
+                self.procesamiento.agregar(duracion)
+                observar("mensaje", duracion)
+                # Recién ahora sale de la deque: mientras tanto otro mensaje del mismo usuario
+                # encuentra la clave ocupada y espera detrás de éste
+                pendientes.popleft()
+                self._encolados -= 1
+                if pendientes:
+                    self._listas.put_nowait(clave)
+                else:
+                    del self._pendientes[clave]
+                self._listas.task_done()
+
+    async def esperar_vacia(self):
+        await self._listas.join()
+
+    def metricas(self):
+        return {
+            **self.stats,
+            "profundidad": self._encolados,
+            "usuarios": len(self._pendientes),
+            "max_cola": self.max_cola,
+            "max_por_usuario": self.max_por_usuario,
+            "workers": self.workers,
+            "espera": self.espera.resumen(),
+            "procesamiento": self.procesamiento.resumen(),
+        }
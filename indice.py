@@ -0,0 +1,361 @@
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+import numpy as np
+from rapidfuzz import process, fuzz
+from candidatos import armar_si_conviene
+from registro import obtener_registro
+from unidades import presentacion
+
+# Cadenas que se le ofrecen al usuario (precios, totales, botones y pedidos), en ese orden.
+# Agregar una es sólo sumar una columna más a la matriz de precios.
+SUPERMERCADOS = [s.strip().lower() for s in os.getenv("SUPERMERCADOS", "disco,tienda inglesa").split(",") if s.strip()]
+# Sube si cambia la forma de los resultados del matching (invalida lo guardado en cacheMatches)
+FORMATO_RESULTADO = 2
+
+log = obtener_registro("indice")
+
+# Lista de palabras clave a descartar (puede expandirse según lo que veas en la API)
+BLACKLIST = [
+    "jabon", "jabón", "detergente", "repelente", "hipoclorito", "lavandina",
+    "pañal", "pañales", "shampoo", "champu", "champú", "talco", "off",
+    "desodorante", "ambientador", "limpiador", "lavavajilla", "suavizante",
+    "perfume", "cera", "insecticida", "foco", "velas", "toallas", "servilleta",
+    "pañuelo", "pasta dental", "pasta de dientes", "colgate", "oral b", "cepillo"
+]
+
+# ingrediente limpio -> palabra que tiene que aparecer en el nombre del producto
+MAPEOS_EXACTOS = {
+    'mantequilla': 'manteca',
+    'manteca': 'manteca',
+    'azucar': 'azucar',
+    'azúcar': 'azucar',
+    'huevos': 'huevos colorados',
+    'huevo': 'huevos colorados',
+    'harina': 'harina de trigo',
+    'sal': 'sal',
+    'levadura': 'levadura',
+    'vainilla': 'vainilla',
+    'leche': 'leche',
+    'aceite oliva': 'aceite oliva',
+    'aceite': 'aceite',
+    'tomate': 'tomate',
+    'cebolla': 'cebolla',
+    'pimiento': 'pimiento',
+    'carne': 'carne',
+    'cacao': 'cocoa',
+}
+
+
+MEDIDAS = [
+    'taza', 'tazas', 'cucharadita', 'cucharaditas', 'cucharada', 'cucharadas',
+    'kg', 'gr', 'g', 'gramos', 'litro', 'litros', 'ml', 'cc', 'pizca',
+    'paquete', 'lata', 'sobre', 'unidad', 'unidades', 'docena', 'opcional'
+]
+
+CONECTORES = [
+    'de', 'del', 'la', 'el', 'en', 'con', 'sin', 'para', 'y', 'al',
+    'gusto', 'tibia', 'fría', 'frio', 'caliente', 'fresco', 'seco',
+    'líquido', 'polvo'
+]
+
+# Patrones compilados una sola vez (antes eran ~45 re.sub con f-strings por ingrediente)
+_RE_PARENTESIS = re.compile(r'\([^)]*\)')
+_RE_NUMEROS = re.compile(r'\d+(?:[.,]\d+)?')   # también deja sin números a las fracciones (1/2 -> /)
+_RE_MEDIDAS = re.compile(
+    r'\b(?:' + '|'.join(sorted(map(re.escape, MEDIDAS), key=len, reverse=True)) + r')s?\b',
+    re.IGNORECASE
+)
+_RE_CONECTORES = re.compile(
+    r'\b(?:' + '|'.join(sorted(map(re.escape, CONECTORES), key=len, reverse=True)) + r')\b',
+    re.IGNORECASE
+)
+_RE_SEPARADORES = re.compile(r'[/\\(),\s-]+')
+
+
+@lru_cache(maxsize=4096)
+def limpiar_ingrediente(ingrediente: str) -> str:
+    """Limpia un ingrediente para mejor matching (memoizado: las recetas repiten mucho los mismos)"""
+    original = ingrediente
+    ingrediente = _RE_PARENTESIS.sub('', ingrediente)
+    ingrediente = _RE_NUMEROS.sub('', ingrediente)
+    ingrediente = _RE_MEDIDAS.sub('', ingrediente)
+    ingrediente = _RE_CONECTORES.sub('', ingrediente)
+
+    ingrediente = _RE_SEPARADORES.sub(' ', ingrediente).strip()
+    if len(ingrediente) < 3:
+        ingrediente = ""
+
+    # Sólo se registra la primera vez que aparece cada ingrediente (y sólo con LOG_LEVEL=DEBUG)
+    log.debug("🧹 Limpieza", original=original, limpio=ingrediente)
+    return ingrediente
+
+
+def es_no_comestible(nombre: str) -> bool:
+    """Detecta si un producto no es comestible por su nombre"""
+    nombre = nombre.lower()
+    return any(kw in nombre for kw in BLACKLIST)
+
+
+class IndiceLectura:
+    """
+    Consultas sobre un índice de productos ya armado (matching, filas de la matriz y canastas),
+    sin nada que lo modifique. Lo comparten IndiceProductos, que se arma a partir de la lista de
+    productos, e IndiceCompartido (catalogoCompartido.py), que se lee de un archivo mapeado.
+    Necesita: nombres, nombres_norm, candidatos, nombres_filas, matriz, ids, supermercados,
+    columna, fila_categoria y presentaciones (ver IndiceProductos).
+    """
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def fila_de_categoria(self, ingrediente_limpio):
+        """Fila de la matriz de la categoría fija del ingrediente, o None."""
+        return self.fila_categoria.get(MAPEOS_EXACTOS.get(ingrediente_limpio.lower().strip()))
+
+    def mejor(self, consulta):
+        """
+        (índice en self.nombres, score) del mejor nombre para una consulta ya limpia y en minúscula.
+        Con índice de candidatos sólo se puntúan los preseleccionados; (0, 0.0) si no comparte
+        ningún trigrama con el catálogo.
+        """
+        if self.candidatos is None:
+            _, score, idx = process.extractOne(consulta, self.nombres_norm, scorer=fuzz.WRatio)
+            return idx, float(score)
+        posiciones = self.candidatos.buscar(consulta)
+        if not len(posiciones):
+            return 0, 0.0
+        _, score, j = process.extractOne(consulta, [self.nombres_norm[i] for i in posiciones], scorer=fuzz.WRatio)
+        return int(posiciones[j]), float(score)
+
+    def puntuar(self, consultas):
+        """
+        Mejor nombre para cada consulta (ya limpia y en minúscula): lista de (índice en self.nombres, score).
+        Catálogo chico: una sola llamada nativa y paralela sobre todo el catálogo. Grande: cada
+        consulta contra sus candidatos (ver `mejor`).
+        Mismo scorer que extractOne (WRatio); argmax se queda con el primero si hay empate.
+        """
+        if not consultas or not self.nombres:
+            return []
+        if self.candidatos is not None:
+            return [self.mejor(c) for c in consultas]
+        scores = process.cdist(consultas, self.nombres_norm, scorer=fuzz.WRatio,
+                               dtype=np.float64, workers=-1)
+        mejores = scores.argmax(axis=1)
+        return [(int(idx), float(scores[fila, idx])) for fila, idx in enumerate(mejores)]
+
+    def resultado(self, fila):
+        """Dict que devuelve buscar_precio_producto para una fila de la matriz (nombre o categoría)."""
+        precios = self.matriz[fila]
+        con_precio = np.flatnonzero(~np.isnan(precios))
+        return {
+            "nombre": self.nombres_filas[fila],
+            "fila": int(fila),
+            "precios": {self.supermercados[j]: float(precios[j]) for j in con_precio},
+            "ids": {self.supermercados[j]: self.ids[fila, j] for j in con_precio if self.ids[fila, j] is not None},
+        }
+
+    def canasta(self, filas, unidades, supermercados=None):
+        """
+        Totales de una canasta (filas de la matriz x unidades de cada una) en todas las cadenas
+        pedidas a la vez: {"supermercados", "precios" (filas x cadenas), "totales", "disponibles",
+        "mejor"}. "mejor" es la cadena más barata entre las que tienen más productos disponibles.
+        """
+        supermercados = [s for s in (supermercados or self.supermercados) if s in self.columna]
+        columnas = np.array([self.columna[s] for s in supermercados], dtype=np.intp)
+        filas = np.asarray(filas, dtype=np.intp)
+        precios = self.matriz[np.ix_(filas, columnas)]
+        unidades = np.asarray(unidades, dtype=np.float64)
+
+        totales = np.nansum(precios * unidades[:, None], axis=0)
+        disponibles = (~np.isnan(precios)).sum(axis=0)
+        mejor = None
+        if len(columnas) and len(filas):
+            candidatos = np.where(disponibles == disponibles.max(), totales, np.inf)
+            mejor = supermercados[int(candidatos.argmin())]
+        return {
+            "supermercados": supermercados,
+            "precios": precios,
+            "totales": totales,
+            "disponibles": disponibles,
+            "mejor": mejor,
+        }
+
+
+class IndiceProductos(IndiceLectura):
+    """
+    Estructuras de búsqueda armadas una sola vez por versión del catálogo.
+
+    - validos: filas del catálogo que son comestibles.
+    - nombres / nombres_norm: nombres únicos de productos comestibles (original y en minúscula),
+      en el mismo orden en que aparecen en el catálogo.
+    - precios: nombre -> {supermercado: (precio, id)}, primera fila de cada cadena.
+    - version: hash del contenido del catálogo; estable entre reinicios, sirve para
+      invalidar lo que se haya calculado con un catálogo anterior (p. ej. cacheMatches).
+    - categorias: palabra de MAPEOS_EXACTOS -> {"nombre", "precios"} con la misma
+      semántica que el antiguo recorrido lineal (primer candidato y primer precio por cadena).
+    - matriz: precios densos filas x cadenas (NaN = sin precio), con `ids` alineado.
+      Una fila por nombre (en el orden de `nombres`) y al final una por categoría;
+      `columna` es supermercado -> columna y `fila_categoria` palabra -> fila.
+    - candidatos: índice de trigramas sobre nombres_norm (candidatos.py) para no puntuar todo
+      el catálogo en cada consulta; None si el catálogo es chico (se puntúa entero).
+    """
+
+    def __init__(self, productos):
+        self.version = hashlib.sha1(
+            f"{FORMATO_RESULTADO}:{json.dumps(productos, sort_keys=True, default=str)}".encode("utf-8")
+        ).hexdigest()[:16]
+
+        self.validos = [
+            p for p in productos
+            if "nombre_producto" in p and not es_no_comestible(p["nombre_producto"])
+        ]
+
+        self.precios = {}
+        for p in self.validos:
+            supermercado = str(p.get("supermercado", "")).lower()
+            por_super = self.precios.setdefault(p["nombre_producto"], {})
+            if supermercado not in por_super:
+                por_super[supermercado] = (p.get("precio"), p.get("id"))
+
+        self.nombres = list(self.precios)
+        self.nombres_norm = [n.lower() for n in self.nombres]
+        self.candidatos = armar_si_conviene(self.nombres_norm)
+        # Presentación de cada producto parseada una vez (pack y unidad canónica, ver unidades.py)
+        self.presentaciones = {n: presentacion(n) for n in self.nombres}
+
+        self.categorias = {}
+        for palabra in set(MAPEOS_EXACTOS.values()):
+            self._armar_categoria(palabra)
+        self._armar_matriz()
+
+    def _armar_matriz(self):
+        columna = {}
+        for precios in self.precios.values():
+            for supermercado in precios:
+                columna.setdefault(supermercado, len(columna))
+        self.supermercados = list(columna)
+        self.columna = columna
+
+        filas = [self.precios[n] for n in self.nombres]
+        self.nombres_filas = list(self.nombres)
+        self.fila_categoria = {}
+        for palabra, categoria in self.categorias.items():
+            self.fila_categoria[palabra] = len(filas)
+            filas.append(categoria["precios"])
+            self.nombres_filas.append(categoria["nombre"])
+
+        self.matriz = np.full((len(filas), len(columna)), np.nan)
+        self.ids = np.full(self.matriz.shape, None, dtype=object)
+        for i, precios in enumerate(filas):
+            for supermercado, (precio, id_) in precios.items():
+                if precio is not None:
+                    self.matriz[i, columna[supermercado]] = precio
+                    self.ids[i, columna[supermercado]] = id_
+
+    def _armar_categoria(self, palabra):
+        candidatos = [p for p in self.validos if palabra in p["nombre_producto"].lower()]
+        if not candidatos:
+            self.categorias.pop(palabra, None)
+            return
+        precios = {}
+        for p in candidatos:
+            precios.setdefault(str(p.get("supermercado", "")).lower(), (p.get("precio"), p.get("id")))
+        self.categorias[palabra] = {"nombre": candidatos[0]["nombre_producto"], "precios": precios}
+
+    def actualizar(self, cambios, eliminados):
+        """
+        Nuevo índice aplicando un delta de apiProductos (/productos/changes) sin rearmar todo:
+        sólo se recalculan los precios de los nombres tocados y las categorías que los contienen.
+        Las filas se identifican por (nombre_producto, supermercado).
+        """
+        clave = lambda p: (p["nombre_producto"], str(p.get("supermercado", "")).lower())
+        nuevo = IndiceProductos.__new__(IndiceProductos)
+        nuevo.version = hashlib.sha1(
+            (self.version + json.dumps([cambios, eliminados], sort_keys=True, default=str)).encode("utf-8")
+        ).hexdigest()[:16]
+
+        borrar = {clave(e) for e in eliminados}
+        reemplazos = {clave(p): p for p in cambios if "nombre_producto" in p}
+        tocados = {k[0] for k in borrar} | {k[0] for k in reemplazos}
+
+        validos = []
+        for p in self.validos:
+            k = clave(p)
+            if k in borrar:
+                continue
+            validos.append(reemplazos.pop(k) if k in reemplazos else p)
+        validos.extend(p for p in reemplazos.values() if not es_no_comestible(p["nombre_producto"]))
+        nuevo.validos = validos
+
+        nuevo.precios = {n: v for n, v in self.precios.items() if n not in tocados}
+        for p in validos:
+            nombre = p["nombre_producto"]
+            if nombre in tocados:
+                nuevo.precios.setdefault(nombre, {}).setdefault(
+                    str(p.get("supermercado", "")).lower(), (p.get("precio"), p.get("id"))
+                )
+
+        # Se mantiene el orden previo de los nombres; los nuevos van al final
+        normalizados = dict(zip(self.nombres, self.nombres_norm))
+        nuevo.nombres = [n for n in self.nombres if n in nuevo.precios]
+        nuevo.nombres += [n for n in nuevo.precios if n not in normalizados]
+        nuevo.nombres_norm = [normalizados.get(n) or n.lower() for n in nuevo.nombres]
+        # Las posiciones de los nombres cambian con las bajas: el índice de candidatos se rearma
+        nuevo.candidatos = armar_si_conviene(nuevo.nombres_norm)
+        nuevo.presentaciones = {n: self.presentaciones.get(n) or presentacion(n) for n in nuevo.nombres}
+
+        nuevo.categorias = dict(self.categorias)
+        tocados_norm = [n.lower() for n in tocados]
+        for palabra in set(MAPEOS_EXACTOS.values()):
+            if any(palabra in n for n in tocados_norm):
+                nuevo._armar_categoria(palabra)
+        nuevo._armar_matriz()
+        return nuevo
+
+    def por_categoria(self, ingrediente_limpio):
+        """{"nombre", "precios"} si el ingrediente cae en una de las categorías fijas, si no None."""
+        palabra_buscar = MAPEOS_EXACTOS.get(ingrediente_limpio.lower().strip())
+        if not palabra_buscar:
+            return None
+        return self.categorias.get(palabra_buscar)
+
+
+def clave_super(supermercado):
+    """"tienda inglesa" -> "tienda_inglesa": clave de la cadena en pedidos, sesiones y botones."""
+    return re.sub(r"\W+", "_", str(supermercado).lower()).strip("_")
+
+
+_ultimo = (None, None)
+
+
+def indice_registrado(productos):
+    """El índice ya armado para esa lista (misma identidad), o None."""
+    lista, indice = _ultimo
+    return indice if lista is productos else None
+
+
+def registrar_indice(productos, indice):
+    """Asocia un índice ya armado (p. ej. actualizado por delta) a una lista de productos."""
+    global _ultimo
+    _ultimo = (productos, indice)
+
+
+def obtener_indice(productos):
+    """
+    Devuelve el índice para esa lista de productos, armándolo sólo si cambió.
+    La cache del catálogo reemplaza la lista entera al cambiar de versión, así que
+    alcanza con comparar identidad (guardamos la referencia para que no se reutilice el id).
+    """
+    global _ultimo
+    if isinstance(productos, IndiceLectura):
+        return productos        # ya es un índice (catálogo compartido, ver catalogoCompartido.py)
+    lista, indice = _ultimo
+    if lista is productos and indice is not None:
+        return indice
+    indice = IndiceProductos(productos)
+    _ultimo = (productos, indice)
+    log.info("🗂️ Índice de productos armado", productos=len(indice))
+    return indice
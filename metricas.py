@@ -0,0 +1,143 @@
+"""
+Métricas en proceso para app.py, en el formato de texto de Prometheus (GET /metrics).
+
+- `medir("etapa")` cronometra una etapa de la receta (llm, catalogo, matching, ...).
+- `medir_llamada("servicio")` cronometra una llamada saliente (openai, productos, pedidos,
+  whatsapp) y la cuenta como ok / error / código HTTP.
+- `desglose()` junta además los tiempos de un solo request (para la respuesta en modo debug).
+  Usa un ContextVar, así que sigue funcionando dentro de asyncio.to_thread.
+
+Sin dependencias: cada observación es un bisect y una suma bajo un lock (~1 µs).
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Límites (segundos) de los buckets: de 1 ms (matching) a 30 s (LLM lento)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DEBUG_TIEMPOS = os.getenv("DEBUG_TIEMPOS", "0") == "1"      # desglose en cada respuesta de /generate-recipe
+
+
+class Histograma:
+    """Histograma con etiquetas: por cada combinación de valores guarda buckets, suma y cantidad."""
+
+    def __init__(self, nombre, ayuda, etiquetas, buckets=BUCKETS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valores, segundos):
+        i = bisect.bisect_left(self.buckets, segundos)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][i] += 1
+            serie[1] += segundos
+            serie[2] += 1
+
+    def exportar(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = [(v, list(s[0]), s[1], s[2]) for v, s in sorted(self._series.items())]
+        for valores, cuentas, suma, n in series:
+            etiquetas = ",".join(f'{k}="{v}"' for k, v in zip(self.etiquetas, valores))
+            acumulado = 0
+            for limite, cuenta in zip(self.buckets, cuentas):
+                acumulado += cuenta
+                lineas.append(f'{self.nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{{etiquetas},le="+Inf"}} {n}')
+            lineas.append(f"{self.nombre}_sum{{{etiquetas}}} {suma:.6f}")
+            lineas.append(f"{self.nombre}_count{{{etiquetas}}} {n}")
+        return lineas
+
+
+etapas = Histograma("chef_etapa_segundos", "Duración de cada etapa de la receta", ("etapa",))
+llamadas = Histograma("chef_llamada_segundos", "Duración de las llamadas a servicios externos",
+                      ("servicio", "resultado"))
+
+_desglose = ContextVar("desglose_tiempos", default=None)
+
+
+def _anotar(nombre, segundos):
+    desglose = _desglose.get()
+    if desglose is not None:
+        desglose.append((nombre, round(segundos * 1000, 2)))
+
+
+def observar(etapa, segundos):
+    etapas.observar((etapa,), segundos)
+    _anotar(etapa, segundos)
+
+
+@contextmanager
+def medir(etapa):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(etapa, time.perf_counter() - inicio)
+
+
+class Llamada:
+    """Lo que devuelve medir_llamada: se le puede informar el código HTTP de la respuesta."""
+    __slots__ = ("resultado",)
+
+    def __init__(self):
+        self.resultado = "ok"
+
+    def codigo(self, status_code):
+        self.resultado = "ok" if status_code < 400 else str(status_code)
+
+
+@contextmanager
+def medir_llamada(servicio):
+    llamada = Llamada()
+    inicio = time.perf_counter()
+    try:
+        yield llamada
+    except BaseException:
+        llamada.resultado = "error"
+        raise
+    finally:
+        segundos = time.perf_counter() - inicio
+        llamadas.observar((servicio, llamada.resultado), segundos)
+        _anotar(servicio, segundos)
+
+
+@contextmanager
+def desglose():
+    """Junta en una lista [(nombre, ms), ...] todo lo que se mida dentro del bloque (y sus threads)."""
+    tiempos = []
+    token = _desglose.set(tiempos)
+    try:
+        yield tiempos
+    finally:
+        _desglose.reset(token)
+
+
+def _estado(prefijo, datos):
+    """Los valores numéricos de un metricas() (de /health) como gauges; los anidados con su sub-prefijo."""
+    lineas = []
+    for clave, valor in datos.items():
+        nombre = f"{prefijo}_{clave}"
+        if isinstance(valor, dict):
+            lineas.extend(_estado(nombre, valor))
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            lineas.append(f"# TYPE {nombre} gauge")
+            lineas.append(f"{nombre} {valor}")
+    return lineas
+
+
+def exportar(estado=None):
+    """Texto para GET /metrics. `estado`: {"cola": cola.metricas(), ...} se agrega como gauges chef_<clave>_*."""
+    lineas = etapas.exportar() + llamadas.exportar()
+    for componente, datos in (estado or {}).items():
+        lineas.extend(_estado(f"chef_{componente}", datos))
+    return "\n".join(lineas) + "\n"
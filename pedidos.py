@@ -1,5 +1,43 @@
-from rapidfuzz import fuzz
-import requests
+import os
+from rapidfuzz import fuzz, process
+from candidatos import armar_si_conviene
+from catalogo import CatalogoCache
+from registro import obtener_registro
+
+API_URL_PRODUCTOS = os.getenv("API_URL_PRODUCTOS", "http://localhost:5000/productos")
+# 0: cada pedido revalida el catálogo (GET condicional, 304 si no cambió), como cuando se bajaba siempre
+PEDIDOS_CATALOGO_TTL = float(os.getenv("PEDIDOS_CATALOGO_TTL", "0"))
+
+# La cache devuelve la misma lista mientras no cambie, así el índice de candidatos se arma
+# una vez por versión del catálogo y no en cada pedido
+catalogo_pedidos = CatalogoCache(url=API_URL_PRODUCTOS, ttl=PEDIDOS_CATALOGO_TTL)
+_ultimo = (None, None, None)
+log = obtener_registro("pedidos")
+
+
+def _nombres_y_candidatos(productos):
+    global _ultimo
+    lista, nombres, candidatos = _ultimo
+    if lista is not productos:
+        nombres = [p["nombre_producto"] for p in productos]
+        candidatos = armar_si_conviene([n.lower() for n in nombres])
+        _ultimo = (productos, nombres, candidatos)
+    return nombres, candidatos
+
+
+def mejor_producto(ingrediente: str, productos):
+    """
+    El producto con mayor partial_ratio contra el ingrediente (el primero si hay empate).
+    Con catálogos grandes sólo se puntúan los candidatos del índice de trigramas.
+    """
+    nombres, candidatos = _nombres_y_candidatos(productos)
+    posiciones = candidatos.buscar(ingrediente.lower()) if candidatos is not None else None
+    if posiciones is None or not len(posiciones):
+        _, _, idx = process.extractOne(ingrediente, nombres, scorer=fuzz.partial_ratio)
+        return productos[idx]
+    _, _, j = process.extractOne(ingrediente, [nombres[i] for i in posiciones], scorer=fuzz.partial_ratio)
+    return productos[posiciones[j]]
+
 
 def procesar_pedido(from_number: str):
     """
@@ -9,17 +47,16 @@ def procesar_pedido(from_number: str):
     3. Devuelve un JSON con la selección de productos.
     """
 
-    try:
-        productos = requests.get("http://localhost:5000/productos").json()
-    except Exception as e:
-        print("Error obteniendo productos:", e)
+    productos = catalogo_pedidos.obtener()
+    if not productos:
+        log.warning("⚠️ Error obteniendo productos", numero=from_number)
         return {"error": "No se pudo obtener productos"}
 
     ingredientes = ["arroz", "pollo", "cebolla"]
 
     resultado = {"productos": []}
     for ing in ingredientes:
-        mejor = max(productos, key=lambda p: fuzz.partial_ratio(ing, p["nombre_producto"]))
+        mejor = mejor_producto(ing, productos)
         resultado["productos"].append({
             "ingrediente": ing,
             "producto": mejor["nombre_producto"],
@@ -28,5 +65,6 @@ def procesar_pedido(from_number: str):
         })
 
 
-    print(f"Pedido procesado para {from_number}: {resultado}")
+    log.info("Pedido procesado", numero=from_number, productos=len(resultado["productos"]))
+    log.debug("Pedido", numero=from_number, resultado=resultado)
     return resultado
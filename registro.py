@@ -0,0 +1,151 @@
+"""
+Logging estructurado y no bloqueante para app.py y sus módulos (reemplaza los print del camino caliente).
+
+    from registro import obtener_registro
+    log = obtener_registro("webhook")
+    log.info("📩 Mensaje encolado", message_id=mid, tipo="text")
+    log.debug("Payload recibido", payload=data)          # no cuesta nada si DEBUG está apagado
+    log.muestreado(0.01, "ℹ️ Evento de estado", estados=n)
+
+- Niveles con LOG_LEVEL (DEBUG / INFO / WARNING / ERROR). INFO por defecto.
+- LOG_FORMATO=json: una línea JSON por evento; "texto" (por defecto): mensaje + clave=valor.
+- El request arma el LogRecord, serializa los campos (json.dumps, así queda el estado del
+  momento aunque después se modifique p. ej. el dict del pedido) y lo pone en una cola
+  acotada; el formateo de la línea y la escritura a stdout los hace un thread aparte. Si la
+  cola se llena los eventos se descartan y se cuentan, nunca se bloquea al que loguea.
+- `muestreado(tasa, ...)` registra sólo esa proporción de los eventos (callbacks de estado, etc.).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMATO = os.getenv("LOG_FORMATO", "texto")
+LOG_COLA_MAX = int(os.getenv("LOG_COLA_MAX", "10000"))
+LOG_MUESTREO_ESTADOS = float(os.getenv("LOG_MUESTREO_ESTADOS", "0.01"))     # callbacks de estado de WhatsApp
+
+stats = {"descartados": 0}
+
+
+def _serializar(valor):
+    return json.dumps(valor, ensure_ascii=False, default=str)
+
+
+class FormatoJson(logging.Formatter):
+    def format(self, record):
+        evento = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        campos = getattr(record, "campos", {})
+        for clave in campos:
+            evento.pop(clave, None)         # como antes, un campo con el mismo nombre pisa al base
+        linea = _serializar(evento)
+        # Los campos ya vienen serializados (ver _HandlerCola.prepare): se insertan tal cual
+        extra = "".join(f", {_serializar(k)}: {v}" for k, v in campos.items())
+        if record.exc_info:
+            extra += f", \"excepcion\": {_serializar(self.formatException(record.exc_info))}"
+        return (linea[:-1] + extra + "}") if evento else "{" + extra[2:] + "}"
+
+
+class FormatoTexto(logging.Formatter):
+    def format(self, record):
+        hora = time.strftime("%H:%M:%S", time.localtime(record.created))
+        campos = " ".join(f"{k}={v}" for k, v in getattr(record, "campos", {}).items())
+        linea = f"{hora} {record.levelname:<7} {record.name}: {record.getMessage()}" + (f" {campos}" if campos else "")
+        if record.exc_info:
+            linea += "\n" + self.formatException(record.exc_info)
+        return linea
+
+
+class _HandlerCola(logging.handlers.QueueHandler):
+    """
+    QueueHandler que sólo serializa los campos en el thread que loguea (el resto del formateo
+    va en el thread de salida) y descarta (contando) si la cola está llena.
+    """
+
+    def prepare(self, record):
+        campos = getattr(record, "campos", None)
+        if campos:
+            record.campos = {k: _serializar(v) for k, v in campos.items()}
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            stats["descartados"] += 1
+
+
+_configurado = False
+_listener = None
+_lock = threading.Lock()
+
+
+def configurar():
+    """Instala el handler de cola en el logger "chef" (una sola vez por proceso)."""
+    global _configurado, _listener
+    with _lock:
+        if _configurado:
+            return
+        salida = logging.StreamHandler(sys.stdout)
+        salida.setFormatter(FormatoJson() if LOG_FORMATO == "json" else FormatoTexto())
+        cola = queue.Queue(maxsize=LOG_COLA_MAX)
+        _listener = logging.handlers.QueueListener(cola, salida)
+        _listener.start()
+        atexit.register(_listener.stop)     # vacía la cola al salir
+
+        raiz = logging.getLogger("chef")
+        raiz.setLevel(LOG_LEVEL)
+        raiz.addHandler(_HandlerCola(cola))
+        raiz.propagate = False
+        _configurado = True
+
+
+class Registro:
+    """Logger con campos estructurados (kwargs), serializados al loguear (ver _HandlerCola)."""
+
+    def __init__(self, nombre):
+        self._log = logging.getLogger(f"chef.{nombre}")
+
+    def habilitado(self, nivel=logging.DEBUG):
+        return self._log.isEnabledFor(nivel)
+
+    def _emitir(self, nivel, mensaje, campos, exc_info=None):
+        if self._log.isEnabledFor(nivel):
+            self._log.log(nivel, mensaje, extra={"campos": campos}, exc_info=exc_info)
+
+    def debug(self, mensaje, **campos):
+        self._emitir(logging.DEBUG, mensaje, campos)
+
+    def info(self, mensaje, **campos):
+        self._emitir(logging.INFO, mensaje, campos)
+
+    def warning(self, mensaje, **campos):
+        self._emitir(logging.WARNING, mensaje, campos)
+
+    def error(self, mensaje, exc_info=None, **campos):
+        self._emitir(logging.ERROR, mensaje, campos, exc_info)
+
+    def muestreado(self, tasa, mensaje, nivel=logging.INFO, **campos):
+        """Registra el evento con probabilidad `tasa` (y la anota en el evento para poder reescalar)."""
+        if random.random() < tasa:
+            self._emitir(nivel, mensaje, {**campos, "muestreo": tasa})
+
+
+def obtener_registro(nombre):
+    configurar()
+    return Registro(nombre)
+
+
+def metricas():
+    return {**stats, "pendientes": _listener.queue.qsize() if _listener else 0}
@@ -0,0 +1,218 @@
+"""
+Servicios falsos para pruebas de carga locales: OpenAI (chat completions, con y sin stream),
+WhatsApp Graph (mensajes), apiProductos y apiRecetas, todo en un solo proceso.
+
+Uso:
+    python serviciosFalsos.py            # escucha en 127.0.0.1:9000
+
+y levantar app.py apuntando acá:
+    OPENAI_API_KEY=falsa OPENAI_BASE_URL=http://127.0.0.1:9000/v1 \\
+    WHATSAPP_GRAPH_URL=http://127.0.0.1:9000/whatsapp/messages \\
+    API_URL_PRODUCTOS=http://127.0.0.1:9000/productos \\
+    API_URL_PEDIDOS=http://127.0.0.1:9000/pedidos \\
+    uvicorn app:app --port 8000
+
+Latencias configurables por entorno o en caliente con POST /configuracion.
+GET /contadores devuelve cuántas llamadas recibió cada servicio (ver cargaWebhook.py).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_RECETAS = os.path.join(BASE_DIR, "recetas_benchmark.json")
+
+configuracion = {
+    "latencia_llm": float(os.getenv("FALSO_LATENCIA_LLM", "1.5")),             # segundos por respuesta completa
+    "jitter_llm": float(os.getenv("FALSO_JITTER_LLM", "0.3")),                 # +- uniforme
+    "latencia_whatsapp": float(os.getenv("FALSO_LATENCIA_WHATSAPP", "0.05")),
+    "latencia_api": float(os.getenv("FALSO_LATENCIA_API", "0.005")),           # productos / pedidos
+    "error_whatsapp": float(os.getenv("FALSO_ERROR_WHATSAPP", "0")),           # proporción de 429
+}
+
+app = FastAPI(title="Servicios falsos")
+contadores = Counter()
+recibidos = defaultdict(list)          # numero -> [(timestamp, tipo)] de mensajes de WhatsApp
+_recetas = None
+_productos = None
+
+
+def recetas():
+    global _recetas
+    if _recetas is None:
+        with open(CORPUS_RECETAS, encoding="utf-8") as f:
+            _recetas = json.load(f)
+    return _recetas
+
+
+def productos():
+    global _productos
+    if _productos is None:
+        from snapshotProductos import cargar_productos
+        _productos = cargar_productos()
+    return _productos
+
+
+async def demora(segundos, jitter=0.0):
+    if jitter:
+        segundos = max(0.0, segundos + random.uniform(-jitter, jitter))
+    if segundos:
+        await asyncio.sleep(segundos)
+
+
+# ==========================
+# OpenAI
+# ==========================
+def _receta_para(mensajes):
+    """Receta enlatada estable por pedido (el mismo texto de usuario devuelve la misma receta)."""
+    pedido = mensajes[-1].get("content", "") if mensajes else ""
+    indice = int(hashlib.md5(pedido.encode("utf-8")).hexdigest(), 16) % len(recetas())
+    return recetas()[indice]
+
+
+def _chunk(id_, modelo, delta, fin=None):
+    return {
+        "id": id_, "object": "chat.completion.chunk", "created": int(time.time()), "model": modelo,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": fin}],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    contadores["openai"] += 1
+    data = await request.json()
+    modelo = data.get("model", "gpt-4o-mini")
+    texto = _receta_para(data.get("messages", []))
+    id_ = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    if not data.get("stream"):
+        await demora(configuracion["latencia_llm"], configuracion["jitter_llm"])
+        return {
+            "id": id_, "object": "chat.completion", "created": int(time.time()), "model": modelo,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": texto}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": len(texto) // 4, "total_tokens": 100 + len(texto) // 4},
+        }
+
+    palabras = texto.split(" ")
+
+    async def eventos():
+        # Un tercio de la latencia hasta el primer token, el resto repartido entre los tokens
+        total = max(0.0, configuracion["latencia_llm"] + random.uniform(-configuracion["jitter_llm"], configuracion["jitter_llm"]))
+        await asyncio.sleep(total / 3)
+        yield f"data: {json.dumps(_chunk(id_, modelo, {'role': 'assistant', 'content': ''}))}\n\n"
+        por_token = (total * 2 / 3) / max(1, len(palabras))
+        for i, palabra in enumerate(palabras):
+            contenido = palabra if i == 0 else " " + palabra
+            yield f"data: {json.dumps(_chunk(id_, modelo, {'content': contenido}), ensure_ascii=False)}\n\n"
+            await asyncio.sleep(por_token)
+        yield f"data: {json.dumps(_chunk(id_, modelo, {}, 'stop'))}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(eventos(), media_type="text/event-stream")
+
+
+# ==========================
+# WhatsApp Graph
+# ==========================
+@app.post("/whatsapp/messages")
+async def whatsapp_messages(request: Request):
+    contadores["whatsapp"] += 1
+    data = await request.json()
+    await demora(configuracion["latencia_whatsapp"])
+    if configuracion["error_whatsapp"] and random.random() < configuracion["error_whatsapp"]:
+        contadores["whatsapp_429"] += 1
+        return JSONResponse({"error": {"message": "Rate limit", "code": 130429}}, status_code=429,
+                            headers={"Retry-After": "1"})
+    numero = data.get("to")
+    recibidos[numero].append((time.time(), data.get("type", "text")))
+    return {
+        "messaging_product": "whatsapp",
+        "contacts": [{"input": numero, "wa_id": numero}],
+        "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}],
+    }
+
+
+@app.get("/whatsapp/esperar")
+async def whatsapp_esperar(numero: str, desde: float, tipo: str = None, timeout: float = 30):
+    """
+    Espera (long-poll) el primer mensaje enviado a `numero` después de `desde` (epoch)
+    y, si se indica, de ese `tipo` ("text" / "interactive"). Devuelve su timestamp.
+    """
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        for ts, t in recibidos.get(numero, ()):
+            if ts >= desde and (tipo is None or t == tipo):
+                return {"timestamp": ts, "tipo": t}
+        await asyncio.sleep(0.01)
+    return JSONResponse({"error": "timeout"}, status_code=408)
+
+
+# ==========================
+# apiProductos / apiRecetas
+# ==========================
+@app.get("/productos")
+async def get_productos(request: Request):
+    contadores["productos"] += 1
+    await demora(configuracion["latencia_api"])
+    etag = "falso-1"
+    headers = {"ETag": f'"{etag}"', "X-Catalogo-Version": "1", "X-Catalogo-Epoca": "falsa"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(productos(), headers=headers)
+
+
+@app.get("/productos/changes")
+async def get_cambios(since: int = 0, epoca: str = None):
+    contadores["productos_cambios"] += 1
+    await demora(configuracion["latencia_api"])
+    return {"desde": since, "version": 1, "epoca": "falsa", "cambios": [], "eliminados": []}
+
+
+@app.post("/pedidos")
+async def crear_pedido(request: Request):
+    contadores["pedidos"] += 1
+    data = await request.json()
+    await demora(configuracion["latencia_api"])
+    return JSONResponse({"mensaje": "Pedido creado con éxito", "pedido": {**data, "id": contadores["pedidos"]}},
+                        status_code=201)
+
+
+@app.delete("/pedidos")
+async def borrar_pedidos():
+    contadores["pedidos_borrados"] += 1
+    await demora(configuracion["latencia_api"])
+    return {"mensaje": "Pedidos eliminados", "eliminados": 0}
+
+
+# ==========================
+# Control
+# ==========================
+@app.get("/contadores")
+async def get_contadores():
+    return dict(contadores)
+
+
+@app.post("/contadores/reset")
+async def reset_contadores():
+    contadores.clear()
+    recibidos.clear()
+    return {"ok": True}
+
+
+@app.post("/configuracion")
+async def set_configuracion(request: Request):
+    cambios = await request.json()
+    configuracion.update({k: float(v) for k, v in cambios.items() if k in configuracion})
+    return configuracion
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("FALSO_PUERTO", "9000")), log_level="warning")
@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+SESIONES_BACKEND = os.getenv("SESIONES_BACKEND", "memoria")    # "memoria" o "redis"
+SESIONES_TTL = int(os.getenv("SESIONES_TTL", "86400"))          # segundos sin uso hasta que se borra una sesión
+SESIONES_MAX = int(os.getenv("SESIONES_MAX", "10000"))          # sólo backend memoria
+
+
+def _serializar(valor) -> str:
+    return json.dumps(valor, separators=(",", ":"), ensure_ascii=False)
+
+
+class SesionesMemoria:
+    """Store en proceso, acotado (LRU) y con vencimiento por inactividad (TTL)."""
+
+    def __init__(self, prefijo, ttl=SESIONES_TTL, max_entradas=SESIONES_MAX):
+        self.prefijo = prefijo
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()    # clave -> (vence_en, valor)
+        self._secuencia = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, default=None):
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is None:
+                return default
+            vence_en, valor = item
+            if vence_en < time.monotonic():
+                del self._datos[clave]
+                return default
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            return valor
+
+    def obtener_varios(self, claves):
+        return {c: v for c in claves if (v := self.obtener(c)) is not None}
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def guardar_varios(self, valores):
+        for clave, valor in valores.items():
+            self.guardar(clave, valor)
+
+    def borrar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def siguiente(self):
+        """Número creciente propio del store (1, 2, 3...), p. ej. para nombres por defecto."""
+        with self._lock:
+            self._secuencia += 1
+            return self._secuencia
+
+    def __contains__(self, clave):
+        return self.obtener(clave) is not None
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class SesionesRedis:
+    """
+    Store compartido entre workers/procesos sobre el Redis de bd.py.
+    JSON compacto con TTL por clave; las lecturas/escrituras de varias claves van en un solo viaje.
+    """
+
+    def __init__(self, prefijo, ttl=SESIONES_TTL, cliente=None):
+        if cliente is None:
+            from bd import r as cliente
+        self.r = cliente
+        self.prefijo = prefijo
+        self.ttl = ttl
+
+    def _clave(self, clave):
+        return f"{self.prefijo}:{clave}"
+
+    def obtener(self, clave, default=None):
+        pipe = self.r.pipeline()
+        pipe.get(self._clave(clave))
+        pipe.expire(self._clave(clave), self.ttl)     # renovar TTL en el mismo viaje
+        data, _ = pipe.execute()
+        return json.loads(data) if data else default
+
+    def obtener_varios(self, claves):
+        claves = list(claves)
+        if not claves:
+            return {}
+        datos = self.r.mget([self._clave(c) for c in claves])
+        return {c: json.loads(d) for c, d in zip(claves, datos) if d}
+
+    def guardar(self, clave, valor):
+        self.r.set(self._clave(clave), _serializar(valor), ex=self.ttl)
+
+    def guardar_varios(self, valores):
+        pipe = self.r.pipeline(transaction=False)
+        for clave, valor in valores.items():
+            pipe.set(self._clave(clave), _serializar(valor), ex=self.ttl)
+        pipe.execute()
+
+    def borrar(self, clave):
+        self.r.delete(self._clave(clave))
+
+    def siguiente(self):
+        """Número creciente compartido por todos los workers (INCR, sin recorrer las claves)."""
+        return self.r.incr(f"{self.prefijo}#secuencia")
+
+    def __contains__(self, clave):
+        return bool(self.r.exists(self._clave(clave)))
+
+
+def crear_store(prefijo, backend=SESIONES_BACKEND):
+    """Devuelve el store configurado por SESIONES_BACKEND para ese tipo de dato."""
+    if backend == "redis":
+        return SesionesRedis(prefijo)
+    return SesionesMemoria(prefijo)
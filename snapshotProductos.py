@@ -0,0 +1,77 @@
+import hashlib
+import os
+import pickle
+import pandas as pd
+from registro import obtener_registro
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXCEL_PRODUCTOS = os.path.join(BASE_DIR, "productos.xlsx")
+SNAPSHOT_PRODUCTOS = os.getenv("SNAPSHOT_PRODUCTOS", os.path.join(BASE_DIR, "productos.snapshot.pkl"))
+HOJA = "Precios medianos por cadena"
+
+log = obtener_registro("snapshot")
+
+
+def _hash_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def leer_excel(ruta=EXCEL_PRODUCTOS) -> pd.DataFrame:
+    """Parseo completo del Excel a formato largo (lento: openpyxl)."""
+    df = pd.read_excel(ruta, sheet_name=HOJA)
+    return df.melt(
+        id_vars=["grupo", "nombre_producto"],
+        var_name="supermercado",
+        value_name="precio"
+    ).dropna().reset_index(drop=True)
+
+
+def _compactar(df_long: pd.DataFrame) -> pd.DataFrame:
+    """Las columnas de texto repiten muchísimo: como categóricas ocupan una fracción."""
+    return df_long.astype({"grupo": "category", "nombre_producto": "category", "supermercado": "category"})
+
+
+def cargar_df(ruta=EXCEL_PRODUCTOS, snapshot=SNAPSHOT_PRODUCTOS) -> pd.DataFrame:
+    """
+    Devuelve el catálogo en formato largo usando el snapshot binario si sigue vigente.
+
+    El snapshot guarda mtime, tamaño y sha256 del Excel: si mtime/tamaño coinciden se usa
+    directo; si cambiaron pero el contenido es el mismo (p. ej. un checkout) se reutiliza igual;
+    sólo si el contenido cambió se vuelve a parsear el Excel y se reescribe el snapshot.
+    """
+    st = os.stat(ruta)
+    meta = None
+    if os.path.exists(snapshot):
+        try:
+            with open(snapshot, "rb") as f:
+                meta = pickle.load(f)
+        except Exception as e:
+            log.warning("⚠️ Snapshot de productos ilegible, se regenera", error=str(e))
+
+    if meta and meta["mtime_ns"] == st.st_mtime_ns and meta["tamano"] == st.st_size:
+        return meta["df"]
+
+    sha = _hash_archivo(ruta)
+    if meta and meta["sha256"] == sha:
+        df_long = meta["df"]
+    else:
+        log.info("📄 Parseando productos.xlsx (snapshot inexistente o desactualizado)")
+        df_long = _compactar(leer_excel(ruta))
+
+    meta = {"mtime_ns": st.st_mtime_ns, "tamano": st.st_size, "sha256": sha, "df": df_long}
+    tmp = f"{snapshot}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, snapshot)    # reemplazo atómico: otro proceso nunca lee un snapshot a medias
+    return df_long
+
+
+def cargar_productos(ruta=EXCEL_PRODUCTOS, snapshot=SNAPSHOT_PRODUCTOS):
+    """Lista de dicts {grupo, nombre_producto, supermercado, precio}, igual que el antiguo to_dict."""
+    df_long = cargar_df(ruta, snapshot)
+    columnas = list(df_long.columns)
+    return [dict(zip(columnas, fila)) for fila in zip(*(df_long[c].tolist() for c in columnas))]
@@ -0,0 +1,238 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from registro import obtener_registro
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PEDIDOS_DB_PATH = os.getenv("PEDIDOS_DB_PATH", os.path.join(BASE_DIR, "pedidos.db"))
+PEDIDOS_GRUPO_MAX = int(os.getenv("PEDIDOS_GRUPO_MAX", "512"))             # inserts por commit como máximo
+PEDIDOS_GRUPO_ESPERA = float(os.getenv("PEDIDOS_GRUPO_ESPERA", "0"))       # espera extra para juntar más (0: lo que llegó durante el commit anterior)
+PEDIDOS_LIMITE = 100
+PEDIDOS_LIMITE_MAX = 1000
+
+log = obtener_registro("store")
+
+
+def a_timestamp(valor):
+    """Acepta segundos epoch o fecha ISO (2025-01-31 / 2025-01-31T10:00:00)."""
+    if valor is None or valor == "":
+        return None
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(valor)).timestamp()
+
+
+class _Pendiente:
+    __slots__ = ("fila", "creado", "listo", "resultado", "error")
+
+    def __init__(self, fila):
+        self.fila = fila
+        self.creado = None
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class StorePedidos:
+    """
+    Pedidos persistidos en un SQLite local (WAL) con índices por usuario, número de WhatsApp,
+    supermercado y fecha.
+
+    Las escrituras las hace un único hilo que agrupa los inserts que llegan juntos en una sola
+    transacción (group commit): cada request espera a que su pedido quede commiteado, pero una
+    ráfaga de N pedidos cuesta unos pocos commits y no N. Las lecturas usan una conexión por
+    hilo y, por WAL, no se bloquean con el escritor.
+    """
+
+    def __init__(self, ruta=PEDIDOS_DB_PATH, grupo_max=PEDIDOS_GRUPO_MAX, grupo_espera=PEDIDOS_GRUPO_ESPERA):
+        self.ruta = ruta
+        self.grupo_max = grupo_max
+        self.grupo_espera = grupo_espera
+        self._local = threading.local()
+        self._cola = queue.Queue()
+        self._escritor = self._conectar()
+        self._escritor.executescript("""
+            CREATE TABLE IF NOT EXISTS pedidos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                usuario TEXT,
+                numero TEXT,
+                supermercado TEXT,
+                creado REAL NOT NULL,
+                datos TEXT NOT NULL
+            );
+        """)
+        columnas = {fila[1] for fila in self._escritor.execute("PRAGMA table_info(pedidos)")}
+        if "numero" not in columnas:
+            # Base de antes de guardar el número: los pedidos viejos quedan con numero NULL
+            self._escritor.execute("ALTER TABLE pedidos ADD COLUMN numero TEXT")
+        self._escritor.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_pedidos_usuario ON pedidos(usuario, id);
+            CREATE INDEX IF NOT EXISTS idx_pedidos_numero ON pedidos(numero, id);
+            CREATE INDEX IF NOT EXISTS idx_pedidos_supermercado ON pedidos(supermercado, id);
+            CREATE INDEX IF NOT EXISTS idx_pedidos_creado ON pedidos(creado);
+        """)
+        self._escritor.commit()
+        self._ultimo_creado = self._escritor.execute("SELECT COALESCE(MAX(creado), 0) FROM pedidos").fetchone()[0]
+        self.stats = {"insertados": 0, "commits": 0, "borrados": 0}
+        self._hilo = threading.Thread(target=self._escribir, name="escritor-pedidos", daemon=True)
+        self._hilo.start()
+
+    def _conectar(self):
+        conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _lector(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._conectar()
+        return conn
+
+    # ------------------------------------------------------------------ escritura
+
+    def _juntar(self, grupo):
+        """Agrega a `grupo` lo que ya esté en la cola, sin esperar. Devuelve False si hay que cerrar."""
+        while len(grupo) < self.grupo_max:
+            try:
+                item = self._cola.get_nowait()
+            except queue.Empty:
+                return True
+            if item is None:
+                return False
+            grupo.append(item)
+        return True
+
+    def _escribir(self):
+        seguir = True
+        while seguir:
+            primero = self._cola.get()
+            if primero is None:
+                return
+            grupo = [primero]
+            seguir = self._juntar(grupo)
+            if seguir and len(grupo) < self.grupo_max and self.grupo_espera:
+                # Ráfaga en curso: una espera corta junta muchos más inserts en el mismo commit
+                time.sleep(self.grupo_espera)
+                seguir = self._juntar(grupo)
+
+            ultimo = self._ultimo_creado
+            filas = []
+            for p in grupo:
+                # El reloj lo pone el escritor: `creado` nunca baja al crecer el id (ver listar)
+                ultimo = p.creado = max(ultimo, time.time())
+                filas.append((*p.fila, ultimo))
+            try:
+                self._escritor.executemany(
+                    "INSERT INTO pedidos (usuario, numero, supermercado, datos, creado) VALUES (?, ?, ?, ?, ?)", filas
+                )
+                # Un único escritor con AUTOINCREMENT: los ids del lote son consecutivos
+                fin = self._escritor.execute("SELECT last_insert_rowid()").fetchone()[0]
+                self._escritor.commit()
+                self._ultimo_creado = ultimo
+                for i, p in enumerate(grupo):
+                    p.resultado = fin - len(grupo) + 1 + i
+                self.stats["insertados"] += len(grupo)
+                self.stats["commits"] += 1
+            except Exception as e:
+                self._escritor.rollback()
+                log.error("⚠️ Error guardando pedidos", pedidos=len(grupo), error=str(e))
+                for p in grupo:
+                    p.error = e
+            for p in grupo:
+                p.listo.set()
+
+    def crear(self, pedido, timeout=10):
+        """Guarda el pedido y devuelve {**pedido, "id", "creado"} una vez commiteado."""
+        usuario = pedido.get("usuario")
+        numero = pedido.get("numero")
+        supermercado = pedido.get("supermercado")
+        pendiente = _Pendiente((
+            str(usuario) if usuario is not None else None,
+            str(numero) if numero is not None else None,
+            str(supermercado).lower() if supermercado is not None else None,
+            json.dumps(pedido, ensure_ascii=False, separators=(",", ":")),
+        ))
+        self._cola.put(pendiente)
+        if not pendiente.listo.wait(timeout):
+            raise TimeoutError("El pedido no se pudo guardar a tiempo")
+        if pendiente.error:
+            raise pendiente.error
+        return {**pedido, "id": pendiente.resultado, "creado": pendiente.creado}
+
+    # ------------------------------------------------------------------ lectura
+
+    def listar(self, usuario=None, numero=None, supermercado=None, desde=None, despues_de=None, limite=PEDIDOS_LIMITE):
+        """
+        Pedidos en orden de llegada, filtrados y paginados por cursor (`despues_de` = último id visto).
+        Devuelve (pedidos, siguiente_cursor o None).
+        """
+        condiciones, params = [], []
+        if usuario is not None:
+            condiciones.append("usuario = ?")
+            params.append(usuario)
+        if numero is not None:
+            condiciones.append("numero = ?")
+            params.append(numero)
+        if supermercado is not None:
+            condiciones.append("supermercado = ?")
+            params.append(supermercado.lower())
+        if desde is not None:
+            # `creado` crece con el id: se traduce a un rango de ids y los índices (usuario, id),
+            # (numero, id) y (supermercado, id) sirven a la vez para filtrar y para ordenar
+            condiciones.append("id >= (SELECT id FROM pedidos WHERE creado >= ? ORDER BY creado LIMIT 1)")
+            params.append(desde)
+        if despues_de is not None:
+            condiciones.append("id > ?")
+            params.append(despues_de)
+        limite = max(1, min(int(limite), PEDIDOS_LIMITE_MAX))
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        filas = self._lector().execute(
+            f"SELECT id, creado, datos FROM pedidos {where} ORDER BY id LIMIT ?",
+            (*params, limite + 1),
+        ).fetchall()
+
+        pedidos = [{**json.loads(datos), "id": id_, "creado": creado} for id_, creado, datos in filas[:limite]]
+        siguiente = pedidos[-1]["id"] if len(filas) > limite else None
+        return pedidos, siguiente
+
+    def obtener(self, id_pedido):
+        fila = self._lector().execute("SELECT id, creado, datos FROM pedidos WHERE id = ?", (id_pedido,)).fetchone()
+        if fila is None:
+            return None
+        return {**json.loads(fila[2]), "id": fila[0], "creado": fila[1]}
+
+    # ------------------------------------------------------------------ borrado
+
+    def _borrar(self, sql, params=()):
+        conn = self._lector()
+        borrados = conn.execute(sql, params).rowcount
+        conn.commit()
+        self.stats["borrados"] += borrados
+        return borrados
+
+    def borrar(self, id_pedido):
+        return self._borrar("DELETE FROM pedidos WHERE id = ?", (id_pedido,))
+
+    def borrar_de_usuario(self, usuario):
+        return self._borrar("DELETE FROM pedidos WHERE usuario = ?", (usuario,))
+
+    def borrar_de_numero(self, numero):
+        return self._borrar("DELETE FROM pedidos WHERE numero = ?", (numero,))
+
+    def borrar_todos(self):
+        return self._borrar("DELETE FROM pedidos")
+
+    def metricas(self):
+        total = self._lector().execute("SELECT COUNT(*) FROM pedidos").fetchone()[0]
+        return {**self.stats, "pedidos": total, "pendientes": self._cola.qsize()}
+
+    def cerrar(self):
+        self._cola.put(None)
+        self._hilo.join(timeout=5)
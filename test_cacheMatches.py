@@ -0,0 +1,42 @@
+"""Cache de matches (cacheMatches.py): versiones de catálogo que conviven en el mismo archivo y objeto."""
+from cacheMatches import CacheMatches
+
+
+def test_versiones_intercaladas_en_el_mismo_objeto(tmp_path):
+    # Dos threads del mismo worker, uno todavía con el catálogo N y otro ya con N+1
+    cache = CacheMatches(str(tmp_path / "m.db"))
+    cache.usar_version("N")
+    cache.usar_version("N1")
+    cache.guardar_varios({"arroz": {"nombre": "Arroz", "fila": 3}}, "N")
+    cache.guardar_varios({"arroz": {"nombre": "Arroz", "fila": 7}, "yerba": None}, "N1")
+    assert cache.obtener_varios(["arroz", "yerba"], "N") == {"arroz": {"nombre": "Arroz", "fila": 3}}
+    assert cache.obtener_varios(["arroz", "yerba"], "N1") == {"arroz": {"nombre": "Arroz", "fila": 7}, "yerba": None}
+
+
+def test_workers_con_versiones_distintas_no_se_borran(tmp_path):
+    ruta = str(tmp_path / "m.db")
+    viejo, nuevo = CacheMatches(ruta), CacheMatches(ruta)
+    viejo.usar_version("N")
+    viejo.guardar_varios({"arroz": {"fila": 3}}, "N")
+    nuevo.usar_version("N1")
+    nuevo.guardar_varios({"arroz": {"fila": 7}}, "N1")
+    viejo.usar_version("N")
+    assert viejo.obtener_varios(["arroz"], "N") == {"arroz": {"fila": 3}}
+    assert nuevo.obtener_varios(["arroz"], "N1") == {"arroz": {"fila": 7}}
+
+
+def test_purga_versiones_abandonadas(tmp_path):
+    cache = CacheMatches(str(tmp_path / "m.db"), gracia=-1)     # todo lo que no sea la actual está abandonado
+    cache.guardar_varios({"arroz": {"fila": 3}}, "N")
+    cache.usar_version("N1")
+    assert cache.obtener_varios(["arroz"], "N") == {}
+    assert cache.metricas()["invalidaciones"] == 1
+
+
+def test_desalojo_lru(tmp_path):
+    cache = CacheMatches(str(tmp_path / "m.db"), max_entradas=2)
+    cache.guardar_varios({"a": None}, "N")
+    cache.guardar_varios({"b": None}, "N")
+    cache.obtener_varios(["a"], "N")                  # "a" pasa a ser la más reciente
+    cache.guardar_varios({"c": None}, "N")
+    assert set(cache.obtener_varios(["a", "b", "c"], "N")) == {"a", "c"}
@@ -0,0 +1,56 @@
+"""Cache del catálogo (catalogo.py): GET condicional y delta contra un apiProductos simulado."""
+import catalogo
+from catalogo import CatalogoCache
+
+URL = "http://productos.test/productos"
+PRODUCTOS = [{"nombre_producto": "Arroz", "supermercado": "disco", "precio": 50, "id": 1}]
+
+
+class Respuesta:
+    def __init__(self, status_code, json=None, headers=None):
+        self.status_code = status_code
+        self._json = json
+        self.headers = headers or {}
+
+    def json(self):
+        return self._json
+
+
+class ApiProductos:
+    """apiProductos con el mismo contenido (mismo ETag) que puede reiniciarse y cambiar de época."""
+
+    def __init__(self):
+        self.epoca, self.version = "A", 5
+        self.pedidos = []
+
+    def _headers(self):
+        return {"ETag": '"e1"', "X-Catalogo-Version": str(self.version), "X-Catalogo-Epoca": self.epoca}
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.pedidos.append(url)
+        if url.endswith("/changes"):
+            if params["epoca"] != self.epoca:
+                return Respuesta(410, {"version": self.version, "epoca": self.epoca})
+            return Respuesta(200, {"version": self.version, "epoca": self.epoca, "cambios": [], "eliminados": []})
+        if (headers or {}).get("If-None-Match") == '"e1"':
+            return Respuesta(304, headers=self._headers())
+        return Respuesta(200, PRODUCTOS, self._headers())
+
+
+def test_reinicio_con_el_mismo_contenido_adopta_la_epoca_nueva(monkeypatch):
+    api = ApiProductos()
+    monkeypatch.setattr(catalogo.requests, "get", api.get)
+    cache = CatalogoCache(URL, ttl=0)
+    assert cache._descargar()
+    assert (cache.epoca, cache.version_servidor) == ("A", 5)
+
+    api.epoca, api.version = "B", 0         # se reinició: /changes con la época vieja da 410
+    assert cache._descargar()
+    assert api.pedidos[-2:] == [f"{URL}/changes", URL]
+    assert (cache.epoca, cache.version_servidor) == ("B", 0)     # el 304 trae la época nueva
+
+    api.pedidos.clear()
+    assert cache._descargar()
+    assert api.pedidos == [f"{URL}/changes"]                    # vuelve a sincronizar por delta
+    assert cache.productos == PRODUCTOS
+    assert cache.stats["no_modificados"] == 2
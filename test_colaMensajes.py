@@ -0,0 +1,146 @@
+"""Cola de mensajes del webhook (colaMensajes.py): orden por usuario, paralelismo entre usuarios y rechazos."""
+import asyncio
+import random
+
+from colaMensajes import ColaMensajes
+
+
+def correr(corrutina):
+    return asyncio.run(corrutina)
+
+
+async def inundar(usuarios, mensajes, workers=16, latencia=0.005, por_usuario=True):
+    """
+    `usuarios` números que mandan `mensajes` mensajes cada uno, todos a la vez y mezclados al azar
+    (cada usuario en su propio orden), con latencias al azar. Los pares son "receta" (guardan la
+    sesión después del LLM) y los impares "botón" (tienen que ver la sesión de la receta anterior).
+    """
+    azar = random.Random(0)
+    sesiones, vistos, en_curso = {}, {}, {}
+    errores = {"orden": 0, "sesion": 0, "solapados": 0}
+    concurrencia = {"actual": 0, "max": 0}
+
+    async def procesar(trabajo):
+        numero, i = trabajo
+        en_curso[numero] = en_curso.get(numero, 0) + 1
+        concurrencia["actual"] += 1
+        concurrencia["max"] = max(concurrencia["max"], concurrencia["actual"])
+        errores["solapados"] += en_curso[numero] > 1
+        errores["orden"] += vistos.get(numero, -1) != i - 1
+        vistos[numero] = i
+        if i % 2 == 0:
+            await asyncio.sleep(azar.uniform(0, 2 * latencia))
+            sesiones[numero] = i
+        else:
+            errores["sesion"] += sesiones.get(numero) != i - 1
+            await asyncio.sleep(azar.uniform(0, latencia))
+        en_curso[numero] -= 1
+        concurrencia["actual"] -= 1
+
+    cola = ColaMensajes(procesar, workers=workers, max_cola=usuarios * mensajes, max_por_usuario=mensajes)
+    await cola.iniciar()
+    llegadas = [u for u in range(usuarios) for _ in range(mensajes)]
+    azar.shuffle(llegadas)
+    siguiente = [0] * usuarios
+    for u in llegadas:
+        numero, i = f"598{u:08d}", siguiente[u]
+        siguiente[u] += 1
+        assert cola.encolar(f"wamid.{u}.{i}", (numero, i), clave=numero if por_usuario else None) == "encolado"
+    await cola.esperar_vacia()
+    metricas = cola.metricas()
+    await cola.detener()
+    return errores, concurrencia["max"], metricas
+
+
+def test_inundacion_orden_por_usuario_y_paralelo_entre_usuarios():
+    errores, maximo, metricas = correr(inundar(usuarios=300, mensajes=6))
+    assert errores == {"orden": 0, "sesion": 0, "solapados": 0}
+    assert maximo == 16                         # los usuarios distintos sí ocupan todos los workers
+    assert metricas["procesados"] == 300 * 6
+    assert metricas["usuarios"] == 0            # no quedan colas de usuarios inactivos
+    assert metricas["profundidad"] == 0
+
+
+def test_sin_clave_no_hay_orden_por_usuario():
+    # Control: la misma inundación sin clave (como antes) rompe el orden, así que el test de arriba lo detecta
+    errores, _, _ = correr(inundar(usuarios=300, mensajes=6, por_usuario=False))
+    assert errores["sesion"] > 0 and errores["solapados"] > 0
+
+
+def test_duplicado_mientras_se_procesa_el_anterior():
+    async def escenario():
+        liberar = asyncio.Event()
+        procesados = []
+
+        async def procesar(trabajo):
+            procesados.append(trabajo)
+            if trabajo == "receta":
+                await liberar.wait()
+
+        cola = ColaMensajes(procesar, workers=4)
+        await cola.iniciar()
+        assert cola.encolar("wamid.1", "receta", clave="598") == "encolado"
+        await asyncio.sleep(0.01)
+        assert procesados == ["receta"]                                      # en proceso
+        assert cola.encolar("wamid.1", "receta", clave="598") == "duplicado"     # reenvío de Meta
+        assert cola.encolar("wamid.2", "disco", clave="598") == "encolado"
+        await asyncio.sleep(0.01)
+        assert procesados == ["receta"]                 # el botón espera detrás de la receta
+        liberar.set()
+        await cola.esperar_vacia()
+        metricas = cola.metricas()
+        await cola.detener()
+        return procesados, metricas
+
+    procesados, metricas = correr(escenario())
+    assert procesados == ["receta", "disco"]
+    assert metricas["duplicados"] == 1
+    assert metricas["procesados"] == 2
+    assert metricas["usuarios"] == 0
+
+
+def test_tope_por_usuario():
+    async def escenario():
+        liberar = asyncio.Event()
+        procesados = []
+
+        async def procesar(trabajo):
+            procesados.append(trabajo)
+            await liberar.wait()
+
+        cola = ColaMensajes(procesar, workers=4, max_cola=100, max_por_usuario=2)
+        await cola.iniciar()
+        assert cola.encolar("a1", "a1", clave="598") == "encolado"
+        await asyncio.sleep(0.01)                                       # a1 en proceso (sigue contando)
+        assert cola.encolar("a2", "a2", clave="598") == "encolado"
+        assert cola.encolar("a3", "a3", clave="598") == "lleno"
+        assert cola.encolar("b1", "b1", clave="599") == "encolado"      # otro usuario no se ve afectado
+        liberar.set()
+        await cola.esperar_vacia()
+        # El rechazado no quedó recordado: el reintento de Meta entra
+        assert cola.encolar("a3", "a3", clave="598") == "encolado"
+        await cola.esperar_vacia()
+        metricas = cola.metricas()
+        await cola.detener()
+        return procesados, metricas
+
+    procesados, metricas = correr(escenario())
+    assert [p for p in procesados if p.startswith("a")] == ["a1", "a2", "a3"]
+    assert "b1" in procesados
+    assert metricas["rechazados"] == 1
+    assert metricas["usuarios"] == 0
+
+
+def test_tope_global():
+    async def escenario():
+        async def procesar(trabajo):
+            await asyncio.sleep(0)
+
+        cola = ColaMensajes(procesar, workers=1, max_cola=3)
+        await cola.iniciar()
+        resultados = [cola.encolar(f"m{i}", i, clave=f"59{i}") for i in range(4)]
+        await cola.esperar_vacia()
+        await cola.detener()
+        return resultados
+
+    assert correr(escenario()) == ["encolado", "encolado", "encolado", "lleno"]
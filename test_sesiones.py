@@ -0,0 +1,113 @@
+"""Stores de sesiones (sesiones.py): memoria con LRU y TTL, y Redis sobre fakeredis."""
+import fakeredis
+import pytest
+
+import sesiones
+from sesiones import SesionesMemoria, SesionesRedis
+
+
+class Reloj:
+    """Reemplazo de time.monotonic que sólo avanza cuando el test lo pide."""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(sesiones.time, "monotonic", reloj)
+    return reloj
+
+
+@pytest.fixture
+def redis_falso():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_memoria_guardar_obtener_borrar():
+    store = SesionesMemoria("sesion")
+    store.guardar("598", {"nombre": "Ana", "productos": {"disco": []}})
+    assert store.obtener("598") == {"nombre": "Ana", "productos": {"disco": []}}
+    assert "598" in store
+    store.borrar("598")
+    assert store.obtener("598") is None
+    assert store.obtener("598", default={}) == {}
+
+
+def test_memoria_desaloja_lo_menos_usado():
+    store = SesionesMemoria("sesion", max_entradas=2)
+    store.guardar("a", 1)
+    store.guardar("b", 2)
+    store.obtener("a")              # "a" pasa a ser la más reciente
+    store.guardar("c", 3)
+    assert store.obtener("b") is None
+    assert store.obtener_varios(["a", "b", "c"]) == {"a": 1, "c": 3}
+    assert len(store) == 2
+
+
+def test_memoria_vence_por_inactividad(reloj):
+    store = SesionesMemoria("sesion", ttl=60)
+    store.guardar("a", 1)
+    store.guardar("b", 2)
+    reloj.ahora += 50
+    assert store.obtener("a") == 1      # leerla renueva el TTL
+    reloj.ahora += 50
+    assert store.obtener("a") == 1
+    assert store.obtener("b") is None
+    assert "b" not in store
+
+
+def test_memoria_secuencia():
+    store = SesionesMemoria("nombre", max_entradas=1)
+    store.guardar("a", "x")
+    store.guardar("b", "y")             # desaloja "a": la secuencia no depende del tamaño
+    assert [store.siguiente() for _ in range(3)] == [1, 2, 3]
+
+
+def test_redis_guardar_obtener_borrar(redis_falso):
+    store = SesionesRedis("sesion", ttl=60, cliente=redis_falso)
+    store.guardar("598", {"nombre": "Ana", "confirmados": {"disco": [{"precio_total": 10.5}]}})
+    assert store.obtener("598") == {"nombre": "Ana", "confirmados": {"disco": [{"precio_total": 10.5}]}}
+    assert "598" in store
+    assert redis_falso.exists("sesion:598")
+    store.borrar("598")
+    assert store.obtener("598") is None
+    assert "598" not in store
+
+
+def test_redis_ttl_y_renovacion(redis_falso):
+    store = SesionesRedis("sesion", ttl=60, cliente=redis_falso)
+    store.guardar("598", {"nombre": "Ana"})
+    assert 0 < redis_falso.ttl("sesion:598") <= 60
+    redis_falso.expire("sesion:598", 5)
+    store.obtener("598")                # leer renueva el TTL completo
+    assert redis_falso.ttl("sesion:598") > 5
+
+
+def test_redis_varios(redis_falso):
+    store = SesionesRedis("sesion", ttl=60, cliente=redis_falso)
+    store.guardar_varios({"a": 1, "b": {"x": [1, 2]}})
+    assert store.obtener_varios(["a", "b", "c"]) == {"a": 1, "b": {"x": [1, 2]}}
+    assert store.obtener_varios([]) == {}
+    assert 0 < redis_falso.ttl("sesion:b") <= 60
+
+
+def test_redis_secuencia_compartida(redis_falso):
+    uno = SesionesRedis("nombre", cliente=redis_falso)
+    otro = SesionesRedis("nombre", cliente=redis_falso)      # otro worker sobre el mismo Redis
+    assert [uno.siguiente(), otro.siguiente(), uno.siguiente()] == [1, 2, 3]
+    assert list(redis_falso.scan_iter("nombre:*")) == []      # no cae en el espacio de claves de usuarios
+
+
+def test_get_nombre_usa_la_secuencia(monkeypatch, redis_falso):
+    import usuarios
+
+    monkeypatch.setattr(usuarios, "usuarios", SesionesRedis("nombre", cliente=redis_falso))
+    assert usuarios.get_nombre("598", "Ana") == "Ana"
+    assert usuarios.get_nombre("598") == "Ana"
+    assert usuarios.get_nombre("599") == "Usuario1"
+    assert usuarios.get_nombre("600") == "Usuario2"
@@ -0,0 +1,30 @@
+"""Store de pedidos de apiRecetas (storePedidos.py): filtros y borrado por número de WhatsApp."""
+import sqlite3
+
+from storePedidos import StorePedidos
+
+
+def test_cancelar_por_numero_no_toca_a_otro_con_el_mismo_nombre(tmp_path):
+    store = StorePedidos(str(tmp_path / "pedidos.db"))
+    store.crear({"usuario": "Ana", "numero": "598", "supermercado": "Disco", "productos": []})
+    store.crear({"usuario": "Ana", "numero": "599", "supermercado": "Disco", "productos": []})
+    pedidos, _ = store.listar(numero="598")
+    assert [p["numero"] for p in pedidos] == ["598"]
+    assert store.borrar_de_numero("598") == 1
+    assert [p["numero"] for p in store.listar(usuario="Ana")[0]] == ["599"]
+    store.cerrar()
+
+
+def test_base_sin_columna_numero(tmp_path):
+    ruta = str(tmp_path / "pedidos.db")
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE pedidos (id INTEGER PRIMARY KEY AUTOINCREMENT, usuario TEXT, "
+                 "supermercado TEXT, creado REAL NOT NULL, datos TEXT NOT NULL)")
+    conn.execute("INSERT INTO pedidos (usuario, supermercado, creado, datos) VALUES ('Ana', 'disco', 1, '{}')")
+    conn.commit()
+    conn.close()
+    store = StorePedidos(ruta)
+    store.crear({"usuario": "Ana", "numero": "598", "supermercado": "disco"})
+    assert store.borrar_de_numero("598") == 1
+    assert len(store.listar(usuario="Ana")[0]) == 1         # el pedido viejo sigue ahí
+    store.cerrar()
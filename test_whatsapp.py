@@ -0,0 +1,44 @@
+"""Cliente de salida de WhatsApp (whatsapp.py): reintentos y orden por destinatario."""
+import asyncio
+import json
+
+import httpx
+
+import whatsapp
+
+
+def _cliente_falso(monkeypatch, respuestas):
+    """Reemplaza el cliente async por uno que contesta `respuestas` en orden (y anota lo pedido)."""
+    pedidos = []
+
+    def responder(request):
+        pedidos.append((str(request.url), json.loads(request.content)))
+        status, headers = respuestas[min(len(pedidos), len(respuestas)) - 1]
+        return httpx.Response(status, headers=headers, json={})
+
+    monkeypatch.setattr(whatsapp, "http_async", httpx.AsyncClient(transport=httpx.MockTransport(responder)))
+    monkeypatch.setattr(whatsapp, "GRAPH_URL", "http://127.0.0.1:9000/whatsapp/messages")
+    return pedidos
+
+
+def test_reintenta_429_y_5xx_sobre_http(monkeypatch):
+    pedidos = _cliente_falso(monkeypatch, [(429, {"Retry-After": "0"}), (503, {"Retry-After": "0"}), (200, {})])
+    r = asyncio.run(whatsapp.reply_whatsapp_async("598", "hola"))
+    assert r.status_code == 200
+    assert len(pedidos) == 3
+    assert all(url.startswith("http://") for url, _ in pedidos)
+
+
+def test_no_reintenta_errores_del_cliente(monkeypatch):
+    pedidos = _cliente_falso(monkeypatch, [(400, {})])
+    r = asyncio.run(whatsapp.reply_whatsapp_async("598", "hola"))
+    assert r.status_code == 400
+    assert len(pedidos) == 1
+
+
+def test_receta_en_orden_y_botones_al_final(monkeypatch):
+    pedidos = _cliente_falso(monkeypatch, [(200, {})])
+    asyncio.run(whatsapp.enviar_receta_async("598", ["ingredientes", "instrucciones"], "¿Pedido?", [("disco", "Disco")]))
+    tipos = [cuerpo.get("type", "text") for _, cuerpo in pedidos]
+    assert tipos == ["text", "interactive"]         # los dos bloques caben en un solo mensaje
+    assert pedidos[0][1]["text"]["body"].index("ingredientes") < pedidos[0][1]["text"]["body"].index("instrucciones")
@@ -0,0 +1,144 @@
+import math
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# Unidades de receta -> (factor, unidad canónica). "u" = unidades sueltas.
+MEDIDAS_RECETA = {
+    "kg": (1000, "g"), "kilo": (1000, "g"), "kilos": (1000, "g"),
+    "g": (1, "g"), "gr": (1, "g"), "grs": (1, "g"), "gramo": (1, "g"), "gramos": (1, "g"),
+    "l": (1000, "ml"), "lt": (1000, "ml"), "lts": (1000, "ml"), "litro": (1000, "ml"), "litros": (1000, "ml"),
+    "ml": (1, "ml"), "cc": (1, "ml"), "cm3": (1, "ml"),
+    "unidad": (1, "u"), "unidades": (1, "u"), "docena": (12, "u"), "docenas": (12, "u"),
+}
+
+# Medidas de cocina: cuánto pesa (g) o mide (ml) cada una según el tipo de ingrediente
+MEDIDAS_COCINA = {"taza", "tazas", "cucharada", "cucharadas", "cucharadita", "cucharaditas", "pizca", "pizcas"}
+EQUIVALENCIAS = {
+    #            taza  cucharada  cucharadita  pizca   unidad
+    "harina":   (120,    8,         3,          0.3,   "g"),
+    "azucar":   (200,   12.5,       4,          0.5,   "g"),
+    "sal":      (290,   18,         6,          0.5,   "g"),
+    "grasa":    (225,   14,         5,          0.5,   "g"),
+    "arroz":    (190,   12,         4,          0.5,   "g"),
+    "cacao":    (100,    7,         2.5,        0.3,   "g"),
+    "queso":    (100,    7,         2.5,        0.3,   "g"),
+    "liquido":  (240,   15,         5,          0.3,   "ml"),
+}
+CLASE_POR_DEFECTO = "liquido"
+# Palabra clave (en el nombre del producto) -> clase de EQUIVALENCIAS
+CLASES = {
+    "harina": "harina", "maicena": "harina", "almidon": "harina", "fecula": "harina", "avena": "harina",
+    "pan rallado": "harina", "polenta": "harina", "semola": "harina",
+    "azucar": "azucar", "edulcorante": "azucar",
+    "sal": "sal", "bicarbonato": "sal", "polvo de hornear": "sal", "levadura": "sal",
+    "manteca": "grasa", "margarina": "grasa", "dulce de leche": "grasa", "mayonesa": "grasa",
+    "arroz": "arroz", "lenteja": "arroz", "garbanzo": "arroz", "poroto": "arroz",
+    "cacao": "cacao", "cafe": "cacao", "canela": "cacao", "pimienta": "cacao", "oregano": "cacao",
+    "queso": "queso",
+}
+_INDICE_COCINA = {"taza": 0, "cucharada": 1, "cucharadita": 2, "pizca": 3}
+
+_RE_PARENTESIS = re.compile(r"\(([^)]+)\)")
+_RE_CANTIDAD_PACK = re.compile(
+    r"(\d+(?:[.,]\d+)?)\s*\.?\s*(kg|grs?|gramos?|g|lts?|litros?|l|ml|cc|cm3|unidades|unidad|us|u)\b"
+)
+_RE_NUMERO = re.compile(r"(?:(\d+)\s+)?(\d+)/(\d+)|(\d+(?:[.,]\d+)?)|([½¼¾])")
+_RE_MEDIDA = re.compile(
+    r"\b(kg|kilos?|grs?|gramos?|g|litros?|lts?|lt|l|ml|cc|cm3|unidad|unidades|docenas?|"
+    r"pizcas?|tazas?|cucharaditas?|cucharadas?)\b"
+)
+_FRACCIONES = {"½": 0.5, "¼": 0.25, "¾": 0.75}
+_ACENTOS = str.maketrans("áéíóú", "aeiou")
+
+
+class Presentacion(NamedTuple):
+    """Contenido de un envase ya normalizado: 1000 "g", 900 "ml" o 12 "u"."""
+    cantidad: float
+    unidad: str
+    clase: str
+
+
+@lru_cache(maxsize=4096)
+def clase_de(nombre: str) -> str:
+    """Clase de ingrediente (para convertir tazas/cucharadas) según el ingrediente o el producto."""
+    nombre = nombre.lower().translate(_ACENTOS)
+    for palabra, clase in CLASES.items():
+        if re.search(rf"\b{palabra}(?:es|s)?\b", nombre):
+            return clase
+    return CLASE_POR_DEFECTO
+
+
+@lru_cache(maxsize=None)
+def presentacion(nombre_producto: str) -> Optional[Presentacion]:
+    """
+    Lee la presentación del nombre: "(400g)", "(paquete 1 kg.)", "(envase 900 cc)", "(1/2 docena)",
+    "(8 unidades)". None si el nombre no trae una presentación legible.
+    Se calcula una vez por producto: IndiceProductos la precarga al armarse.
+    """
+    m = _RE_PARENTESIS.search(nombre_producto.lower())
+    if not m:
+        return None
+    texto = m.group(1)
+    clase = clase_de(nombre_producto)
+
+    if "docena" in texto:
+        return Presentacion(6 if "1/2" in texto else 12, "u", clase)
+
+    pack = _RE_CANTIDAD_PACK.search(texto)
+    if not pack:
+        return None
+    valor = float(pack.group(1).replace(",", "."))
+    factor, canonica = MEDIDAS_RECETA.get(pack.group(2), (1, "u"))     # "us." / "u." = unidades
+    if valor <= 0:
+        return None
+    return Presentacion(valor * factor, canonica, clase)
+
+
+def _numero(m) -> float:
+    entero, num, den, decimal, unicode_ = m.groups()
+    if num:
+        return (int(entero) if entero else 0) + int(num) / int(den)
+    if decimal:
+        return float(decimal.replace(",", "."))
+    return _FRACCIONES[unicode_]
+
+
+@lru_cache(maxsize=4096)
+def cantidad_y_medida(ingrediente: str):
+    """"1 1/2 tazas de harina" -> (1.5, "taza"); sin número -> 1; sin medida -> "unidad"."""
+    texto = ingrediente.lower()
+    num = _RE_NUMERO.search(texto)
+    cantidad = _numero(num) if num else 1
+    med = _RE_MEDIDA.search(texto)
+    medida = med.group(1) if med else "unidad"
+    if medida.endswith("s") and medida not in MEDIDAS_RECETA:
+        medida = medida[:-1]
+    return cantidad, medida
+
+
+def a_canonica(cantidad: float, medida: str, clase: str = CLASE_POR_DEFECTO):
+    """Cantidad de receta en g / ml / u. Las medidas de cocina se convierten según la clase."""
+    if medida in MEDIDAS_COCINA:
+        medida = medida.rstrip("s")
+        equivalencia = EQUIVALENCIAS[clase]
+        return cantidad * equivalencia[_INDICE_COCINA[medida]], equivalencia[4]
+    factor, unidad = MEDIDAS_RECETA.get(medida, (1, "u"))
+    return cantidad * factor, unidad
+
+
+def unidades_a_comprar(cantidad: float, medida: str, pres: Optional[Presentacion], clase: Optional[str] = None):
+    """
+    (pack, unidades) sólo con aritmética sobre la presentación ya parseada.
+    `clase` (la del ingrediente de la receta) tiene prioridad sobre la deducida del producto.
+    """
+    if pres is None:
+        return 1, 1
+    if clase is None or clase == CLASE_POR_DEFECTO:
+        clase = pres.clase
+    necesario, unidad = a_canonica(cantidad, medida, clase)
+    if unidad != pres.unidad and "u" in (unidad, pres.unidad):
+        # "3 huevos" contra un envase en gramos (o al revés): se compra un envase
+        return pres.cantidad, 1
+    # g <-> ml se toman como equivalentes (densidad ~1), igual que antes
+    return pres.cantidad, max(1, math.ceil(necesario / pres.cantidad - 1e-9))
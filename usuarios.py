@@ -1,13 +1,18 @@
-usuarios = {}  # diccionario en memoria: {numero: nombre}
+from registro import obtener_registro
+from sesiones import crear_store
+
+usuarios = crear_store("nombre")  # {numero: nombre}, acotado y compartible (ver sesiones.py)
+log = obtener_registro("usuarios")
 
 def get_nombre(from_number: str, profile_name: str = None) -> str:
     """
     Devuelve el nombre asociado a un número de WhatsApp.
     Si no existe, lo registra usando el profile_name (si está disponible).
     """
-    if from_number not in usuarios:
-    
-        nombre = profile_name or f"Usuario{len(usuarios)+1}"
-        usuarios[from_number] = nombre
-        print(f"Nuevo usuario registrado: {from_number} -> {nombre}")
-    return usuarios[from_number]
+    nombre = usuarios.obtener(from_number)
+    if nombre is None:
+
+        nombre = profile_name or f"Usuario{usuarios.siguiente()}"
+        usuarios.guardar(from_number, nombre)
+        log.info("Nuevo usuario registrado", numero=from_number, nombre=nombre)
+    return nombre
@@ -1,6 +1,12 @@
-import requests
+import httpx
+import asyncio
+import threading
+import time
+import weakref
 import os
 from dotenv import load_dotenv
+from metricas import medir_llamada
+from registro import obtener_registro
 
 
 load_dotenv()
@@ -8,54 +14,200 @@ load_dotenv()
 TOKEN = os.getenv("WHATSAPP_TOKEN")         # Token de acceso de Meta
 PHONE_ID = 876156402242406 # ID del número de WhatsApp Business
 
-GRAPH_URL = f"https://graph.facebook.com/v17.0/876156402242406/messages"
+# Configurable para apuntar a un servidor falso en pruebas de carga (ver serviciosFalsos.py)
+GRAPH_URL = os.getenv("WHATSAPP_GRAPH_URL", f"https://graph.facebook.com/v17.0/{PHONE_ID}/messages")
 
-def reply_whatsapp(to: str, body: str):
-   
-    headers = {
-        "Authorization": f"Bearer {TOKEN}",
-        "Content-Type": "application/json"
-    }
-    payload = {
+WHATSAPP_MPS = float(os.getenv("WHATSAPP_MPS", "80"))          # mensajes/seg (throughput por defecto de Cloud API)
+WHATSAPP_REINTENTOS = int(os.getenv("WHATSAPP_REINTENTOS", "3"))
+WHATSAPP_TIMEOUT = float(os.getenv("WHATSAPP_TIMEOUT", "10"))
+LIMITE_TEXTO = 4096                                             # máximo de caracteres de un mensaje de texto
+REINTENTABLES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Limitador token bucket: `tasa` envíos por segundo con ráfagas de hasta `capacidad`."""
+
+    def __init__(self, tasa, capacidad=None):
+        self.tasa = tasa
+        self.capacidad = capacidad or tasa
+        self.tokens = self.capacidad
+        self.actualizado = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reservar(self):
+        """Toma un token y devuelve cuántos segundos hay que esperar para usarlo."""
+        with self._lock:
+            ahora = time.monotonic()
+            self.tokens = min(self.capacidad, self.tokens + (ahora - self.actualizado) * self.tasa)
+            self.actualizado = ahora
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.tasa
+
+    async def esperar_async(self):
+        espera = self._reservar()
+        if espera:
+            await asyncio.sleep(espera)
+
+
+limitador = TokenBucket(WHATSAPP_MPS)
+log = obtener_registro("whatsapp")
+
+# Cliente async compartido (keep-alive) para los handlers de FastAPI
+http_async = httpx.AsyncClient(
+    timeout=WHATSAPP_TIMEOUT,
+    headers={"Authorization": f"Bearer {TOKEN}", "Content-Type": "application/json"},
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+)
+
+# Un lock por destinatario para que sus mensajes salgan en orden (se liberan solos al no usarse)
+_locks_destinatario = weakref.WeakValueDictionary()
+
+
+def _lock_de(to: str) -> asyncio.Lock:
+    lock = _locks_destinatario.get(to)
+    if lock is None:
+        lock = asyncio.Lock()
+        _locks_destinatario[to] = lock
+    return lock
+
+
+def _payload_texto(to: str, body: str):
+    return {
         "messaging_product": "whatsapp",
         "to": to,
         "text": {"body": body},
     }
-    r = requests.post(GRAPH_URL, headers=headers, json=payload)
-    print("📤 Texto enviado:", r.status_code, r.text)
-    return r
 
-def enviar_botones(to: str, pregunta: str):
-  
-    headers = {
-        "Authorization": f"Bearer {TOKEN}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to,
-        "type": "interactive",
-        "interactive": {
+
+# Botones por defecto: (id, título); WhatsApp admite hasta 3 botones, con más se manda una lista
+OPCIONES_POR_DEFECTO = [
+    ("disco", "🛒 Disco"),
+    ("tienda_inglesa", "🛍 Tienda Inglesa"),
+    ("listar", "📋 Listar productos"),
+]
+MAX_BOTONES = 3
+
+
+def _payload_botones(to: str, pregunta: str, opciones=None):
+    opciones = opciones or OPCIONES_POR_DEFECTO
+    if len(opciones) <= MAX_BOTONES:
+        interactivo = {
             "type": "button",
             "body": {"text": pregunta},
             "action": {
                 "buttons": [
-                    {
-                        "type": "reply",
-                        "reply": {"id": "disco", "title": "🛒 Disco"}
-                    },
-                    {
-                        "type": "reply",
-                        "reply": {"id": "tienda_inglesa", "title": "🛍 Tienda Inglesa"}
-                    },
-                    {
-                        "type": "reply",
-                        "reply": {"id": "listar", "title": "📋 Listar productos"}
-                    }
+                    {"type": "reply", "reply": {"id": id_, "title": titulo[:20]}}
+                    for id_, titulo in opciones
                 ]
             }
-        },
+        }
+    else:
+        interactivo = {
+            "type": "list",
+            "body": {"text": pregunta},
+            "action": {
+                "button": "Elegir",
+                "sections": [{
+                    "title": "Opciones",
+                    "rows": [{"id": id_, "title": titulo[:24]} for id_, titulo in opciones[:10]]
+                }]
+            }
+        }
+    return {
+        "messaging_product": "whatsapp",
+        "to": to,
+        "type": "interactive",
+        "interactive": interactivo,
     }
-    r = requests.post(GRAPH_URL, headers=headers, json=payload)
-    print("📤 Botones enviados:", r.status_code, r.text)
+
+
+def empaquetar_bloques(bloques, limite=LIMITE_TEXTO):
+    """
+    Junta bloques de texto en la menor cantidad de mensajes que entren en `limite` caracteres.
+    Un bloque que solo ya se pasa del límite se corta por líneas (y si hace falta, a la fuerza).
+    """
+    mensajes, actual = [], ""
+    for bloque in bloques:
+        bloque = bloque.strip()
+        if not bloque:
+            continue
+        partes = [bloque]
+        if len(bloque) > limite:
+            partes, parte = [], ""
+            for linea in bloque.splitlines():
+                while len(linea) > limite:
+                    if parte:
+                        partes.append(parte)
+                        parte = ""
+                    partes.append(linea[:limite])
+                    linea = linea[limite:]
+                if parte and len(parte) + 1 + len(linea) > limite:
+                    partes.append(parte)
+                    parte = linea
+                else:
+                    parte = f"{parte}\n{linea}" if parte else linea
+            if parte:
+                partes.append(parte)
+        for parte in partes:
+            if actual and len(actual) + 2 + len(parte) <= limite:
+                actual = f"{actual}\n\n{parte}"
+            else:
+                if actual:
+                    mensajes.append(actual)
+                actual = parte
+    if actual:
+        mensajes.append(actual)
+    return mensajes
+
+
+async def _enviar_async(payload):
+    """
+    POST a Graph API con limitador y reintentos con backoff exponencial en 429/5xx y errores de red.
+    Es el único camino de envío: los reintentos valen igual para https (Meta) que para una
+    GRAPH_URL http (serviciosFalsos.py en los benchmarks).
+    """
+    for intento in range(WHATSAPP_REINTENTOS + 1):
+        await limitador.esperar_async()
+        try:
+            with medir_llamada("whatsapp") as llamada:
+                r = await http_async.post(GRAPH_URL, json=payload)
+                llamada.codigo(r.status_code)
+        except httpx.TransportError:
+            if intento == WHATSAPP_REINTENTOS:
+                raise
+            await asyncio.sleep(0.5 * 2 ** intento)
+            continue
+        if r.status_code not in REINTENTABLES or intento == WHATSAPP_REINTENTOS:
+            return r
+        espera = r.headers.get("Retry-After")
+        await asyncio.sleep(float(espera) if espera and espera.isdigit() else 0.5 * 2 ** intento)
     return r
+
+
+def _registrar_envio(tipo, to, r):
+    """Los envíos correctos van a DEBUG; el cuerpo de la respuesta sólo se lee si falló."""
+    if r.status_code < 400:
+        log.debug(f"📤 {tipo} enviado", to=to, status=r.status_code)
+    else:
+        log.warning(f"⚠️ {tipo} no enviado", to=to, status=r.status_code, respuesta=r.text[:500])
+
+
+async def reply_whatsapp_async(to: str, body: str):
+    async with _lock_de(to):
+        r = await _enviar_async(_payload_texto(to, body))
+    _registrar_envio("Texto", to, r)
+    return r
+
+
+async def enviar_receta_async(to: str, bloques, pregunta: str = None, opciones=None):
+    """
+    Manda los bloques de una receta empaquetados en la menor cantidad de mensajes
+    (y opcionalmente los botones al final), todo en orden para ese destinatario.
+    """
+    async with _lock_de(to):
+        for texto in empaquetar_bloques(bloques):
+            r = await _enviar_async(_payload_texto(to, texto))
+            _registrar_envio("Texto", to, r)
+        if pregunta:
+            r = await _enviar_async(_payload_botones(to, pregunta, opciones))
+            _registrar_envio("Botones", to, r)